@@ -1,6 +1,28 @@
 from django.contrib import admin
+from django.http import FileResponse, Http404
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html
 
-from currency.models import Currency, Deal, Offer
+from currency.models import (
+    ArchivedDeal,
+    ArchivedOffer,
+    Balance,
+    Candle,
+    Currency,
+    Deal,
+    ImportJob,
+    Notification,
+    Offer,
+    PriceAlert,
+    RefreshToken,
+    RequestProfile,
+    RevokedSession,
+    SlowQuery,
+    Task,
+)
+from currency.profiling import stacks_path
+from currency.tasks import queue_stats
 
 
 @admin.register(Currency)
@@ -25,6 +47,7 @@ class OfferAdmin(admin.ModelAdmin):
         "exchange_rate",
         "seller",
         "added_time",
+        "expires_at",
         "active_state",
     )
     list_display_links = ("id", "currency_to_sell", "currency_to_buy")
@@ -33,6 +56,24 @@ class OfferAdmin(admin.ModelAdmin):
     list_filter = ("active_state",)
 
 
+@admin.register(ArchivedOffer)
+class ArchivedOfferAdmin(admin.ModelAdmin):
+    """Archived offer model views on backend."""
+
+    list_display = (
+        "id",
+        "currency_to_sell",
+        "currency_to_buy",
+        "amount",
+        "exchange_rate",
+        "seller",
+        "added_time",
+        "archived_time",
+    )
+    list_display_links = ("id", "currency_to_sell", "currency_to_buy")
+    ordering = ("-archived_time",)
+
+
 @admin.register(Deal)
 class DealAdmin(admin.ModelAdmin):
     """Deal model views on backend."""
@@ -47,3 +88,189 @@ class DealAdmin(admin.ModelAdmin):
     list_display_links = ("id", "seller", "buyer", "offer", "deal_time")
     ordering = ("deal_time",)
     search_fields = ("seller", "buyer")
+
+
+@admin.register(ArchivedDeal)
+class ArchivedDealAdmin(admin.ModelAdmin):
+    """Archived deal model views on backend."""
+
+    list_display = ("id", "buyer", "offer_id", "amount", "deal_time", "month")
+    list_display_links = ("id", "buyer", "offer_id")
+    ordering = ("-deal_time",)
+    date_hierarchy = "deal_time"
+
+
+@admin.register(Balance)
+class BalanceAdmin(admin.ModelAdmin):
+    """Balance model views on backend."""
+
+    list_display = ("id", "user", "currency", "bought", "sold", "deals")
+    list_display_links = ("id", "user", "currency")
+    ordering = ("user", "currency")
+    search_fields = ("user__username", "currency__code")
+
+
+@admin.register(Candle)
+class CandleAdmin(admin.ModelAdmin):
+    """Candle model views on backend."""
+
+    list_display = (
+        "id",
+        "currency_to_sell",
+        "currency_to_buy",
+        "interval",
+        "bucket_start",
+        "open",
+        "high",
+        "low",
+        "close",
+        "volume",
+        "trades",
+    )
+    list_display_links = ("id", "currency_to_sell", "currency_to_buy")
+    ordering = ("-bucket_start",)
+    list_filter = ("interval",)
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    """Task model views on backend with queue depth and lag."""
+
+    list_display = ("id", "name", "status", "attempts", "created_at", "run_after", "finished_at")
+    list_display_links = ("id", "name")
+    ordering = ("-id",)
+    list_filter = ("status", "name")
+    readonly_fields = ("last_error",)
+
+    def changelist_view(self, request, extra_context=None):
+        """Add waiting tasks stats above the list."""
+        extra_context = {**(extra_context or {}), "queue_stats": queue_stats()}
+        return super().changelist_view(request, extra_context=extra_context)
+
+
+@admin.register(RefreshToken)
+class RefreshTokenAdmin(admin.ModelAdmin):
+    """Refresh token model views on backend."""
+
+    list_display = ("id", "user", "session", "expires_at", "used_at")
+    list_display_links = ("id", "user")
+    ordering = ("-id",)
+    search_fields = ("user__username", "session")
+
+
+@admin.register(RevokedSession)
+class RevokedSessionAdmin(admin.ModelAdmin):
+    """Revoked session model views on backend."""
+
+    list_display = ("id", "session", "revoked_at", "expires_at")
+    list_display_links = ("id", "session")
+    ordering = ("-id",)
+    search_fields = ("session",)
+
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    """Import job model views on backend."""
+
+    list_display = ("id", "kind", "status", "rows_done", "imported", "failed", "created_at")
+    list_display_links = ("id", "kind")
+    ordering = ("-id",)
+    list_filter = ("status", "kind")
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    """Request profile model views on backend with the collapsed stacks download."""
+
+    list_display = (
+        "id",
+        "method",
+        "path",
+        "status_code",
+        "duration",
+        "query_count",
+        "query_time",
+        "created_at",
+    )
+    list_display_links = ("id", "path")
+    ordering = ("-id",)
+    search_fields = ("path",)
+    readonly_fields = [field.name for field in RequestProfile._meta.fields] + ["stacks"]
+
+    def has_add_permission(self, request):
+        """Profiles are only made by profiled requests."""
+        return False
+
+    @admin.display(description="Collapsed stacks")
+    def stacks(self, obj):
+        """Link to the collapsed stacks file."""
+        url = reverse("admin:currency_requestprofile_stacks", args=(obj.pk,))
+        return format_html('<a href="{}">{}</a>', url, obj.stacks_file)
+
+    def get_urls(self):
+        """Add the collapsed stacks download view."""
+        return [
+            path(
+                "<int:profile_id>/stacks/",
+                self.admin_site.admin_view(self.stacks_view),
+                name="currency_requestprofile_stacks",
+            )
+        ] + super().get_urls()
+
+    def stacks_view(self, request, profile_id):
+        """Download the collapsed stacks file, input of flamegraph.pl or speedscope."""
+        profile = get_object_or_404(RequestProfile, pk=profile_id)
+        try:
+            stacks = stacks_path(profile).open("rb")
+        except FileNotFoundError:
+            raise Http404("Stacks file was removed") from None
+        return FileResponse(
+            stacks, as_attachment=True, filename=profile.stacks_file, content_type="text/plain"
+        )
+
+
+@admin.register(SlowQuery)
+class SlowQueryAdmin(admin.ModelAdmin):
+    """Slow query model views on backend, the most time consuming first."""
+
+    list_display = ("fingerprint", "route", "count", "total_time", "max_time", "last_seen")
+    list_filter = ("route",)
+    ordering = ("-total_time",)
+    search_fields = ("normalized_sql", "route")
+    readonly_fields = [field.name for field in SlowQuery._meta.fields]
+
+    def has_add_permission(self, request):
+        """Slow queries are only recorded by the slow query log."""
+        return False
+
+
+@admin.register(PriceAlert)
+class PriceAlertAdmin(admin.ModelAdmin):
+    """Price alert model views on backend."""
+
+    list_display = (
+        "id",
+        "user",
+        "currency_to_sell",
+        "currency_to_buy",
+        "max_rate",
+        "min_amount",
+        "active",
+        "triggered_at",
+    )
+    list_display_links = ("id", "user")
+    list_filter = ("active",)
+    ordering = ("-id",)
+    search_fields = ("user__username",)
+    raw_id_fields = ("user",)
+
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    """Notification model views on backend."""
+
+    list_display = ("id", "user", "alert", "offer", "exchange_rate", "amount", "created_at")
+    list_display_links = ("id", "user")
+    ordering = ("-id",)
+    search_fields = ("user__username",)
+    raw_id_fields = ("user", "alert", "offer")
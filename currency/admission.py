@@ -0,0 +1,245 @@
+"""Admission control of API requests by priority class.
+
+Requests are matched to the classes of ADMISSION_CLASSES by ``"METHOD /path"``,
+the first class listed has the highest priority. A class runs at most its
+own limit of requests and all classes together at most
+ADMISSION_MAX_CONCURRENCY; the rest wait in bounded per-class queues and
+freed slots go to the highest priority class first. Requests are shed with
+503 and ``Retry-After`` when their queue is full, when they wait longer than
+the queue time budget of their class, or when a higher priority request
+needs their place in the full ADMISSION_MAX_QUEUE. Requests of no class are
+not limited.
+"""
+
+import asyncio
+import collections
+import json
+import math
+import re
+import time
+
+from django.conf import settings
+
+
+class Rejected(Exception):
+    """Request shed by admission control."""
+
+    def __init__(self, request_class, reason):
+        """Init error of the request class."""
+        super().__init__(f"{request_class.name} request shed: {reason}")
+        self.request_class = request_class
+        self.reason = reason
+
+
+class RequestClass:
+    """Limits, wait queue and counters of one priority class."""
+
+    def __init__(self, name, priority, pattern, limit, queue_size, budget):
+        """Init class with empty queue."""
+        self.name = name
+        self.priority = priority
+        self.pattern = re.compile(pattern)
+        self.limit = limit
+        self.queue_size = queue_size
+        self.budget = budget
+        self.active = 0
+        self.waiters = collections.deque()
+        self.admitted = 0
+        self.shed = collections.Counter()
+        self.queue_time = 0.0
+        self.max_queue_time = 0.0
+
+    @property
+    def retry_after(self):
+        """Seconds a shed request of the class should wait before retrying."""
+        return max(1, math.ceil(self.budget))
+
+    def stats(self):
+        """Current load and counters of the class."""
+        return {
+            "name": self.name,
+            "priority": self.priority,
+            "active": self.active,
+            "limit": self.limit,
+            "queued": len(self.waiters),
+            "queue_size": self.queue_size,
+            "admitted": self.admitted,
+            "shed": dict(self.shed),
+            "avg_queue_time": self.queue_time / self.admitted if self.admitted else 0.0,
+            "max_queue_time": self.max_queue_time,
+        }
+
+
+class Waiter:
+    """Queued request."""
+
+    def __init__(self, future, timer):
+        """Init waiter admitted by resolving the future."""
+        self.future = future
+        self.timer = timer
+        self.queued_at = time.monotonic()
+
+
+class AdmissionController:
+    """Slots of running requests shared by the classes of one event loop."""
+
+    def __init__(self, classes, capacity, max_queue):
+        """Init controller with ``(name, pattern, limit, queue_size, budget)`` classes."""
+        self.classes = [
+            RequestClass(name, priority, *options)
+            for priority, (name, *options) in enumerate(classes)
+        ]
+        self.capacity = capacity
+        self.max_queue = max_queue
+        self.active = 0
+
+    def classify(self, method, path):
+        """Class of the request, None if it isn't limited."""
+        key = f"{method} {path}"
+        for request_class in self.classes:
+            if request_class.pattern.match(key):
+                return request_class
+        return None
+
+    @property
+    def queued(self):
+        """Number of waiting requests of all classes."""
+        return sum(len(request_class.waiters) for request_class in self.classes)
+
+    def _has_room(self, request_class):
+        return request_class.active < request_class.limit and self.active < self.capacity
+
+    def _admit(self, request_class, queue_time=0.0):
+        request_class.active += 1
+        request_class.admitted += 1
+        request_class.queue_time += queue_time
+        request_class.max_queue_time = max(request_class.max_queue_time, queue_time)
+        self.active += 1
+
+    def _shed(self, request_class, waiter, reason):
+        request_class.waiters.remove(waiter)
+        waiter.timer.cancel()
+        request_class.shed[reason] += 1
+        if not waiter.future.done():
+            waiter.future.set_exception(Rejected(request_class, reason))
+
+    def _make_room(self, request_class):
+        """Shed the newest waiter of the lowest class below the given one, False if none."""
+        for lower in reversed(self.classes[request_class.priority + 1 :]):
+            if lower.waiters:
+                self._shed(lower, lower.waiters[-1], "preempted")
+                return True
+        return False
+
+    def _dispatch(self):
+        """Admit waiters while there are free slots, higher priority first."""
+        for request_class in self.classes:
+            while request_class.waiters and self._has_room(request_class):
+                waiter = request_class.waiters.popleft()
+                waiter.timer.cancel()
+                self._admit(request_class, time.monotonic() - waiter.queued_at)
+                waiter.future.set_result(None)
+            if self.active >= self.capacity:
+                return
+
+    async def acquire(self, request_class):
+        """Wait for a slot of the class, Rejected if the request is shed."""
+        if not request_class.waiters and self._has_room(request_class):
+            self._admit(request_class)
+            return
+        if len(request_class.waiters) >= request_class.queue_size:
+            request_class.shed["queue_full"] += 1
+            raise Rejected(request_class, "queue_full")
+        if self.queued >= self.max_queue and not self._make_room(request_class):
+            request_class.shed["overload"] += 1
+            raise Rejected(request_class, "overload")
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        waiter = Waiter(future, None)
+        waiter.timer = loop.call_later(
+            request_class.budget, self._shed, request_class, waiter, "timeout"
+        )
+        request_class.waiters.append(waiter)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if not future.cancelled() and future.exception() is None:
+                self.release(request_class)
+            elif waiter in request_class.waiters:
+                request_class.waiters.remove(waiter)
+                waiter.timer.cancel()
+            raise
+
+    def release(self, request_class):
+        """Free the slot of a finished request."""
+        request_class.active -= 1
+        self.active -= 1
+        self._dispatch()
+
+    def stats(self):
+        """Current load and counters of all classes."""
+        return {
+            "active": self.active,
+            "capacity": self.capacity,
+            "queued": self.queued,
+            "max_queue": self.max_queue,
+            "classes": [request_class.stats() for request_class in self.classes],
+        }
+
+
+_controller = None
+
+
+def get_controller():
+    """Admission controller of the worker configured by the ADMISSION_* settings."""
+    global _controller
+    if _controller is None:
+        _controller = AdmissionController(
+            getattr(settings, "ADMISSION_CLASSES", ()),
+            getattr(settings, "ADMISSION_MAX_CONCURRENCY", 64),
+            getattr(settings, "ADMISSION_MAX_QUEUE", 1024),
+        )
+    return _controller
+
+
+class AdmissionMiddleware:
+    """ASGI middleware running HTTP requests through the admission controller."""
+
+    def __init__(self, app):
+        """Wrap the ASGI application."""
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        """Run the request once it's admitted, else respond 503."""
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        controller = get_controller()
+        request_class = controller.classify(scope["method"], scope["path"])
+        if request_class is None:
+            return await self.app(scope, receive, send)
+        try:
+            await controller.acquire(request_class)
+        except Rejected as e:
+            return await self.reject(send, e)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            controller.release(request_class)
+
+    @staticmethod
+    async def reject(send, error):
+        """Send the 503 response of the shed request."""
+        body = json.dumps({"message": "Server is overloaded, retry later"}).encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(error.request_class.retry_after).encode()),
+                    (b"x-shed-reason", error.reason.encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
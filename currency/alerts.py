@@ -0,0 +1,104 @@
+"""Price alerts matched against offers as they are added or enabled.
+
+Active alerts are indexed by pair, min amount bucket (the bit length of the
+integer part of the min amount) and descending max rate. An offer reads the
+alerts of its pair whose rate threshold it crosses with one index range scan
+per bucket up to the one of its amount, the alerts of higher buckets asking
+for more than it has. Only alerts of the offer's own bucket, asking for more
+than its amount but less than twice it, can still be read and skipped, so the
+work per offer is O(b log n + k + s) for b buckets, k triggered alerts and s
+such near misses. Alerts fire once; the matched ones are deactivated together
+with the creation of their notifications.
+"""
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from currency.models import Notification, Offer, PriceAlert
+from currency.tasks import enqueue, task
+
+
+def _unexpired():
+    return Q(expires_at__isnull=True) | Q(expires_at__gt=timezone.now())
+
+
+def offer_activated(offer_id):
+    """Match the offer against the alerts once the transaction commits."""
+    enqueue("alerts.match", offer_id=offer_id)
+
+
+def _trigger(alerts, offer):
+    """Deactivate the still active alerts and notify their users, return them."""
+    now = timezone.now()
+    alerts = [
+        alert
+        for alert in alerts
+        if PriceAlert.objects.filter(pk=alert.pk, active=True).update(
+            active=False, triggered_at=now
+        )
+    ]
+    Notification.objects.bulk_create(
+        Notification(
+            user_id=alert.user_id,
+            alert=alert,
+            offer=offer,
+            exchange_rate=offer.exchange_rate,
+            amount=offer.amount,
+        )
+        for alert in alerts
+    )
+    return alerts
+
+
+def match_offer(offer, batch_size=None):
+    """Trigger the active alerts crossed by the offer, return how many."""
+    if batch_size is None:
+        batch_size = getattr(settings, "ALERT_MATCH_BATCH_SIZE", 1000)
+    crossed = PriceAlert.objects.filter(
+        active=True,
+        currency_to_sell_id=offer.currency_to_sell_id,
+        currency_to_buy_id=offer.currency_to_buy_id,
+        amount_bucket__in=range(PriceAlert.bucket(offer.amount) + 1),
+        max_rate__gte=offer.exchange_rate,
+        min_amount__lte=offer.amount,
+    ).order_by("amount_bucket", "-max_rate")
+    triggered = 0
+    while True:
+        with transaction.atomic():
+            alerts = list(crossed.select_for_update()[:batch_size])
+            if not alerts:
+                return triggered
+            triggered += len(_trigger(alerts, offer))
+
+
+def match_alert(alert):
+    """Trigger the new alert if an active offer already crosses it."""
+    offer = (
+        Offer.objects.filter(
+            _unexpired(),
+            active_state=True,
+            currency_to_sell_id=alert.currency_to_sell_id,
+            currency_to_buy_id=alert.currency_to_buy_id,
+            exchange_rate__lte=alert.max_rate,
+            amount__gte=alert.min_amount,
+        )
+        .order_by("exchange_rate", "pk")
+        .first()
+    )
+    if offer is not None:
+        with transaction.atomic():
+            _trigger([alert], offer)
+        alert.refresh_from_db()
+    return alert
+
+
+@task("alerts.match", batch=True)
+def match_task(payloads):
+    """Match the added and enabled offers still active."""
+    offers = Offer.objects.filter(
+        _unexpired(), pk__in={payload["offer_id"] for payload in payloads}, active_state=True
+    ).order_by("pk")
+    for offer in offers:
+        match_offer(offer)
@@ -2,46 +2,108 @@
 
 import datetime
 from datetime import timezone
-from decimal import Decimal
-from typing import List
+from typing import List, Literal
 
 import jwt
 from asgiref.sync import sync_to_async
 from django.contrib.auth.hashers import check_password
 from django.contrib.auth.models import User
-from django.db.models import Count, ProtectedError
+from django.db import IntegrityError
+from django.db.models import Count, ProtectedError, Q
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from ninja import Form, NinjaAPI
+from ninja import File, Form, NinjaAPI, Query
+from ninja.files import UploadedFile
 from ninja.pagination import paginate
 from ninja.security import HttpBearer
 
-from currency.models import Currency, Deal, Offer
+from currency.admission import get_controller
+from currency.alerts import match_alert
+from currency.archive import deals_history
+from currency.candles import INTERVALS
+from currency.filters import filter_offers
+from currency.idempotency import idempotent
+from currency.images import schedule_variants
+from currency.imports import create_import, guess_format, read_errors
+from currency.market import market_summary
+from currency.models import (
+    Balance,
+    Candle,
+    Currency,
+    Deal,
+    ImportJob,
+    Notification,
+    Offer,
+    PriceAlert,
+)
+from currency.projection import project, sparse, wants
+from currency.registry import currency_registry
+from currency.routing import offer_graph
 from currency.schemas import (
+    BalanceOut,
+    BasketIn,
+    BasketOut,
+    CandleOut,
     CurrencyBase,
+    CurrencyBatchOut,
     CurrencyIn,
     CurrencyOut,
     DealBase,
+    DealBatchOut,
     DealExtraDataOut,
     DealIn,
+    ImportJobOut,
+    MarketSummaryOut,
     MessageOut,
+    NotificationOut,
     OfferBase,
+    OfferBatchOut,
+    OfferFilter,
     OfferIn,
     OfferState,
     OfferWithDealOut,
+    PriceAlertIn,
+    PriceAlertOut,
+    QuoteOut,
     TokenOut,
     UserBase,
     UserExtraDataOut,
 )
+from currency.services import (
+    BasketRejected,
+    VersionConflict,
+    conditional_update,
+    create_basket,
+    create_deal,
+    create_offer,
+    remove_offer,
+    set_offer_state,
+)
+from currency.tokens import (
+    TokenError,
+    create_refresh_token,
+    decode_refresh_token,
+    revocations,
+    revoke_session,
+    rotate_refresh_token,
+)
 from django_ninja_api import settings
 
 api = NinjaAPI()
 
+MAX_CANDLES = 1000
+MAX_BATCH_IDS = 500
+MAX_BASKET_LEGS = 100
+MAX_NOTIFICATIONS = 1000
 
-def create_token(username):
+
+def create_token(username, session=None):
     """Create JWT method."""
     jwt_signing_key = getattr(settings, "JWT_SIGNING_KEY", None)
     jwt_access_expire = getattr(settings, "JWT_ACCESS_EXPIRY", 60)
     payload = {"username": username}
+    if session:
+        payload["sid"] = session
     access_expire = datetime.datetime.now(tz=timezone.utc) + datetime.timedelta(
         minutes=jwt_access_expire
     )
@@ -50,6 +112,24 @@ def create_token(username):
     return token
 
 
+def parse_ids(ids):
+    """Parse comma separated ids of the batch request."""
+    try:
+        pks = list(dict.fromkeys(int(pk) for pk in ids.split(",") if pk.strip()))
+    except ValueError:
+        raise ValueError("Ids must be comma separated integers") from None
+    if len(pks) > MAX_BATCH_IDS:
+        raise ValueError(f"No more than {MAX_BATCH_IDS} ids are allowed")
+    return pks
+
+
+async def get_batch(queryset, ids):
+    """Fetch objects by ids with a single query."""
+    pks = parse_ids(ids)
+    found = await queryset.ain_bulk(pks)
+    return {"items": found, "missing": [pk for pk in pks if pk not in found]}
+
+
 class AuthBearer(HttpBearer):
     """Bearer auth type. Headers:
     Authorization: Bearer {token}
@@ -60,8 +140,12 @@ class AuthBearer(HttpBearer):
         jwt_signing_key = getattr(settings, "JWT_SIGNING_KEY", None)
         try:
             payload = jwt.decode(token, key=jwt_signing_key, algorithms=["HS256"])
-        except Exception as e:
-            return {"error": e}
+        except jwt.InvalidTokenError:
+            return None
+        if payload.get("type") == "refresh":
+            return None
+        if payload.get("sid") and revocations.is_revoked(payload["sid"]):
+            return None
         username: str = payload.get("username", None)
         return username
 
@@ -80,8 +164,42 @@ async def sign_in(request, username: str = Form(...), password: str = Form(...))
     if not passwords_match:
         return 422, {"message": "Wrong password"}
 
-    token = create_token(user_model.username)
-    return 200, {"token": token}
+    session, refresh_token = await sync_to_async(create_refresh_token)(user_model)
+    token = create_token(user_model.username, session)
+    return 200, {"token": token, "refresh_token": refresh_token}
+
+
+@api.post(
+    "/token/refresh",
+    auth=None,
+    response={200: TokenOut, 401: MessageOut},
+    tags=["Authentication"],
+)
+async def refresh_token(request, refresh_token: str = Form(...)):
+    """Exchange the refresh token for a new access and refresh token."""
+    try:
+        username, session, new_refresh_token = await sync_to_async(rotate_refresh_token)(
+            refresh_token
+        )
+    except TokenError as e:
+        return 401, {"message": str(e)}
+    return 200, {"token": create_token(username, session), "refresh_token": new_refresh_token}
+
+
+@api.post(
+    "/sign_out",
+    auth=None,
+    response={204: None, 401: MessageOut},
+    tags=["Authentication"],
+)
+async def sign_out(request, refresh_token: str = Form(...)):
+    """Revoke the session of the refresh token with all its tokens."""
+    try:
+        payload = decode_refresh_token(refresh_token)
+    except TokenError as e:
+        return 401, {"message": str(e)}
+    await sync_to_async(revoke_session)(payload["sid"])
+    return 204, None
 
 
 @api.post(
@@ -106,20 +224,44 @@ async def server_status(request):
     return {"Server": "running..."}
 
 
+@api.get("/admission", tags=["Server status"])
+async def admission_stats(request):
+    """Get admission control load and shed counters of the worker."""
+    return get_controller().stats()
+
+
+@api.get(
+    "/currencies/batch",
+    response={200: CurrencyBatchOut, 400: MessageOut},
+    tags=["Currency"],
+)
+async def get_currencies_batch(request, ids: str):
+    """Get currencies by comma separated ids."""
+    try:
+        return 200, await get_batch(Currency.objects.all(), ids)
+    except ValueError as e:
+        return 400, {"message": str(e)}
+
+
 @api.get("/currencies/{currency_id}", response=CurrencyBase, tags=["Currency"])
-async def get_single_currency(request, currency_id: int):
-    """Get single currency."""
-    currency = await sync_to_async(get_object_or_404)(Currency, pk=currency_id)
+async def get_single_currency(request, currency_id: str):
+    """Get single currency by id or code."""
+    currency = (await currency_registry.asnapshot()).get(currency_id)
+    if currency is None:
+        raise Http404("No Currency matches the given query.")
     return currency
 
 
 @api.get("/currencies", response=List[CurrencyOut], tags=["Currency"])
+@sparse(CurrencyOut)
 @paginate()
-def get_all_currencies(request):
+def get_all_currencies(request, fields: str = None):
     """Get all currencies."""
-    currencies = Currency.objects.annotate(
-        offers_to_sell=Count("currencies_to_sell", distinct=True)
-    ).annotate(offers_to_buy=Count("currencies_to_buy", distinct=True))
+    currencies = project(Currency.objects.order_by("id"), CurrencyOut, fields)
+    if wants(CurrencyOut, fields, "offers_to_sell"):
+        currencies = currencies.annotate(offers_to_sell=Count("currencies_to_sell", distinct=True))
+    if wants(CurrencyOut, fields, "offers_to_buy"):
+        currencies = currencies.annotate(offers_to_buy=Count("currencies_to_buy", distinct=True))
     return currencies
 
 
@@ -131,26 +273,47 @@ def get_all_currencies(request):
 )
 async def add_new_currency(request, payload: CurrencyIn):
     """Add new currency."""
+    if (await currency_registry.asnapshot()).get(Currency.normalize_code(payload.code)):
+        return 400, {"message": "Currency with that code already exists"}
     try:
-        await Currency.objects.aget(code=payload.code)
+        currency = await Currency.objects.acreate(
+            **payload.dict(exclude={"image_variants", "version"})
+        )
+    except IntegrityError:
         return 400, {"message": "Currency with that code already exists"}
-    except Currency.DoesNotExist:
-        currency = await Currency.objects.acreate(**payload.dict())
-        return 201, currency
+    await sync_to_async(schedule_variants)(currency.pk)
+    return 201, currency
 
 
 @api.put(
     "/currencies/{currency_id}",
-    response={200: CurrencyBase},
+    response={200: CurrencyBase, 409: MessageOut},
     tags=["Currency"],
     auth=AuthBearer(),
 )
 async def edit_currency(request, currency_id: int, payload: CurrencyIn):
-    """Edit currency."""
+    """Edit currency if it wasn't changed since the given (or just read) version."""
     currency = await sync_to_async(get_object_or_404)(Currency, pk=currency_id)
-    for attr, value in payload.dict().items():
-        setattr(currency, attr, value)
-    await sync_to_async(currency.save)()
+    expected_version = currency.version if payload.version is None else payload.version
+    changes = {
+        attr: value
+        for attr, value in {
+            "code": Currency.normalize_code(payload.code),
+            "name": payload.name,
+            "image": payload.image,
+        }.items()
+        if getattr(currency, attr) != value
+    }
+    image_changed = "image" in changes
+    if image_changed:
+        changes["image_variants"] = {}
+    try:
+        await sync_to_async(conditional_update)(currency, expected_version, **changes)
+    except VersionConflict as e:
+        return 409, {"message": str(e)}
+    await sync_to_async(currency_registry.invalidate)()
+    if image_changed:
+        await sync_to_async(schedule_variants)(currency.pk)
     return 200, currency
 
 
@@ -170,21 +333,35 @@ async def delete_currency(request, currency_id: int):
         return 400, {"message": "You can't delete currency having any offer."}
 
 
+@api.get("/offers/batch", response={200: OfferBatchOut, 400: MessageOut}, tags=["Offer"])
+async def get_offers_batch(request, ids: str):
+    """Get offers with corresponding deals by comma separated ids."""
+    try:
+        return 200, await get_batch(Offer.objects.prefetch_related("deal_set"), ids)
+    except ValueError as e:
+        return 400, {"message": str(e)}
+
+
 @api.get("/offers/{offer_id}", response=OfferWithDealOut, tags=["Offer"])
-async def get_single_offer(request, offer_id: int):
+@sparse(OfferWithDealOut)
+async def get_single_offer(request, offer_id: int, fields: str = None):
     """Get single offer with corresponding deal if any."""
     offer = await sync_to_async(get_object_or_404)(
-        Offer.objects.prefetch_related("deal_set"), pk=offer_id
+        project(Offer.objects.all(), OfferWithDealOut, fields), pk=offer_id
     )
     return offer
 
 
 @api.get("/offers", response=List[OfferBase], tags=["Offer"])
+@sparse(OfferBase)
 @paginate()
-def get_all_active_offers(request):
-    """Get all offers with pagination."""
-    offers = Offer.objects.filter(active_state=True)
-    return offers
+def get_all_active_offers(request, filters: OfferFilter = Query(...), fields: str = None):
+    """Get all offers with filters, sorting and pagination."""
+    now = datetime.datetime.now(tz=timezone.utc)
+    offers = Offer.objects.filter(
+        Q(expires_at__isnull=True) | Q(expires_at__gt=now), active_state=True
+    )
+    return project(filter_offers(offers, filters), OfferBase, fields)
 
 
 @api.get(
@@ -193,10 +370,11 @@ def get_all_active_offers(request):
     tags=["Offer", "User"],
     auth=AuthBearer(),
 )
+@sparse(OfferBase)
 @paginate()
-def get_user_offers(request, user_id):
+def get_user_offers(request, user_id, fields: str = None):
     """Get all user offers with pagination."""
-    offers = Offer.objects.filter(seller_id=user_id)
+    offers = project(Offer.objects.filter(seller_id=user_id), OfferBase, fields)
     return offers
 
 
@@ -205,33 +383,48 @@ def get_user_offers(request, user_id):
     response=List[OfferBase],
     tags=["Offer", "Currency"],
 )
+@sparse(OfferBase)
 @paginate()
-def get_all_offers_by_sell_currency(request, currency_to_sell_id):
-    """Get all offers by sell currency with pagination."""
-    offers = Offer.objects.filter(currency_to_sell_id=currency_to_sell_id)
+def get_all_offers_by_sell_currency(request, currency_to_sell_id, fields: str = None):
+    """Get all offers by sell currency id or code with pagination."""
+    currency = currency_registry.snapshot().get(currency_to_sell_id)
+    if currency is None:
+        return Offer.objects.none()
+    offers = project(Offer.objects.filter(currency_to_sell_id=currency.pk), OfferBase, fields)
     return offers
 
 
-@api.post("/offers", response={201: OfferBase}, tags=["Offer"], auth=AuthBearer())
+@api.post("/offers", response={201: OfferBase, 400: MessageOut}, tags=["Offer"], auth=AuthBearer())
+@idempotent({201: OfferBase, 400: MessageOut})
 async def add_new_offer(request, payload: OfferIn):
-    """Add new offer."""
-    offer = await Offer.objects.acreate(**payload.dict())
+    """Add new offer, currencies may be given by id or code."""
+    currencies = await currency_registry.asnapshot()
+    data = payload.dict(exclude={"version"})
+    for field in ("currency_to_sell_id", "currency_to_buy_id"):
+        currency = currencies.get(data[field])
+        if currency is None:
+            return 400, {"message": f"Unknown currency {data[field]}"}
+        data[field] = currency.pk
+    offer = await sync_to_async(create_offer)(data)
     return 201, offer
 
 
 @api.patch(
     "/offers/{offer_id}",
-    response=OfferBase,
+    response={200: OfferBase, 409: MessageOut},
     tags=["Offer"],
     exclude_unset=True,
     auth=AuthBearer(),
 )
 async def toggle_offer_state(request, offer_id, payload: OfferState):
-    """Toggle offer state (enable/disable)."""
+    """Toggle offer state (enable/disable) if it wasn't changed since the given version."""
     offer = await sync_to_async(get_object_or_404)(Offer, pk=offer_id)
-    offer.active_state = payload.active_state
-    await sync_to_async(offer.save)()
-    return offer
+    expected_version = offer.version if payload.version is None else payload.version
+    try:
+        await sync_to_async(set_offer_state)(offer, expected_version, payload.active_state)
+    except VersionConflict as e:
+        return 409, {"message": str(e)}
+    return 200, offer
 
 
 @api.delete(
@@ -244,7 +437,7 @@ async def delete_offer(request, offer_id: int):
     """Delete offer."""
     try:
         offer = await sync_to_async(get_object_or_404)(Offer, pk=offer_id)
-        await sync_to_async(offer.delete)()
+        await sync_to_async(remove_offer)(offer)
         return 204, None
     except ProtectedError:
         return 400, {"message": "You can't delete an offer having any deal"}
@@ -253,14 +446,55 @@ async def delete_offer(request, offer_id: int):
 @api.get(
     "/users/{user_id}", response=UserExtraDataOut, tags=["User"], auth=AuthBearer()
 )
-async def get_user_info(request, user_id):
+@sparse(UserExtraDataOut)
+async def get_user_info(request, user_id, fields: str = None):
     """Get user profile information with offers and deals."""
     user = await sync_to_async(get_object_or_404)(
-        User.objects.prefetch_related("offers__deal_set"), pk=user_id
+        project(User.objects.all(), UserExtraDataOut, fields), pk=user_id
     )
     return user
 
 
+@api.get(
+    "/users/{user_id}/balances",
+    response=List[BalanceOut],
+    tags=["User"],
+    auth=AuthBearer(),
+)
+async def get_user_balances(request, user_id: int):
+    """Get bought and sold totals of the user per currency."""
+    return [balance async for balance in Balance.objects.filter(user_id=user_id)]
+
+
+@api.get("/deals/batch", response={200: DealBatchOut, 400: MessageOut}, tags=["Deal"])
+async def get_deals_batch(request, ids: str):
+    """Get deals by comma separated ids."""
+    try:
+        return 200, await get_batch(Deal.objects.select_related("offer"), ids)
+    except ValueError as e:
+        return 400, {"message": str(e)}
+
+
+@api.post(
+    "/deals/basket",
+    response={201: BasketOut, 400: MessageOut},
+    tags=["Deal"],
+    auth=AuthBearer(),
+)
+@idempotent({201: BasketOut, 400: MessageOut})
+async def add_new_basket(request, payload: BasketIn):
+    """Add deals to several offers at once, all of them or none."""
+    if not payload.legs or len(payload.legs) > MAX_BASKET_LEGS:
+        return 400, {"message": f"Basket must have 1 to {MAX_BASKET_LEGS} legs"}
+    try:
+        deals = await sync_to_async(create_basket)([leg.dict() for leg in payload.legs])
+    except BasketRejected as e:
+        return 400, {"message": str(e)}
+    except VersionConflict:
+        return 400, {"message": "Offers were changed by another request, try again"}
+    return 201, {"deals": deals}
+
+
 @api.get("/deals/{deal_id}", response=DealExtraDataOut, tags=["Deal"])
 async def get_single_deal(request, deal_id):
     """Get single deal."""
@@ -271,10 +505,17 @@ async def get_single_deal(request, deal_id):
 
 
 @api.get("/deals/{offer_id}/offer", response=List[DealBase], tags=["Deal"])
+@sparse(DealBase)
 @paginate()
-def get_all_deals(request, offer_id: int):
-    """Get all deals for corresponding offer."""
-    deals = Deal.objects.filter(offer_id=offer_id)
+def get_all_deals(
+    request,
+    offer_id: int,
+    start: datetime.datetime = None,
+    end: datetime.datetime = None,
+    fields: str = None,
+):
+    """Get all deals for corresponding offer, archived ones included."""
+    deals = project(deals_history(start=start, end=end, offer_id=offer_id), DealBase, fields)
     return deals
 
 
@@ -284,6 +525,7 @@ def get_all_deals(request, offer_id: int):
     tags=["Deal"],
     auth=AuthBearer(),
 )
+@idempotent({201: DealBase, 400: MessageOut})
 async def add_new_deal(request, payload: DealIn):
     """Add new deal."""
     offer = await sync_to_async(get_object_or_404)(
@@ -291,12 +533,157 @@ async def add_new_deal(request, payload: DealIn):
     )
     if (
         not offer.active_state
+        or (offer.expires_at and offer.expires_at <= datetime.datetime.now(tz=timezone.utc))
         or offer.seller.pk == payload.buyer_id
         or offer.amount < payload.amount
     ):
         return 400, {"message": "You can't make a deal to this offer"}
 
-    offer.amount -= Decimal(payload.amount)
-    await sync_to_async(offer.save)()
-    deal = await Deal.objects.acreate(**payload.dict())
+    try:
+        deal = await sync_to_async(create_deal)(offer, payload.dict())
+    except VersionConflict:
+        return 400, {"message": "You can't make a deal to this offer"}
     return 201, deal
+
+
+@api.get(
+    "/candles/{currency_to_sell_id}/{currency_to_buy_id}",
+    response={200: List[CandleOut], 400: MessageOut},
+    tags=["Deal"],
+)
+async def get_candles(
+    request,
+    currency_to_sell_id: int,
+    currency_to_buy_id: int,
+    interval: str = "1h",
+    start: datetime.datetime = None,
+    end: datetime.datetime = None,
+    limit: int = Query(500, le=MAX_CANDLES),
+):
+    """Get OHLC candles of the currency pair for the time range."""
+    if interval not in INTERVALS:
+        return 400, {"message": f"Interval must be one of: {', '.join(INTERVALS)}"}
+    candles = Candle.objects.filter(
+        currency_to_sell_id=currency_to_sell_id,
+        currency_to_buy_id=currency_to_buy_id,
+        interval=interval,
+    )
+    if start:
+        candles = candles.filter(bucket_start__gte=start)
+    if end:
+        candles = candles.filter(bucket_start__lt=end)
+    return 200, [candle async for candle in candles.order_by("bucket_start")[:limit]]
+
+
+@api.post(
+    "/imports",
+    response={202: ImportJobOut, 400: MessageOut},
+    tags=["Import"],
+    auth=AuthBearer(),
+)
+async def add_new_import(
+    request,
+    kind: Literal["offers", "currencies"] = Form(...),
+    file_format: Literal["csv", "ndjson"] = Form(None),
+    file: UploadedFile = File(...),
+):
+    """Upload a CSV or NDJSON file of offers or currencies to import in the background."""
+    file_format = file_format or guess_format(file.name)
+    if file_format is None:
+        return 400, {"message": "Can't guess the file format, pass file_format"}
+    job = await sync_to_async(create_import)(kind, file_format, file, file.name, request.auth)
+    return 202, job
+
+
+@api.get("/imports/{job_id}", response=ImportJobOut, tags=["Import"], auth=AuthBearer())
+async def get_import(request, job_id: int):
+    """Get progress of the import."""
+    return await sync_to_async(get_object_or_404)(ImportJob, pk=job_id)
+
+
+@api.get("/imports/{job_id}/errors", tags=["Import"], auth=AuthBearer())
+async def get_import_errors(request, job_id: int):
+    """Download NDJSON lines with the number and error of every rejected row."""
+    job = await sync_to_async(get_object_or_404)(ImportJob, pk=job_id)
+    if not job.errors or not job.errors_size:
+        raise Http404("The import has no errors.")
+    response = StreamingHttpResponse(read_errors(job), content_type="application/x-ndjson")
+    response["Content-Disposition"] = f'attachment; filename="import-{job.pk}-errors.ndjson"'
+    return response
+
+
+@api.get("/quote", response={200: QuoteOut, 400: MessageOut, 404: MessageOut}, tags=["Market"])
+async def get_conversion_quote(
+    request, from_currency: str, to_currency: str, amount: float = Query(..., gt=0)
+):
+    """Get the best route converting the amount of one currency (id or code) to another."""
+    currencies = await currency_registry.asnapshot()
+    source, target = currencies.get(from_currency), currencies.get(to_currency)
+    for code, currency in ((from_currency, source), (to_currency, target)):
+        if currency is None:
+            return 400, {"message": f"Unknown currency {code}"}
+    if source.pk == target.pk:
+        return 400, {"message": "Currencies must differ"}
+    quote = await sync_to_async(offer_graph.quote)(source.pk, target.pk, amount)
+    if quote is None:
+        return 404, {"message": "No route between the currencies"}
+    return 200, quote
+
+
+@api.get("/market/summary", response=MarketSummaryOut, tags=["Market"])
+async def get_market_summary(request):
+    """Get best rate, depth, active offers and last day volume per currency pair."""
+    payload = market_summary.payload or await sync_to_async(market_summary.get)()
+    return HttpResponse(payload, content_type="application/json")
+
+
+@api.post(
+    "/alerts",
+    response={201: PriceAlertOut, 400: MessageOut},
+    tags=["Alert"],
+    auth=AuthBearer(),
+)
+async def add_new_alert(request, payload: PriceAlertIn):
+    """Add price alert on offers of the pair, currencies may be given by id or code."""
+    currencies = await currency_registry.asnapshot()
+    data = payload.dict()
+    for field in ("currency_to_sell_id", "currency_to_buy_id"):
+        currency = currencies.get(data[field])
+        if currency is None:
+            return 400, {"message": f"Unknown currency {data[field]}"}
+        data[field] = currency.pk
+    user = await User.objects.aget(username=request.auth)
+    alert = await PriceAlert.objects.acreate(user=user, **data)
+    return 201, await sync_to_async(match_alert)(alert)
+
+
+@api.get("/alerts", response=List[PriceAlertOut], tags=["Alert"], auth=AuthBearer())
+@paginate()
+def get_all_alerts(request, active: bool = None):
+    """Get price alerts of the user, the newest first."""
+    alerts = PriceAlert.objects.filter(user__username=request.auth)
+    if active is not None:
+        alerts = alerts.filter(active=active)
+    return alerts.order_by("-created_at")
+
+
+@api.delete("/alerts/{alert_id}", response={204: None}, tags=["Alert"], auth=AuthBearer())
+async def delete_alert(request, alert_id: int):
+    """Delete price alert of the user."""
+    deleted, _ = await PriceAlert.objects.filter(
+        pk=alert_id, user__username=request.auth
+    ).adelete()
+    if not deleted:
+        raise Http404("No PriceAlert matches the given query.")
+    return 204, None
+
+
+@api.get("/notifications", response=List[NotificationOut], tags=["Alert"], auth=AuthBearer())
+async def get_notifications(
+    request, after: int = 0, limit: int = Query(100, ge=1, le=MAX_NOTIFICATIONS)
+):
+    """Get notifications of the user's triggered alerts with ids over ``after``, oldest first."""
+    notifications = Notification.objects.filter(
+        user__username=request.auth, pk__gt=after
+    ).select_related("alert")
+    return [notification async for notification in notifications.order_by("pk")[:limit]]
@@ -4,3 +4,15 @@ from django.apps import AppConfig
 class CurrencyConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'currency'
+
+    def ready(self):
+        """Register task handlers and signal receivers."""
+        from currency import (  # noqa: F401
+            alerts,
+            images,
+            imports,
+            market,
+            registry,
+            routing,
+            slowlog,
+        )
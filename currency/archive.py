@@ -0,0 +1,78 @@
+"""Deals archival by month and history reads across hot and archived deals."""
+
+import datetime
+import time
+
+from django.db import transaction
+from django.utils import timezone
+
+from currency.models import ArchivedDeal, Deal
+
+HISTORY_FIELDS = ("id", "buyer_id", "offer_id", "amount", "deal_time")
+
+
+def archive_deals(older_than, batch_size=1000, pause=0):
+    """Move deals made before ``older_than`` days ago into the archive.
+
+    Every batch is moved in its own short transaction, optionally pausing
+    between batches to leave room for live traffic.
+    """
+    cutoff = timezone.now() - datetime.timedelta(days=older_than)
+    old_deals = Deal.objects.filter(deal_time__lt=cutoff).order_by("deal_time", "id")
+    moved = 0
+    while True:
+        with transaction.atomic():
+            deals = list(
+                old_deals.select_for_update(skip_locked=True).values(*HISTORY_FIELDS)[:batch_size]
+            )
+            if not deals:
+                return moved
+            move_deals(deals)
+        moved += len(deals)
+        if pause:
+            time.sleep(pause)
+
+
+def move_deals(deals):
+    """Copy the deals, ``HISTORY_FIELDS`` dicts, to the archive and delete them."""
+    ArchivedDeal.objects.bulk_create(
+        [ArchivedDeal(month=deal["deal_time"].date().replace(day=1), **deal) for deal in deals],
+        ignore_conflicts=True,
+    )
+    Deal.objects.filter(pk__in=[deal["id"] for deal in deals]).delete()
+
+
+def archive_horizon(offer_id=None):
+    """Time of the newest archived deal (of the offer), None if nothing was archived.
+
+    Read from the end of the ``(offer_id, deal_time)`` or ``(month, deal_time)``
+    index, the month being the one of the deal time.
+    """
+    if offer_id is None:
+        archived = ArchivedDeal.objects.order_by("-month", "-deal_time")
+    else:
+        archived = ArchivedDeal.objects.filter(offer_id=offer_id).order_by("-deal_time")
+    return archived.values_list("deal_time", flat=True).first()
+
+
+def deals_history(start=None, end=None, **filters):
+    """Deals in the time range, with archived ones only if the range reaches them."""
+    deals = Deal.objects.filter(**filters)
+    if start:
+        deals = deals.filter(deal_time__gte=start)
+    if end:
+        deals = deals.filter(deal_time__lt=end)
+    horizon = archive_horizon(filters.get("offer_id"))
+    if horizon is None or (start and start > horizon):
+        return deals.order_by("deal_time", "id")
+
+    archived = ArchivedDeal.objects.filter(**filters)
+    if start:
+        archived = archived.filter(deal_time__gte=start)
+    if end:
+        archived = archived.filter(deal_time__lt=end)
+    return (
+        deals.values(*HISTORY_FIELDS)
+        .union(archived.values(*HISTORY_FIELDS), all=True)
+        .order_by("deal_time", "id")
+    )
@@ -0,0 +1,96 @@
+"""OHLC candles aggregation of deals."""
+
+import datetime
+
+from django.db.models import F
+from django.db.models.functions import Greatest, Least
+
+from currency.models import Candle
+
+INTERVALS = {
+    "1m": datetime.timedelta(minutes=1),
+    "1h": datetime.timedelta(hours=1),
+    "1d": datetime.timedelta(days=1),
+}
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def bucket_start(moment, interval):
+    """Truncate the moment to the start of its interval bucket."""
+    step = INTERVALS[interval]
+    return moment - (moment - EPOCH) % step
+
+
+def record_deal(deal, offer):
+    """Fold the committed deal into the candles of every interval.
+
+    Must run inside the transaction creating the deal, so candles never
+    diverge from the deals table.
+    """
+    rate = offer.exchange_rate
+    amount = deal.amount
+    for interval in INTERVALS:
+        candle, created = Candle.objects.get_or_create(
+            currency_to_sell_id=offer.currency_to_sell_id,
+            currency_to_buy_id=offer.currency_to_buy_id,
+            interval=interval,
+            bucket_start=bucket_start(deal.deal_time, interval),
+            defaults={
+                "open": rate,
+                "high": rate,
+                "low": rate,
+                "close": rate,
+                "volume": amount,
+                "quote_volume": amount * rate,
+                "trades": 1,
+            },
+        )
+        if not created:
+            Candle.objects.filter(pk=candle.pk).update(
+                high=Greatest(F("high"), rate),
+                low=Least(F("low"), rate),
+                close=rate,
+                volume=F("volume") + amount,
+                quote_volume=F("quote_volume") + amount * rate,
+                trades=F("trades") + 1,
+            )
+
+
+def build_candles(deals):
+    """Aggregate deals ordered by time into candles, yielding finished ones.
+
+    Only one open candle per pair and interval is kept in memory.
+    """
+    open_candles = {}
+    for deal in deals:
+        offer = deal.offer
+        rate = offer.exchange_rate
+        for interval in INTERVALS:
+            key = (offer.currency_to_sell_id, offer.currency_to_buy_id, interval)
+            start = bucket_start(deal.deal_time, interval)
+            candle = open_candles.get(key)
+            if candle is not None and candle.bucket_start != start:
+                yield candle
+                candle = None
+            if candle is None:
+                open_candles[key] = Candle(
+                    currency_to_sell_id=key[0],
+                    currency_to_buy_id=key[1],
+                    interval=interval,
+                    bucket_start=start,
+                    open=rate,
+                    high=rate,
+                    low=rate,
+                    close=rate,
+                    volume=deal.amount,
+                    quote_volume=deal.amount * rate,
+                    trades=1,
+                )
+                continue
+            candle.high = max(candle.high, rate)
+            candle.low = min(candle.low, rate)
+            candle.close = rate
+            candle.volume += deal.amount
+            candle.quote_volume += deal.amount * rate
+            candle.trades += 1
+    yield from open_candles.values()
@@ -0,0 +1,78 @@
+"""Single-flight coalescing of identical concurrent GET requests.
+
+A GET request matching COALESCE_PATTERN while an identical one (same path,
+query, credentials and content negotiation headers) is running waits for it
+and gets a copy of its response instead of running its own. Nothing is kept
+once the running request finishes, so the next request computes the
+response again. Responses over COALESCE_MAX_BYTES aren't shared, the waiting
+requests then run on their own.
+"""
+
+import asyncio
+import hashlib
+import re
+
+from django.conf import settings
+
+# Request headers the response may depend on
+KEY_HEADERS = (b"authorization", b"cookie", b"accept", b"accept-encoding", b"x-profile")
+
+
+def request_key(scope):
+    """Key of the requests sharing one response, None if the request isn't coalesced."""
+    pattern = getattr(settings, "COALESCE_PATTERN", None)
+    if pattern is None or not re.match(pattern, f"{scope['method']} {scope['path']}"):
+        return None
+    digest = hashlib.sha256(scope["path"].encode())
+    digest.update(b"?" + scope.get("query_string", b""))
+    headers = dict(scope["headers"])
+    for name in KEY_HEADERS:
+        digest.update(b"\n" + name + b":" + headers.get(name, b""))
+    return digest.hexdigest()
+
+
+class CoalescingMiddleware:
+    """ASGI middleware sharing the response of a running request with identical ones."""
+
+    def __init__(self, app):
+        """Wrap the ASGI application."""
+        self.app = app
+        self.flights = {}
+
+    async def __call__(self, scope, receive, send):
+        """Run the request or wait for the identical running one."""
+        key = request_key(scope) if scope["type"] == "http" else None
+        if key is None:
+            return await self.app(scope, receive, send)
+        flight = self.flights.get(key)
+        if flight is not None:
+            messages = await asyncio.shield(flight)
+            if messages is None:
+                return await self.app(scope, receive, send)
+            start, *body = messages
+            headers = [*start["headers"], (b"x-coalesced", b"1")]
+            await send({**start, "headers": headers})
+            for message in body:
+                await send(message)
+            return
+        flight = self.flights[key] = asyncio.get_running_loop().create_future()
+        max_bytes = getattr(settings, "COALESCE_MAX_BYTES", 1024 * 1024)
+        messages, size = [], 0
+
+        async def capture(message):
+            nonlocal messages, size
+            if messages is not None:
+                size += len(message.get("body", b""))
+                if size > max_bytes:
+                    messages = None
+                else:
+                    messages.append(message)
+            await send(message)
+
+        complete = False
+        try:
+            await self.app(scope, receive, capture)
+            complete = True
+        finally:
+            del self.flights[key]
+            flight.set_result(messages if complete else None)
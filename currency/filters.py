@@ -0,0 +1,71 @@
+"""Offers list filtering restricted to combinations backed by an index."""
+
+from ninja.errors import HttpError
+
+# Indexes of active offers in order of preference: (equality columns, range/sort column).
+OFFER_INDEXES = {
+    "offer_pair_rate_idx": (("currency_to_sell_id", "currency_to_buy_id"), "exchange_rate"),
+    "offer_seller_added_idx": (("seller_id",), "added_time"),
+    "offer_added_idx": ((), "added_time"),
+    "offer_rate_idx": ((), "exchange_rate"),
+    "offer_amount_idx": ((), "amount"),
+}
+
+RANGES = {
+    "exchange_rate": ("exchange_rate_min", "exchange_rate_max"),
+    "amount": ("amount_min", "amount_max"),
+    "added_time": ("added_after", "added_before"),
+}
+EQUALITIES = ("currency_to_sell_id", "currency_to_buy_id", "seller_id")
+
+
+def plan(filters):
+    """Pick the index serving the filters and sort, None means the primary key.
+
+    Raises 400 error when no index can serve the combination without
+    scanning every active offer.
+    """
+    equal = {name for name in EQUALITIES if getattr(filters, name) is not None}
+    ranged = {
+        column
+        for column, bounds in RANGES.items()
+        if any(getattr(filters, bound) is not None for bound in bounds)
+    }
+    sort = (filters.sort or "id").lstrip("-")
+    if not equal and not ranged and sort == "id":
+        return None
+
+    for name, (equal_columns, column) in OFFER_INDEXES.items():
+        prefix = []
+        for equal_column in equal_columns:
+            if equal_column not in equal:
+                break
+            prefix.append(equal_column)
+        # The range/sort column is only ordered once every equality column is fixed.
+        ordered = len(prefix) == len(equal_columns)
+        if sort != "id" and not (ordered and sort == column):
+            continue
+        # Filters have to narrow the index scan, not only be checked on every row.
+        if prefix or (ordered and column in ranged) or not (equal or ranged):
+            return name
+    raise HttpError(
+        400,
+        "Unsupported filter and sort combination, use one of: "
+        + "; ".join(
+            " + ".join(equal_columns + (column,))
+            for equal_columns, column in OFFER_INDEXES.values()
+        ),
+    )
+
+
+def filter_offers(offers, filters):
+    """Apply the filters and the sort to the active offers queryset."""
+    plan(filters)
+    lookups = {name: getattr(filters, name) for name in EQUALITIES}
+    for column, (low, high) in RANGES.items():
+        lookups[f"{column}__gte"] = getattr(filters, low)
+        lookups[f"{column}__lte"] = getattr(filters, high)
+    offers = offers.filter(**{key: value for key, value in lookups.items() if value is not None})
+    if filters.sort and filters.sort != "id":
+        return offers.order_by(filters.sort, "id")
+    return offers.order_by("id")
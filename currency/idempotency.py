@@ -0,0 +1,132 @@
+"""Idempotency-Key header support for write routes."""
+
+import asyncio
+import datetime
+import hashlib
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Q
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+
+from currency.models import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+POLL_INTERVAL = 0.05
+# Seconds past IDEMPOTENCY_WAIT after which an in-flight key is taken over by a retry
+LEASE_MARGIN = 30
+
+
+def get_ttl():
+    """Seconds a stored response is replayed for."""
+    return getattr(settings, "IDEMPOTENCY_KEY_TTL", 24 * 60 * 60)
+
+
+def claim(username, key, request_hash):
+    """Get the stored record for the key or create an in-flight one.
+
+    In-flight records of requests that outlived their lease, e.g. of a killed
+    worker, are replaced like expired ones.
+    """
+    now = timezone.now()
+    cutoff = now - datetime.timedelta(seconds=get_ttl())
+    lease = getattr(settings, "IDEMPOTENCY_WAIT", 10) + LEASE_MARGIN
+    IdempotencyKey.objects.filter(username=username, key=key).filter(
+        Q(created_at__lt=cutoff)
+        | Q(status_code__isnull=True, created_at__lt=now - datetime.timedelta(seconds=lease))
+    ).delete()
+    return IdempotencyKey.objects.get_or_create(
+        username=username, key=key, defaults={"request_hash": request_hash}
+    )
+
+
+def store(pk, status_code, response):
+    """Save the response of the finished request."""
+    IdempotencyKey.objects.filter(pk=pk).update(status_code=status_code, response=response)
+
+
+def release(pk):
+    """Forget the in-flight key of the failed request so that it can be retried."""
+    IdempotencyKey.objects.filter(pk=pk).delete()
+
+
+def load(pk):
+    """Get stored (status_code, response) or None if the key was released."""
+    return IdempotencyKey.objects.filter(pk=pk).values_list("status_code", "response").first()
+
+
+def purge_expired(batch_size=1000):
+    """Delete expired keys in small batches, return deleted count."""
+    cutoff = timezone.now() - datetime.timedelta(seconds=get_ttl())
+    expired = IdempotencyKey.objects.filter(created_at__lt=cutoff).order_by("created_at")
+    deleted = 0
+    while True:
+        ids = list(expired.values_list("pk", flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += IdempotencyKey.objects.filter(pk__in=ids).delete()[0]
+
+
+def _message(status, message):
+    return JsonResponse({"message": message}, status=status)
+
+
+async def _replay(pk):
+    """Wait for the in-flight request with the same key and return its response."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + getattr(settings, "IDEMPOTENCY_WAIT", 10)
+    while True:
+        stored = await sync_to_async(load)(pk)
+        if stored is None:
+            return _message(409, "Request with this Idempotency-Key failed, retry it")
+        status_code, response = stored
+        if status_code is not None:
+            return HttpResponse(
+                bytes(response),
+                status=status_code,
+                content_type="application/json",
+                headers={"Idempotent-Replayed": "true"},
+            )
+        if loop.time() >= deadline:
+            return _message(409, "Request with this Idempotency-Key is in progress")
+        await asyncio.sleep(POLL_INTERVAL)
+
+
+def idempotent(schemas):
+    """Replay the first response to requests repeating the Idempotency-Key header.
+
+    ``schemas`` maps status codes returned by the route to their response schemas.
+    """
+
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(request, *args, **kwargs):
+            key = request.headers.get(HEADER)
+            if not key:
+                return await func(request, *args, **kwargs)
+            if len(key) > 255:
+                return _message(400, f"{HEADER} must not exceed 255 chars")
+            username = request.auth if isinstance(request.auth, str) else ""
+            request_hash = hashlib.sha256(
+                request.method.encode() + request.path.encode() + request.body
+            ).hexdigest()
+            record, created = await sync_to_async(claim)(username, key, request_hash)
+            if record.request_hash != request_hash:
+                return _message(422, f"{HEADER} was already used for another request")
+            if not created:
+                return await _replay(record.pk)
+
+            try:
+                status_code, result = await func(request, *args, **kwargs)
+                response = schemas[status_code].from_orm(result).json(by_alias=True).encode()
+                await sync_to_async(store)(record.pk, status_code, response)
+            except BaseException:
+                await sync_to_async(release)(record.pk)
+                raise
+            return HttpResponse(response, status=status_code, content_type="application/json")
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,85 @@
+"""Currency image variants processing."""
+
+import hashlib
+import io
+import logging
+from pathlib import PurePosixPath
+
+from django.core.exceptions import SuspiciousOperation
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image
+
+from currency.models import Currency
+from currency.registry import currency_registry
+from currency.tasks import enqueue, task
+
+logger = logging.getLogger(__name__)
+
+VARIANTS_DIR = "currency/variants"
+VARIANT_SIZES = {"thumb": 64, "small": 128}
+VARIANT_FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 6}),
+    "png": ("PNG", {"optimize": True}),
+}
+
+
+def variant_name(source_name, label, extension, content):
+    """Build content-hashed file name for the variant."""
+    digest = hashlib.sha256(content).hexdigest()[:16]
+    stem = PurePosixPath(source_name).stem or "image"
+    return f"{VARIANTS_DIR}/{stem}-{label}-{digest}.{extension}"
+
+
+def render_variants(source_name, fp):
+    """Resize and compress the source image into every variant.
+
+    Returns a mapping like ``{"thumb_webp": "currency/variants/eur-thumb-<hash>.webp"}``.
+    """
+    variants = {}
+    with Image.open(fp) as source:
+        source.load()
+        has_alpha = source.mode in ("RGBA", "LA") or "transparency" in source.info
+        source = source.convert("RGBA" if has_alpha else "RGB")
+        for label, size in VARIANT_SIZES.items():
+            resized = source.copy()
+            resized.thumbnail((size, size), Image.LANCZOS)
+            for extension, (image_format, options) in VARIANT_FORMATS.items():
+                buffer = io.BytesIO()
+                resized.save(buffer, format=image_format, **options)
+                content = buffer.getvalue()
+                name = variant_name(source_name, label, extension, content)
+                if not default_storage.exists(name):
+                    default_storage.save(name, ContentFile(content))
+                variants[f"{label}_{extension}"] = name
+    return variants
+
+
+def generate_variants(currency_id):
+    """Generate image variants for the currency and store their names."""
+    currency = Currency.objects.filter(pk=currency_id).only("id", "image").first()
+    if currency is None or not currency.image:
+        return {}
+    source_name = currency.image.name
+    try:
+        with default_storage.open(source_name, "rb") as fp:
+            variants = render_variants(source_name, fp)
+    except (OSError, ValueError, SuspiciousOperation) as e:
+        logger.warning("Can't process image %s of currency %s: %s", source_name, currency_id, e)
+        variants = {}
+    # Skip the write if the image was replaced while we were processing it.
+    if Currency.objects.filter(pk=currency_id, image=source_name).update(image_variants=variants):
+        transaction.on_commit(currency_registry.invalidate)
+    return variants
+
+
+@task("currency.image_variants")
+def generate_variants_task(payload):
+    """Task generating variants of the currency image."""
+    generate_variants(payload["currency_id"])
+
+
+def schedule_variants(currency_id):
+    """Queue variants generation once the current transaction commits."""
+    enqueue("currency.image_variants", currency_id=currency_id)
@@ -0,0 +1,241 @@
+"""Bulk import of offers and currencies from CSV or NDJSON files.
+
+Files are parsed row by row and saved in chunks; every chunk commits its
+rows together with the job checkpoint, so an interrupted import resumes
+after the last committed chunk. Invalid rows are written to the errors file
+of the job as NDJSON lines.
+
+A runner claims the job with a lease renewed by every chunk; the job (and
+its task) is taken over by another runner only once the lease has passed,
+and a runner whose checkpoint was moved by another one stops.
+"""
+
+import csv
+import io
+import itertools
+import json
+import os
+from pathlib import PurePosixPath
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from pydantic import ValidationError
+
+from currency.images import schedule_variants
+from currency.models import Currency, ImportJob, Offer
+from currency.registry import currency_registry
+from currency.routing import offers_changed
+from currency.schemas import CurrencyIn, OfferIn
+from currency.tasks import LEASE, enqueue, renew_lease, task
+
+FORMATS = {".csv": ImportJob.CSV, ".ndjson": ImportJob.NDJSON, ".jsonl": ImportJob.NDJSON}
+
+
+class LeaseLost(Exception):
+    """Import job taken over by another runner."""
+
+
+def guess_format(name):
+    """File format by the file name extension, None if it's unknown."""
+    return FORMATS.get(PurePosixPath(name).suffix.lower())
+
+
+def read_rows(fp, file_format):
+    """Yield the rows of the binary file one at a time, ValueError for unparsable ones."""
+    text = io.TextIOWrapper(fp, encoding="utf-8-sig", newline="")
+    if file_format == ImportJob.CSV:
+        for row in csv.DictReader(text):
+            yield {key: value for key, value in row.items() if key is not None and value != ""}
+        return
+    for line in text:
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield ValueError(f"Invalid JSON: {e}")
+            continue
+        yield row if isinstance(row, dict) else ValueError("Row must be a JSON object")
+
+
+def _error_message(e):
+    if isinstance(e, ValidationError):
+        return "; ".join(
+            f"{'.'.join(str(loc) for loc in error['loc'])}: {error['msg']}" for error in e.errors()
+        )
+    if isinstance(e, DjangoValidationError):
+        return "; ".join(e.messages)
+    return str(e)
+
+
+def _parse(chunk, schema):
+    """Validate the chunk rows against the schema: (parsed, errors)."""
+    parsed, errors = [], []
+    for number, row in chunk:
+        try:
+            if isinstance(row, Exception):
+                raise row
+            parsed.append((number, schema.parse_obj(row)))
+        except (ValidationError, ValueError) as e:
+            errors.append((number, _error_message(e)))
+    return parsed, errors
+
+
+def offer_objects(chunk):
+    """Offers to create from the chunk rows and errors of the invalid ones."""
+    currencies = currency_registry.snapshot()
+    parsed, errors = _parse(chunk, OfferIn)
+    sellers = set(
+        User.objects.filter(pk__in={offer.seller_id for _, offer in parsed}).values_list(
+            "pk", flat=True
+        )
+    )
+    offers = []
+    for number, offer in parsed:
+        data = offer.dict(exclude={"id", "version", "added_time"})
+        for field in ("currency_to_sell_id", "currency_to_buy_id"):
+            currency = currencies.get(data[field])
+            if currency is None:
+                errors.append((number, f"{field}: unknown currency {data[field]}"))
+                break
+            data[field] = currency.pk
+        else:
+            if data["seller_id"] not in sellers:
+                errors.append((number, f"seller_id: unknown user {data['seller_id']}"))
+            elif data["amount"] <= 0 or data["exchange_rate"] <= 0:
+                errors.append((number, "amount and exchange_rate must be positive"))
+            else:
+                offers.append(Offer(**data))
+    return offers, errors
+
+
+def currency_objects(chunk):
+    """Currencies to create from the chunk rows and errors of the invalid ones."""
+    currencies = currency_registry.snapshot()
+    parsed, errors = _parse(chunk, CurrencyIn)
+    created = {}
+    for number, currency in parsed:
+        try:
+            code = Currency.normalize_code(currency.code)
+        except DjangoValidationError as e:
+            errors.append((number, f"code: {_error_message(e)}"))
+            continue
+        if currencies.get(code) or code in created:
+            errors.append((number, f"code: currency {code} already exists"))
+            continue
+        created[code] = Currency(code=code, name=currency.name, image=currency.image)
+    return list(created.values()), errors
+
+
+def _open_errors(job):
+    """Errors file of the job truncated to the checkpoint."""
+    if not job.errors:
+        job.errors.name = f"imports/{job.pk}-errors.ndjson"
+        ImportJob.objects.filter(pk=job.pk).update(errors=job.errors.name)
+    path = default_storage.path(job.errors.name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    errors_file = open(path, "r+b" if os.path.exists(path) else "w+b")
+    errors_file.seek(job.errors_size)
+    errors_file.truncate()
+    return errors_file
+
+
+def _run(job, batch_size):
+    model, build = {
+        ImportJob.OFFERS: (Offer, offer_objects),
+        ImportJob.CURRENCIES: (Currency, currency_objects),
+    }[job.kind]
+    rows_done = job.rows_done
+    with _open_errors(job) as errors_file, job.source.open("rb") as fp:
+        rows = itertools.islice(enumerate(read_rows(fp, job.format), start=1), rows_done, None)
+        while True:
+            chunk = list(itertools.islice(rows, batch_size))
+            if not chunk:
+                return
+            objects, errors = build(chunk)
+            for number, message in sorted(errors):
+                errors_file.write(json.dumps({"row": number, "error": message}).encode() + b"\n")
+            errors_file.flush()
+            os.fsync(errors_file.fileno())
+            with transaction.atomic():
+                created = model.objects.bulk_create(objects)
+                updated = ImportJob.objects.filter(pk=job.pk, rows_done=rows_done).update(
+                    rows_done=F("rows_done") + len(chunk),
+                    imported=F("imported") + len(created),
+                    failed=F("failed") + len(errors),
+                    errors_size=errors_file.tell(),
+                    lease_until=timezone.now() + LEASE,
+                )
+                if not updated:
+                    raise LeaseLost(f"Import job #{job.pk} was taken over")
+                rows_done += len(chunk)
+                renew_lease()
+                if model is Currency and created:
+                    transaction.on_commit(currency_registry.invalidate)
+                    for currency in created:
+                        schedule_variants(currency.pk)
+
+
+def run_import(job_id, batch_size=1000):
+    """Import the rest of the job file, return the job.
+
+    Jobs that are done or leased by another runner are returned as they are.
+    """
+    now = timezone.now()
+    claimed = (
+        ImportJob.objects.filter(pk=job_id)
+        .filter(
+            Q(status__in=(ImportJob.PENDING, ImportJob.FAILED))
+            | Q(status=ImportJob.RUNNING, lease_until__lt=now)
+        )
+        .update(status=ImportJob.RUNNING, lease_until=now + LEASE)
+    )
+    job = ImportJob.objects.get(pk=job_id)
+    if not claimed:
+        return job
+    try:
+        _run(job, batch_size)
+    except LeaseLost:
+        job.refresh_from_db()
+        return job
+    except Exception:
+        ImportJob.objects.filter(pk=job.pk).update(status=ImportJob.FAILED)
+        raise
+    finally:
+        if job.kind == ImportJob.OFFERS:
+            offers_changed()
+    ImportJob.objects.filter(pk=job.pk).update(status=ImportJob.DONE, finished_at=timezone.now())
+    job.refresh_from_db()
+    return job
+
+
+def read_errors(job, chunk_size=64 * 1024):
+    """Yield the committed part of the errors file in chunks."""
+    remaining = job.errors_size
+    with job.errors.open("rb") as fp:
+        while remaining > 0:
+            chunk = fp.read(min(chunk_size, remaining))
+            if not chunk:
+                return
+            remaining -= len(chunk)
+            yield chunk
+
+
+def create_import(kind, file_format, fp, name, username=""):
+    """Store the uploaded file and queue its import."""
+    with transaction.atomic():
+        job = ImportJob(kind=kind, format=file_format, created_by=username)
+        job.source.save(PurePosixPath(name).name, fp, save=False)
+        job.save()
+        enqueue("imports.run", job_id=job.pk)
+    return job
+
+
+@task("imports.run")
+def run_import_task(payload):
+    """Run the import, a retry resumes it from the last committed chunk."""
+    run_import(payload["job_id"])
@@ -0,0 +1,109 @@
+"""Per-user, per-currency running totals of deals."""
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Max
+
+from currency.archive import HISTORY_FIELDS
+from currency.models import ArchivedDeal, ArchivedOffer, Balance, Deal, Offer
+
+
+def entries(amount, offer, buyer_id):
+    """(user id, currency id, bought, sold) rows the deal adds to the ledger.
+
+    The buyer gets the amount of currency to sell and pays it multiplied by
+    the exchange rate in currency to buy, the seller the other way round.
+    """
+    price = amount * offer.exchange_rate
+    return (
+        (buyer_id, offer.currency_to_sell_id, amount, Decimal(0)),
+        (buyer_id, offer.currency_to_buy_id, Decimal(0), price),
+        (offer.seller_id, offer.currency_to_sell_id, Decimal(0), amount),
+        (offer.seller_id, offer.currency_to_buy_id, price, Decimal(0)),
+    )
+
+
+def post_deal(deal, offer):
+    """Add the deal to the balances, inside the transaction creating the deal."""
+    for user_id, currency_id, bought, sold in entries(deal.amount, offer, deal.buyer_id):
+        balance, created = Balance.objects.get_or_create(
+            user_id=user_id,
+            currency_id=currency_id,
+            defaults={"bought": bought, "sold": sold, "deals": 1},
+        )
+        if not created:
+            Balance.objects.filter(pk=balance.pk).update(
+                bought=F("bought") + bought, sold=F("sold") + sold, deals=F("deals") + 1
+            )
+
+
+def _history(after=0, until=None):
+    """Hot and archived deals with id in the range, ordered by id."""
+    deals = Deal.objects.filter(pk__gt=after)
+    archived = ArchivedDeal.objects.filter(pk__gt=after)
+    if until is not None:
+        deals = deals.filter(pk__lte=until)
+        archived = archived.filter(pk__lte=until)
+    return (
+        deals.values(*HISTORY_FIELDS)
+        .union(archived.values(*HISTORY_FIELDS), all=True)
+        .order_by("id")
+    )
+
+
+def _offers(ids):
+    """Offers by id, archived ones included."""
+    offers = Offer.objects.in_bulk(ids)
+    missing = [pk for pk in ids if pk not in offers]
+    if missing:
+        offers.update(ArchivedOffer.objects.in_bulk(missing))
+    return offers
+
+
+def compute_totals(until, batch_size=1000):
+    """Sum the ledger of every deal up to the given id, reading deals in batches."""
+    totals = defaultdict(lambda: [Decimal(0), Decimal(0), 0])
+    last_id = 0
+    while True:
+        deals = list(_history(after=last_id, until=until)[:batch_size])
+        if not deals:
+            return totals
+        offers = _offers({deal["offer_id"] for deal in deals})
+        for deal in deals:
+            for user_id, currency_id, bought, sold in entries(
+                deal["amount"], offers[deal["offer_id"]], deal["buyer_id"]
+            ):
+                total = totals[(user_id, currency_id)]
+                total[0] += bought
+                total[1] += sold
+                total[2] += 1
+        last_id = deals[-1]["id"]
+
+
+def reconcile(batch_size=1000):
+    """Rebuild balances from the deals history, return the number of balances.
+
+    Deals committed while the totals are computed are applied on top of them
+    in the transaction replacing the balances.
+    """
+    until = max(
+        Deal.objects.aggregate(last=Max("id"))["last"] or 0,
+        ArchivedDeal.objects.aggregate(last=Max("id"))["last"] or 0,
+    )
+    totals = compute_totals(until, batch_size)
+    with transaction.atomic():
+        Balance.objects.all().delete()
+        Balance.objects.bulk_create(
+            (
+                Balance(
+                    user_id=user_id, currency_id=currency_id, bought=bought, sold=sold, deals=deals
+                )
+                for (user_id, currency_id), (bought, sold, deals) in totals.items()
+            ),
+            batch_size=batch_size,
+        )
+        for deal in Deal.objects.filter(pk__gt=until).select_related("offer"):
+            post_deal(deal, deal.offer)
+    return len(totals)
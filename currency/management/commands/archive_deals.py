@@ -0,0 +1,32 @@
+"""Move old deals into the monthly archive."""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from currency.archive import archive_deals
+
+
+class Command(BaseCommand):
+    """Archive deals command."""
+
+    help = "Move deals older than DEAL_ARCHIVE_AFTER_DAYS into the archive in batches."
+
+    def add_arguments(self, parser):
+        """Command arguments."""
+        parser.add_argument(
+            "--older-than",
+            type=int,
+            default=getattr(settings, "DEAL_ARCHIVE_AFTER_DAYS", 365),
+            help="Archive deals made that many days ago or earlier.",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--pause", type=float, default=0, help="Seconds to sleep between batches."
+        )
+
+    def handle(self, *args, **options):
+        """Move deals batch by batch."""
+        moved = archive_deals(
+            options["older_than"], batch_size=options["batch_size"], pause=options["pause"]
+        )
+        self.stdout.write(self.style.SUCCESS(f"Archived {moved} deals"))
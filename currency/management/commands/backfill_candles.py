@@ -0,0 +1,72 @@
+"""Rebuild OHLC candles from deals history."""
+
+import itertools
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from currency.archive import deals_history
+from currency.candles import build_candles
+from currency.models import ArchivedOffer, Candle, Offer
+
+OFFER_FIELDS = ("id", "currency_to_sell_id", "currency_to_buy_id", "exchange_rate")
+
+
+def offers_by_id(offer_ids):
+    """Pair and rate of the offers, archived ones included."""
+    offers = {
+        row["id"]: SimpleNamespace(**row)
+        for row in Offer.objects.filter(pk__in=offer_ids).values(*OFFER_FIELDS)
+    }
+    missing = set(offer_ids) - offers.keys()
+    if missing:
+        offers.update(
+            (row["id"], SimpleNamespace(**row))
+            for row in ArchivedOffer.objects.filter(pk__in=missing).values(*OFFER_FIELDS)
+        )
+    return offers
+
+
+def history(batch_size):
+    """Yield hot and archived deals ordered by time, with their offers."""
+    deals = deals_history().iterator(chunk_size=batch_size)
+    while True:
+        chunk = [
+            SimpleNamespace(**deal) if isinstance(deal, dict) else deal
+            for deal in itertools.islice(deals, batch_size)
+        ]
+        if not chunk:
+            return
+        offers = offers_by_id({deal.offer_id for deal in chunk})
+        for deal in chunk:
+            yield SimpleNamespace(
+                amount=deal.amount, deal_time=deal.deal_time, offer=offers[deal.offer_id]
+            )
+
+
+class Command(BaseCommand):
+    """Backfill candles command."""
+
+    help = "Rebuild OHLC candles of every currency pair from hot and archived deals history."
+
+    def add_arguments(self, parser):
+        """Command arguments."""
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        """Stream deals ordered by time and insert candles in batches."""
+        batch_size = options["batch_size"]
+        created = 0
+        with transaction.atomic():
+            Candle.objects.all().delete()
+            batch = []
+            for candle in build_candles(history(batch_size)):
+                batch.append(candle)
+                if len(batch) >= batch_size:
+                    Candle.objects.bulk_create(batch)
+                    created += len(batch)
+                    batch = []
+            Candle.objects.bulk_create(batch)
+            created += len(batch)
+        self.stdout.write(self.style.SUCCESS(f"Created {created} candles"))
@@ -0,0 +1,17 @@
+"""Write the OpenAPI schema file of the deployment."""
+
+from django.core.management.base import BaseCommand
+
+from currency.api import api
+from currency.openapi import write_schema
+
+
+class Command(BaseCommand):
+    """Build OpenAPI schema command."""
+
+    help = "Generate the OpenAPI schema and write it to OPENAPI_SCHEMA_FILE."
+
+    def handle(self, *args, **options):
+        """Write the schema file."""
+        path = write_schema(api)
+        self.stdout.write(self.style.SUCCESS(f"Wrote OpenAPI schema to {path}"))
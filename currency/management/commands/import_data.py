@@ -0,0 +1,49 @@
+"""Bulk import offers or currencies from a CSV or NDJSON file."""
+
+from pathlib import Path
+
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+
+from currency.imports import guess_format, run_import
+from currency.models import ImportJob
+
+
+class Command(BaseCommand):
+    """Import data command."""
+
+    help = (
+        "Import offers or currencies from a CSV or NDJSON file in chunks. "
+        "Invalid rows are written to the errors file of the import job, "
+        "an interrupted import continues with --resume."
+    )
+
+    def add_arguments(self, parser):
+        """Command arguments."""
+        parser.add_argument("path", nargs="?", help="File to import.")
+        parser.add_argument("--kind", choices=(ImportJob.OFFERS, ImportJob.CURRENCIES))
+        parser.add_argument("--format", choices=(ImportJob.CSV, ImportJob.NDJSON))
+        parser.add_argument("--resume", type=int, help="Id of the import job to continue.")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        """Create the import job if needed and run it."""
+        if options["resume"]:
+            job_id = options["resume"]
+        else:
+            if not options["path"] or not options["kind"]:
+                raise CommandError("path and --kind are required unless --resume is given")
+            path = Path(options["path"])
+            file_format = options["format"] or guess_format(path.name)
+            if file_format is None:
+                raise CommandError("Can't guess the file format, pass --format")
+            job = ImportJob(kind=options["kind"], format=file_format)
+            with path.open("rb") as fp:
+                job.source.save(path.name, File(fp), save=False)
+            job.save()
+            job_id = job.pk
+            self.stdout.write(f"Import job #{job_id}")
+        job = run_import(job_id, batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Imported {job.imported} rows, {job.failed} failed"))
+        if job.failed:
+            self.stdout.write(f"Errors: {job.errors.path}")
@@ -0,0 +1,27 @@
+"""Write the offers snapshot restored by new workers."""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from currency.routing import offer_graph
+
+
+class Command(BaseCommand):
+    """Market snapshot command."""
+
+    help = (
+        "Write the active offers to the MARKET_SNAPSHOT_PATH snapshot, starting from the "
+        "previous snapshot if there is one, so new workers only load the offers changed since."
+    )
+
+    def add_arguments(self, parser):
+        """Command arguments."""
+        parser.add_argument("--path", help="Snapshot file, MARKET_SNAPSHOT_PATH by default")
+
+    def handle(self, *args, **options):
+        """Write the snapshot."""
+        path = options["path"] or getattr(settings, "MARKET_SNAPSHOT_PATH", None)
+        if path is None:
+            raise CommandError("Pass --path or set MARKET_SNAPSHOT_PATH")
+        count = offer_graph.dump(path)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {count} offers to {path}"))
@@ -0,0 +1,18 @@
+"""Print a token for the X-Profile request header."""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from currency.profiling import HEADER, make_token
+
+
+class Command(BaseCommand):
+    """Profile token command."""
+
+    help = "Print a signed token making requests with it in the X-Profile header profiled."
+
+    def handle(self, *args, **options):
+        """Print the header."""
+        max_age = getattr(settings, "PROFILE_TOKEN_MAX_AGE", 60 * 60)
+        self.stdout.write(f"{HEADER}: {make_token()}")
+        self.stderr.write(f"Valid for {max_age} seconds")
@@ -0,0 +1,20 @@
+"""Delete expired idempotency keys."""
+
+from django.core.management.base import BaseCommand
+
+from currency.idempotency import purge_expired
+
+
+class Command(BaseCommand):
+    """Purge idempotency keys command."""
+
+    help = "Delete idempotency keys older than IDEMPOTENCY_KEY_TTL in small batches."
+
+    def add_arguments(self, parser):
+        """Command arguments."""
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        """Delete expired keys."""
+        deleted = purge_expired(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} idempotency keys"))
@@ -0,0 +1,23 @@
+"""Delete expired refresh tokens and revoked sessions."""
+
+from django.core.management.base import BaseCommand
+
+from currency.tokens import purge_revoked
+
+
+class Command(BaseCommand):
+    """Purge refresh tokens command."""
+
+    help = (
+        "Delete expired refresh tokens and revoked sessions in small batches "
+        "and rebuild the revoked sessions filter shared by the workers."
+    )
+
+    def add_arguments(self, parser):
+        """Command arguments."""
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        """Delete expired rows."""
+        deleted = purge_revoked(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired tokens and sessions"))
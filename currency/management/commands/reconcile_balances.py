@@ -0,0 +1,20 @@
+"""Rebuild users balances from deals history."""
+
+from django.core.management.base import BaseCommand
+
+from currency.ledger import reconcile
+
+
+class Command(BaseCommand):
+    """Reconcile balances command."""
+
+    help = "Rebuild bought/sold totals of every user from hot and archived deals."
+
+    def add_arguments(self, parser):
+        """Command arguments."""
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        """Recompute balances."""
+        balances = reconcile(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {balances} balances"))
@@ -0,0 +1,37 @@
+"""Run queued tasks."""
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from currency import tasks
+
+
+class Command(BaseCommand):
+    """Task worker command."""
+
+    help = "Run tasks from the outbox, retrying failed ones with backoff."
+
+    def add_arguments(self, parser):
+        """Command arguments."""
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument(
+            "--poll", type=float, default=1, help="Seconds to wait when the queue is empty."
+        )
+        parser.add_argument("--once", action="store_true", help="Exit when the queue is empty.")
+
+    def handle(self, *args, **options):
+        """Run tasks until stopped."""
+        processed = 0
+        while True:
+            claimed = tasks.run_pending(options["batch_size"])
+            processed += claimed
+            if claimed:
+                continue
+            tasks.purge_finished()
+            if options["once"]:
+                break
+            time.sleep(options["poll"])
+            close_old_connections()
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} tasks"))
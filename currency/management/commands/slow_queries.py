@@ -0,0 +1,42 @@
+"""Print the slow queries logged by the workers."""
+
+from django.core.management.base import BaseCommand
+
+from currency.models import SlowQuery
+from currency.slowlog import slow_query_log
+
+ORDERINGS = {"total": "-total_time", "max": "-max_time", "count": "-count"}
+
+
+class Command(BaseCommand):
+    """Slow queries command."""
+
+    help = "Print the slow queries aggregated by fingerprint and route, the most costly first."
+
+    def add_arguments(self, parser):
+        """Command arguments."""
+        parser.add_argument("--limit", type=int, default=20)
+        parser.add_argument("--order", choices=sorted(ORDERINGS), default="total")
+        parser.add_argument("--route", help="Only queries of routes containing this text")
+        parser.add_argument("--explain", action="store_true", help="Print the query plans")
+        parser.add_argument("--reset", action="store_true", help="Delete the logged queries")
+
+    def handle(self, *args, **options):
+        """Print or delete the slow queries."""
+        slow_query_log.flush()
+        queries = SlowQuery.objects.all()
+        if options["route"]:
+            queries = queries.filter(route__contains=options["route"])
+        if options["reset"]:
+            deleted, _ = queries.delete()
+            self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} slow queries"))
+            return
+        for query in queries.order_by(ORDERINGS[options["order"]])[: options["limit"]]:
+            self.stdout.write(
+                f"{query.fingerprint} {query.route or '-'} count={query.count} "
+                f"total={query.total_time:.1f}ms max={query.max_time:.1f}ms"
+            )
+            self.stdout.write(f"    {query.normalized_sql}")
+            if options["explain"] and query.explain:
+                for line in query.explain.splitlines():
+                    self.stdout.write(f"    | {line}")
@@ -0,0 +1,52 @@
+"""Deactivate expired and filled offers, archive old inactive ones."""
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from currency import sweeper
+
+
+class Command(BaseCommand):
+    """Sweep offers command."""
+
+    help = "Deactivate expired and filled offers and archive old inactive ones."
+
+    def add_arguments(self, parser):
+        """Command arguments."""
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--archive-after",
+            type=int,
+            default=getattr(settings, "OFFER_ARCHIVE_AFTER_DAYS", 30),
+            help="Archive offers inactive for that many days.",
+        )
+        parser.add_argument(
+            "--loop",
+            type=int,
+            default=0,
+            help="Repeat the sweep every that many seconds instead of running once.",
+        )
+
+    def handle(self, *args, **options):
+        """Run the sweep once or forever."""
+        while True:
+            self.sweep(options["batch_size"], options["archive_after"])
+            if not options["loop"]:
+                return
+            time.sleep(options["loop"])
+            close_old_connections()
+
+    def sweep(self, batch_size, archive_after):
+        """Run every sweeping step."""
+        expired = sweeper.deactivate_expired(batch_size)
+        filled = sweeper.deactivate_filled(batch_size)
+        archived = sweeper.archive_inactive(archive_after, batch_size)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Deactivated {expired} expired and {filled} filled offers, "
+                f"archived {archived} offers"
+            )
+        )
@@ -0,0 +1,143 @@
+"""Market summary snapshot refreshed in the background."""
+
+import datetime
+import logging
+import threading
+import uuid
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Count, Min, Q, Sum
+from django.utils import timezone
+
+from currency.models import Deal, Offer
+from currency.schemas import MarketSummaryOut
+from currency.shared import get_shared_state
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_KEY = "market.summary"
+VERSION_KEY = "market.summary.version"
+
+
+def compute_summary():
+    """Aggregate active offers and last day deals per currency pair."""
+    pairs = {}
+    offers = (
+        Offer.objects.filter(
+            Q(expires_at__isnull=True) | Q(expires_at__gt=timezone.now()), active_state=True
+        )
+        .values("currency_to_sell_id", "currency_to_buy_id")
+        .annotate(best_rate=Min("exchange_rate"), depth=Sum("amount"), active_offers=Count("id"))
+        .order_by()
+    )
+    for row in offers:
+        key = (row["currency_to_sell_id"], row["currency_to_buy_id"])
+        pairs[key] = {**row, "volume_24h": 0}
+    deals = (
+        Deal.objects.filter(deal_time__gte=timezone.now() - datetime.timedelta(days=1))
+        .values("offer__currency_to_sell_id", "offer__currency_to_buy_id")
+        .annotate(volume_24h=Sum("amount"))
+        .order_by()
+    )
+    for row in deals:
+        key = (row["offer__currency_to_sell_id"], row["offer__currency_to_buy_id"])
+        pairs.setdefault(
+            key,
+            {
+                "currency_to_sell_id": key[0],
+                "currency_to_buy_id": key[1],
+                "best_rate": None,
+                "depth": 0,
+                "active_offers": 0,
+            },
+        )["volume_24h"] = row["volume_24h"]
+    return MarketSummaryOut(
+        generated_at=timezone.now(), pairs=[pairs[key] for key in sorted(pairs)]
+    )
+
+
+class MarketSummary:
+    """Serialized summary shared by the workers and the thread refreshing it.
+
+    Every worker runs a refresher, the ``market.summary.tick`` lock lets only
+    one of them recompute the snapshot per interval. The others copy it to
+    memory once its version in the shared state changes, so requests are
+    served without reading the shared state.
+    """
+
+    def __init__(self):
+        """Init stopped refresher."""
+        self._lock = threading.Lock()
+        self._thread = None
+        self._payload = None
+        self._version = None
+
+    @property
+    def interval(self):
+        """Refresh interval in seconds, 0 computes the summary per request."""
+        return getattr(settings, "MARKET_SUMMARY_INTERVAL", 5)
+
+    @property
+    def payload(self):
+        """Latest snapshot bytes of this process if it is served from memory, else None."""
+        if self.interval <= 0:
+            return None
+        return self._payload
+
+    def refresh(self):
+        """Recompute the snapshot and replace it in the shared cache and in memory."""
+        payload = compute_summary().json().encode()
+        state = get_shared_state()
+        state.set(SNAPSHOT_KEY, payload)
+        self._payload, self._version = payload, state.incr(VERSION_KEY)
+        return payload
+
+    def _pull(self):
+        """Copy the shared snapshot to memory if another worker replaced it."""
+        state = get_shared_state()
+        version = state.get(VERSION_KEY, 0)
+        if version != self._version:
+            payload = state.get(SNAPSHOT_KEY)
+            if payload is not None:
+                self._payload, self._version = payload, version
+
+    def get(self):
+        """Return JSON bytes of the summary, starting the refresher on first use."""
+        if self.interval <= 0:
+            return compute_summary().json().encode()
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="market-summary", daemon=True
+                )
+                self._thread.start()
+        if self._payload is None:
+            self._pull()
+        if self._payload is None:
+            with get_shared_state().lock("market.summary.initial", ttl=60, timeout=60):
+                self._pull()
+                if self._payload is None:
+                    self.refresh()
+        return self._payload
+
+    def _run(self):
+        state = get_shared_state()
+        owner = uuid.uuid4().hex
+        stop = threading.Event()
+        while not stop.wait(self.interval):
+            acquired = state.acquire("market.summary.tick", owner, self.interval / 2)
+            close_old_connections()
+            try:
+                if acquired:
+                    self.refresh()
+                else:
+                    self._pull()
+            except Exception:
+                logger.exception("Market summary refresh failed")
+            finally:
+                close_old_connections()
+
+
+market_summary = MarketSummary()
+
@@ -0,0 +1,20 @@
+# Generated by Django 4.1.3 on 2026-10-19 05:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("currency", "0004_deal_amount"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="currency",
+            name="image_variants",
+            field=models.JSONField(
+                blank=True, default=dict, editable=False, verbose_name="Image variants"
+            ),
+        ),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 4.1.3 on 2026-10-19 05:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("currency", "0005_currency_image_variants"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Candle",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                (
+                    "interval",
+                    models.CharField(
+                        choices=[("1m", "1 minute"), ("1h", "1 hour"), ("1d", "1 day")],
+                        max_length=2,
+                        verbose_name="Interval",
+                    ),
+                ),
+                ("bucket_start", models.DateTimeField(verbose_name="Bucket start")),
+                ("open", models.DecimalField(decimal_places=2, max_digits=11, verbose_name="Open")),
+                ("high", models.DecimalField(decimal_places=2, max_digits=11, verbose_name="High")),
+                ("low", models.DecimalField(decimal_places=2, max_digits=11, verbose_name="Low")),
+                (
+                    "close",
+                    models.DecimalField(decimal_places=2, max_digits=11, verbose_name="Close"),
+                ),
+                (
+                    "volume",
+                    models.DecimalField(decimal_places=2, max_digits=17, verbose_name="Volume"),
+                ),
+                (
+                    "quote_volume",
+                    models.DecimalField(
+                        decimal_places=4, max_digits=24, verbose_name="Volume in currency to buy"
+                    ),
+                ),
+                ("trades", models.PositiveIntegerField(default=0, verbose_name="Trades")),
+                (
+                    "currency_to_buy",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="currency.currency",
+                        verbose_name="Currency to buy",
+                    ),
+                ),
+                (
+                    "currency_to_sell",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="currency.currency",
+                        verbose_name="Currency to sell",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Candle",
+                "verbose_name_plural": "Candles",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="candle",
+            constraint=models.UniqueConstraint(
+                fields=("currency_to_sell", "currency_to_buy", "interval", "bucket_start"),
+                name="unique_candle_bucket",
+            ),
+        ),
+    ]
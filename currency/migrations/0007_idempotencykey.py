@@ -0,0 +1,46 @@
+# Generated by Django 4.1.3 on 2026-10-19 05:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("currency", "0006_candle"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="IdempotencyKey",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("username", models.CharField(max_length=150, verbose_name="Username")),
+                ("key", models.CharField(max_length=255, verbose_name="Key")),
+                ("request_hash", models.CharField(max_length=64, verbose_name="Request hash")),
+                (
+                    "status_code",
+                    models.PositiveSmallIntegerField(null=True, verbose_name="Status code"),
+                ),
+                ("response", models.BinaryField(default=b"", verbose_name="Response")),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="Created"),
+                ),
+            ],
+            options={
+                "verbose_name": "Idempotency key",
+                "verbose_name_plural": "Idempotency keys",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="idempotencykey",
+            constraint=models.UniqueConstraint(
+                fields=("username", "key"), name="unique_idempotency_key"
+            ),
+        ),
+    ]
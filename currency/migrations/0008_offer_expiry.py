@@ -0,0 +1,80 @@
+# Generated by Django 4.1.3 on 2026-10-19 05:28
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("currency", "0007_idempotencykey"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedOffer",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                (
+                    "amount",
+                    models.DecimalField(decimal_places=2, max_digits=11, verbose_name="Amount"),
+                ),
+                (
+                    "exchange_rate",
+                    models.DecimalField(
+                        decimal_places=2, max_digits=11, verbose_name="Exchange rate"
+                    ),
+                ),
+                ("added_time", models.DateTimeField(verbose_name="Added")),
+                ("expires_at", models.DateTimeField(blank=True, null=True, verbose_name="Expires")),
+                ("archived_time", models.DateTimeField(auto_now_add=True, verbose_name="Archived")),
+            ],
+            options={
+                "verbose_name": "Archived offer",
+                "verbose_name_plural": "Archived offers",
+            },
+        ),
+        migrations.AddField(
+            model_name="offer",
+            name="expires_at",
+            field=models.DateTimeField(blank=True, null=True, verbose_name="Expires"),
+        ),
+        migrations.AddIndex(
+            model_name="offer",
+            index=models.Index(
+                fields=["active_state", "expires_at"], name="currency_of_active__8531af_idx"
+            ),
+        ),
+        migrations.AddField(
+            model_name="archivedoffer",
+            name="currency_to_buy",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to="currency.currency",
+                verbose_name="Currency to buy",
+            ),
+        ),
+        migrations.AddField(
+            model_name="archivedoffer",
+            name="currency_to_sell",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to="currency.currency",
+                verbose_name="Currency to sell",
+            ),
+        ),
+        migrations.AddField(
+            model_name="archivedoffer",
+            name="seller",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to=settings.AUTH_USER_MODEL,
+                verbose_name="Seller",
+            ),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 4.1.3 on 2026-10-19 05:29
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("currency", "0008_offer_expiry"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="deal",
+            name="deal_time",
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name="Time"),
+        ),
+        migrations.CreateModel(
+            name="ArchivedDeal",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("offer_id", models.BigIntegerField(verbose_name="Offer")),
+                (
+                    "amount",
+                    models.DecimalField(decimal_places=2, max_digits=11, verbose_name="Amount"),
+                ),
+                ("deal_time", models.DateTimeField(verbose_name="Time")),
+                ("month", models.DateField(verbose_name="Month")),
+                (
+                    "buyer",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Buyer",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Archived deal",
+                "verbose_name_plural": "Archived deals",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="archiveddeal",
+            index=models.Index(fields=["month", "deal_time"], name="currency_ar_month_881298_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="archiveddeal",
+            index=models.Index(
+                fields=["offer_id", "deal_time"], name="currency_ar_offer_i_24d41d_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.1.3 on 2026-10-19 05:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("currency", "0009_archiveddeal"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="offer",
+            index=models.Index(
+                fields=["active_state", "currency_to_sell", "currency_to_buy", "exchange_rate"],
+                name="offer_pair_rate_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="offer",
+            index=models.Index(
+                fields=["active_state", "seller", "added_time"], name="offer_seller_added_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="offer",
+            index=models.Index(fields=["active_state", "added_time"], name="offer_added_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="offer",
+            index=models.Index(fields=["active_state", "exchange_rate"], name="offer_rate_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="offer",
+            index=models.Index(fields=["active_state", "amount"], name="offer_amount_idx"),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.1.3 on 2026-10-19 05:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("currency", "0010_offer_filter_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="currency",
+            name="version",
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name="Version"),
+        ),
+        migrations.AddField(
+            model_name="offer",
+            name="version",
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name="Version"),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 4.1.3 on 2026-10-19 05:35
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("currency", "0012_task"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Balance",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                (
+                    "bought",
+                    models.DecimalField(
+                        decimal_places=4, default=0, max_digits=24, verbose_name="Bought"
+                    ),
+                ),
+                (
+                    "sold",
+                    models.DecimalField(
+                        decimal_places=4, default=0, max_digits=24, verbose_name="Sold"
+                    ),
+                ),
+                ("deals", models.PositiveIntegerField(default=0, verbose_name="Deals")),
+                (
+                    "currency",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="currency.currency",
+                        verbose_name="Currency",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="balances",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="User",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Balance",
+                "verbose_name_plural": "Balances",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="balance",
+            constraint=models.UniqueConstraint(
+                fields=("user", "currency"), name="unique_user_balance"
+            ),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 4.1.3 on 2026-10-19 05:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("currency", "0013_balance"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RevokedSession",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("session", models.CharField(max_length=32, unique=True, verbose_name="Session")),
+                ("expires_at", models.DateTimeField(db_index=True, verbose_name="Expires at")),
+                ("revoked_at", models.DateTimeField(auto_now_add=True, verbose_name="Revoked at")),
+            ],
+            options={
+                "verbose_name": "Revoked session",
+                "verbose_name_plural": "Revoked sessions",
+            },
+        ),
+        migrations.CreateModel(
+            name="RefreshToken",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("jti", models.CharField(max_length=32, unique=True, verbose_name="Token id")),
+                ("session", models.CharField(db_index=True, max_length=32, verbose_name="Session")),
+                ("expires_at", models.DateTimeField(db_index=True, verbose_name="Expires at")),
+                ("used_at", models.DateTimeField(blank=True, null=True, verbose_name="Used at")),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="refresh_tokens",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="User",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Refresh token",
+                "verbose_name_plural": "Refresh tokens",
+            },
+        ),
+    ]
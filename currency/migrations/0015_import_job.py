@@ -0,0 +1,79 @@
+# Generated by Django 4.1.3 on 2026-10-19 05:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("currency", "0014_refresh_tokens"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ImportJob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[("offers", "Offers"), ("currencies", "Currencies")],
+                        max_length=10,
+                        verbose_name="Kind",
+                    ),
+                ),
+                (
+                    "format",
+                    models.CharField(
+                        choices=[("csv", "CSV"), ("ndjson", "NDJSON")],
+                        max_length=6,
+                        verbose_name="Format",
+                    ),
+                ),
+                ("source", models.FileField(upload_to="imports/", verbose_name="Source file")),
+                (
+                    "errors",
+                    models.FileField(blank=True, upload_to="imports/", verbose_name="Errors file"),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("running", "Running"),
+                            ("done", "Done"),
+                            ("failed", "Failed"),
+                        ],
+                        default="pending",
+                        max_length=7,
+                        verbose_name="Status",
+                    ),
+                ),
+                ("rows_done", models.PositiveIntegerField(default=0, verbose_name="Rows done")),
+                ("imported", models.PositiveIntegerField(default=0, verbose_name="Imported")),
+                ("failed", models.PositiveIntegerField(default=0, verbose_name="Failed")),
+                (
+                    "errors_size",
+                    models.PositiveBigIntegerField(default=0, verbose_name="Errors file size"),
+                ),
+                (
+                    "created_by",
+                    models.CharField(blank=True, max_length=150, verbose_name="Created by"),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True, verbose_name="Created")),
+                (
+                    "finished_at",
+                    models.DateTimeField(blank=True, null=True, verbose_name="Finished"),
+                ),
+            ],
+            options={
+                "verbose_name": "Import job",
+                "verbose_name_plural": "Import jobs",
+            },
+        ),
+    ]
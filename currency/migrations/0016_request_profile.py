@@ -0,0 +1,41 @@
+# Generated by Django 4.1.3 on 2026-10-19 05:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("currency", "0015_import_job"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RequestProfile",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("method", models.CharField(max_length=10, verbose_name="Method")),
+                ("path", models.CharField(max_length=2000, verbose_name="Path")),
+                ("status_code", models.PositiveSmallIntegerField(verbose_name="Status code")),
+                ("duration", models.FloatField(verbose_name="Duration, ms")),
+                ("samples", models.PositiveIntegerField(verbose_name="Samples")),
+                ("query_count", models.PositiveIntegerField(verbose_name="Queries")),
+                ("query_time", models.FloatField(verbose_name="Queries time, ms")),
+                ("queries", models.JSONField(default=list, verbose_name="Queries")),
+                (
+                    "stacks_file",
+                    models.CharField(max_length=255, verbose_name="Collapsed stacks file"),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True, verbose_name="Created")),
+            ],
+            options={
+                "verbose_name": "Request profile",
+                "verbose_name_plural": "Request profiles",
+            },
+        ),
+    ]
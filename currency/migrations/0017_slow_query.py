@@ -0,0 +1,44 @@
+# Generated by Django 4.1.3 on 2026-10-19 05:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("currency", "0016_request_profile"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SlowQuery",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("fingerprint", models.CharField(max_length=16, verbose_name="Fingerprint")),
+                ("route", models.CharField(blank=True, max_length=255, verbose_name="Route")),
+                ("normalized_sql", models.TextField(verbose_name="Normalized SQL")),
+                ("example_sql", models.TextField(verbose_name="Example SQL")),
+                ("count", models.PositiveIntegerField(default=0, verbose_name="Count")),
+                ("total_time", models.FloatField(default=0, verbose_name="Total time, ms")),
+                ("max_time", models.FloatField(default=0, verbose_name="Max time, ms")),
+                ("explain", models.TextField(blank=True, verbose_name="Plan")),
+                ("first_seen", models.DateTimeField(auto_now_add=True, verbose_name="First seen")),
+                ("last_seen", models.DateTimeField(auto_now=True, verbose_name="Last seen")),
+            ],
+            options={
+                "verbose_name": "Slow query",
+                "verbose_name_plural": "Slow queries",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="slowquery",
+            constraint=models.UniqueConstraint(
+                fields=("fingerprint", "route"), name="unique_slow_query"
+            ),
+        ),
+    ]
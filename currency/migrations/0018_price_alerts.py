@@ -0,0 +1,144 @@
+# Generated by Django 4.1.3 on 2026-10-19 05:54
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("currency", "0017_slow_query"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PriceAlert",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                (
+                    "max_rate",
+                    models.DecimalField(decimal_places=2, max_digits=11, verbose_name="Max rate"),
+                ),
+                (
+                    "min_amount",
+                    models.DecimalField(
+                        decimal_places=2, default=0, max_digits=11, verbose_name="Min amount"
+                    ),
+                ),
+                ("active", models.BooleanField(default=True, verbose_name="Active")),
+                ("created_at", models.DateTimeField(auto_now_add=True, verbose_name="Created")),
+                (
+                    "triggered_at",
+                    models.DateTimeField(blank=True, null=True, verbose_name="Triggered"),
+                ),
+                (
+                    "currency_to_buy",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="currency.currency",
+                        verbose_name="Currency to buy",
+                    ),
+                ),
+                (
+                    "currency_to_sell",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="currency.currency",
+                        verbose_name="Currency to sell",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="price_alerts",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="User",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Price alert",
+                "verbose_name_plural": "Price alerts",
+            },
+        ),
+        migrations.CreateModel(
+            name="Notification",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                (
+                    "exchange_rate",
+                    models.DecimalField(
+                        decimal_places=2, max_digits=11, verbose_name="Exchange rate"
+                    ),
+                ),
+                (
+                    "amount",
+                    models.DecimalField(decimal_places=2, max_digits=11, verbose_name="Amount"),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True, verbose_name="Created")),
+                (
+                    "alert",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="notifications",
+                        to="currency.pricealert",
+                        verbose_name="Alert",
+                    ),
+                ),
+                (
+                    "offer",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="currency.offer",
+                        verbose_name="Offer",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="notifications",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="User",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Notification",
+                "verbose_name_plural": "Notifications",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="pricealert",
+            index=models.Index(
+                condition=models.Q(("active", True)),
+                fields=["currency_to_sell", "currency_to_buy", "-max_rate"],
+                name="alert_pair_rate_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="pricealert",
+            index=models.Index(fields=["user", "created_at"], name="alert_user_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(fields=["user", "id"], name="notification_user_idx"),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.3 on 2026-10-19 06:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("currency", "0018_price_alerts"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="importjob",
+            name="lease_until",
+            field=models.DateTimeField(blank=True, null=True, verbose_name="Lease until"),
+        ),
+    ]
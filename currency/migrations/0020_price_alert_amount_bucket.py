@@ -0,0 +1,38 @@
+# Generated by Django 4.1.3 on 2026-10-19 06:25
+
+from django.db import migrations, models
+
+
+def bucket_alerts(apps, schema_editor):
+    PriceAlert = apps.get_model("currency", "PriceAlert")
+    for alert in PriceAlert.objects.filter(min_amount__gte=1).only("min_amount").iterator():
+        alert.amount_bucket = int(alert.min_amount).bit_length()
+        alert.save(update_fields=["amount_bucket"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("currency", "0019_import_job_lease"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="pricealert",
+            name="alert_pair_rate_idx",
+        ),
+        migrations.AddField(
+            model_name="pricealert",
+            name="amount_bucket",
+            field=models.PositiveSmallIntegerField(default=0, verbose_name="Amount bucket"),
+        ),
+        migrations.RunPython(bucket_alerts, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="pricealert",
+            index=models.Index(
+                condition=models.Q(("active", True)),
+                fields=["currency_to_sell", "currency_to_buy", "amount_bucket", "-max_rate"],
+                name="alert_pair_bucket_rate_idx",
+            ),
+        ),
+    ]
@@ -16,16 +16,25 @@ class Currency(models.Model):
         max_length=100, blank=False, null=False, verbose_name="Name"
     )
     image = models.ImageField(verbose_name="Image")
+    image_variants = models.JSONField(
+        default=dict, blank=True, editable=False, verbose_name="Image variants"
+    )
+    version = models.PositiveIntegerField(default=0, editable=False, verbose_name="Version")
 
     def __str__(self):
         """String representation of the object."""
         return self.code
 
+    @staticmethod
+    def normalize_code(code):
+        """Check currency code length and transform it to uppercase."""
+        if len(code) != 3:
+            raise ValidationError("Currency code length must be equal to 3 chars")
+        return code.upper()
+
     def save(self, *args, **kwargs):
         """Transform currency code to uppercase on save."""
-        if len(self.code) != 3:
-            raise ValidationError("Currency code length must be equal to 3 chars")
-        self.code = self.code.upper()
+        self.code = self.normalize_code(self.code)
         super().save(*args, **kwargs)
 
     class Meta:
@@ -65,6 +74,8 @@ class Offer(models.Model):
     )
     added_time = models.DateTimeField(auto_now=True, verbose_name="Added")
     active_state = models.BooleanField(default=True, verbose_name="Active state")
+    expires_at = models.DateTimeField(null=True, blank=True, verbose_name="Expires")
+    version = models.PositiveIntegerField(default=0, editable=False, verbose_name="Version")
 
     def __str__(self):
         """String representation of the object."""
@@ -81,6 +92,57 @@ class Offer(models.Model):
 
         verbose_name = "Offer"
         verbose_name_plural = "Offers"
+        indexes = [
+            models.Index(fields=("active_state", "expires_at")),
+            models.Index(
+                fields=("active_state", "currency_to_sell", "currency_to_buy", "exchange_rate"),
+                name="offer_pair_rate_idx",
+            ),
+            models.Index(
+                fields=("active_state", "seller", "added_time"), name="offer_seller_added_idx"
+            ),
+            models.Index(fields=("active_state", "added_time"), name="offer_added_idx"),
+            models.Index(fields=("active_state", "exchange_rate"), name="offer_rate_idx"),
+            models.Index(fields=("active_state", "amount"), name="offer_amount_idx"),
+        ]
+
+
+class ArchivedOffer(models.Model):
+    """Inactive offer moved out of the offers table."""
+
+    id = models.BigIntegerField(primary_key=True)
+    currency_to_sell = models.ForeignKey(
+        to="Currency",
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="Currency to sell",
+    )
+    currency_to_buy = models.ForeignKey(
+        to="Currency",
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="Currency to buy",
+    )
+    amount = models.DecimalField(decimal_places=2, max_digits=11, verbose_name="Amount")
+    exchange_rate = models.DecimalField(
+        decimal_places=2, max_digits=11, verbose_name="Exchange rate"
+    )
+    seller = models.ForeignKey(
+        to=User, on_delete=models.CASCADE, related_name="+", verbose_name="Seller"
+    )
+    added_time = models.DateTimeField(verbose_name="Added")
+    expires_at = models.DateTimeField(null=True, blank=True, verbose_name="Expires")
+    archived_time = models.DateTimeField(auto_now_add=True, verbose_name="Archived")
+
+    def __str__(self):
+        """String representation of the object."""
+        return f"{self.currency_to_sell_id} -> {self.currency_to_buy_id}: {self.exchange_rate}"
+
+    class Meta:
+        """Meta properties."""
+
+        verbose_name = "Archived offer"
+        verbose_name_plural = "Archived offers"
 
 
 class Deal(models.Model):
@@ -95,7 +157,7 @@ class Deal(models.Model):
     amount = models.DecimalField(
         decimal_places=2, max_digits=11, blank=False, null=False, verbose_name="Amount"
     )
-    deal_time = models.DateTimeField(auto_now=True, verbose_name="Time")
+    deal_time = models.DateTimeField(auto_now=True, db_index=True, verbose_name="Time")
 
     def __str__(self):
         """String representation of the object."""
@@ -111,3 +173,397 @@ class Deal(models.Model):
 
         verbose_name = "Deal"
         verbose_name_plural = "Deals"
+
+
+class Candle(models.Model):
+    """OHLC candle of deals per currency pair and time bucket."""
+
+    INTERVAL_CHOICES = (("1m", "1 minute"), ("1h", "1 hour"), ("1d", "1 day"))
+
+    currency_to_sell = models.ForeignKey(
+        to="Currency",
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="Currency to sell",
+    )
+    currency_to_buy = models.ForeignKey(
+        to="Currency",
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="Currency to buy",
+    )
+    interval = models.CharField(max_length=2, choices=INTERVAL_CHOICES, verbose_name="Interval")
+    bucket_start = models.DateTimeField(verbose_name="Bucket start")
+    open = models.DecimalField(decimal_places=2, max_digits=11, verbose_name="Open")
+    high = models.DecimalField(decimal_places=2, max_digits=11, verbose_name="High")
+    low = models.DecimalField(decimal_places=2, max_digits=11, verbose_name="Low")
+    close = models.DecimalField(decimal_places=2, max_digits=11, verbose_name="Close")
+    volume = models.DecimalField(decimal_places=2, max_digits=17, verbose_name="Volume")
+    quote_volume = models.DecimalField(
+        decimal_places=4, max_digits=24, verbose_name="Volume in currency to buy"
+    )
+    trades = models.PositiveIntegerField(default=0, verbose_name="Trades")
+
+    def __str__(self):
+        """String representation of the object."""
+        return (
+            f"{self.currency_to_sell_id} -> {self.currency_to_buy_id}: "
+            f"{self.interval} {self.bucket_start}"
+        )
+
+    class Meta:
+        """Meta properties."""
+
+        verbose_name = "Candle"
+        verbose_name_plural = "Candles"
+        constraints = [
+            models.UniqueConstraint(
+                fields=("currency_to_sell", "currency_to_buy", "interval", "bucket_start"),
+                name="unique_candle_bucket",
+            )
+        ]
+
+
+class IdempotencyKey(models.Model):
+    """Stored response of a write request made with Idempotency-Key header."""
+
+    username = models.CharField(max_length=150, verbose_name="Username")
+    key = models.CharField(max_length=255, verbose_name="Key")
+    request_hash = models.CharField(max_length=64, verbose_name="Request hash")
+    status_code = models.PositiveSmallIntegerField(null=True, verbose_name="Status code")
+    response = models.BinaryField(default=b"", verbose_name="Response")
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="Created")
+
+    def __str__(self):
+        """String representation of the object."""
+        return self.username + ": " + self.key
+
+    class Meta:
+        """Meta properties."""
+
+        verbose_name = "Idempotency key"
+        verbose_name_plural = "Idempotency keys"
+        constraints = [
+            models.UniqueConstraint(fields=("username", "key"), name="unique_idempotency_key")
+        ]
+
+
+class ArchivedDeal(models.Model):
+    """Deal moved out of the deals table, keyed by the month it was made in."""
+
+    id = models.BigIntegerField(primary_key=True)
+    buyer = models.ForeignKey(
+        to=User, related_name="+", on_delete=models.PROTECT, verbose_name="Buyer"
+    )
+    offer_id = models.BigIntegerField(verbose_name="Offer")
+    amount = models.DecimalField(decimal_places=2, max_digits=11, verbose_name="Amount")
+    deal_time = models.DateTimeField(verbose_name="Time")
+    month = models.DateField(verbose_name="Month")
+
+    def __str__(self):
+        """String representation of the object."""
+        return f"{self.offer_id}: {self.amount}"
+
+    class Meta:
+        """Meta properties."""
+
+        verbose_name = "Archived deal"
+        verbose_name_plural = "Archived deals"
+        indexes = [
+            models.Index(fields=("month", "deal_time")),
+            models.Index(fields=("offer_id", "deal_time")),
+        ]
+
+
+class Task(models.Model):
+    """Outbox of side effects to run after the write that scheduled them committed."""
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = (
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    )
+
+    name = models.CharField(max_length=100, verbose_name="Name")
+    payload = models.JSONField(default=dict, verbose_name="Payload")
+    status = models.CharField(
+        max_length=7, choices=STATUS_CHOICES, default=PENDING, verbose_name="Status"
+    )
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="Attempts")
+    run_after = models.DateTimeField(verbose_name="Run after")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Created")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Finished")
+    last_error = models.TextField(blank=True, verbose_name="Last error")
+
+    def __str__(self):
+        """String representation of the object."""
+        return f"{self.name} #{self.pk}"
+
+    class Meta:
+        """Meta properties."""
+
+        verbose_name = "Task"
+        verbose_name_plural = "Tasks"
+        indexes = [models.Index(fields=("status", "run_after"))]
+
+
+class Balance(models.Model):
+    """Running totals of currency a user bought and sold in deals."""
+
+    user = models.ForeignKey(
+        to=User, on_delete=models.CASCADE, related_name="balances", verbose_name="User"
+    )
+    currency = models.ForeignKey(
+        to="Currency", on_delete=models.CASCADE, related_name="+", verbose_name="Currency"
+    )
+    bought = models.DecimalField(
+        decimal_places=4, max_digits=24, default=0, verbose_name="Bought"
+    )
+    sold = models.DecimalField(decimal_places=4, max_digits=24, default=0, verbose_name="Sold")
+    deals = models.PositiveIntegerField(default=0, verbose_name="Deals")
+
+    def __str__(self):
+        """String representation of the object."""
+        return f"{self.user_id}: {self.currency_id}"
+
+    class Meta:
+        """Meta properties."""
+
+        verbose_name = "Balance"
+        verbose_name_plural = "Balances"
+        constraints = [
+            models.UniqueConstraint(fields=("user", "currency"), name="unique_user_balance")
+        ]
+
+
+class RefreshToken(models.Model):
+    """Refresh token issued for a sign in session, usable once."""
+
+    jti = models.CharField(max_length=32, unique=True, verbose_name="Token id")
+    session = models.CharField(max_length=32, db_index=True, verbose_name="Session")
+    user = models.ForeignKey(
+        to=User, on_delete=models.CASCADE, related_name="refresh_tokens", verbose_name="User"
+    )
+    expires_at = models.DateTimeField(db_index=True, verbose_name="Expires at")
+    used_at = models.DateTimeField(blank=True, null=True, verbose_name="Used at")
+
+    def __str__(self):
+        """String representation of the object."""
+        return self.jti
+
+    class Meta:
+        """Meta properties."""
+
+        verbose_name = "Refresh token"
+        verbose_name_plural = "Refresh tokens"
+
+
+class RevokedSession(models.Model):
+    """Sign in session whose access and refresh tokens are rejected."""
+
+    session = models.CharField(max_length=32, unique=True, verbose_name="Session")
+    expires_at = models.DateTimeField(db_index=True, verbose_name="Expires at")
+    revoked_at = models.DateTimeField(auto_now_add=True, verbose_name="Revoked at")
+
+    def __str__(self):
+        """String representation of the object."""
+        return self.session
+
+    class Meta:
+        """Meta properties."""
+
+        verbose_name = "Revoked session"
+        verbose_name_plural = "Revoked sessions"
+
+
+class ImportJob(models.Model):
+    """Bulk import of offers or currencies from an uploaded CSV or NDJSON file.
+
+    ``rows_done`` and ``errors_size`` are the checkpoint the import resumes from,
+    a running import is taken over by another runner once ``lease_until`` passes.
+    """
+
+    OFFERS = "offers"
+    CURRENCIES = "currencies"
+    KIND_CHOICES = ((OFFERS, "Offers"), (CURRENCIES, "Currencies"))
+    CSV = "csv"
+    NDJSON = "ndjson"
+    FORMAT_CHOICES = ((CSV, "CSV"), (NDJSON, "NDJSON"))
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = (
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    )
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, verbose_name="Kind")
+    format = models.CharField(max_length=6, choices=FORMAT_CHOICES, verbose_name="Format")
+    source = models.FileField(upload_to="imports/", verbose_name="Source file")
+    errors = models.FileField(upload_to="imports/", blank=True, verbose_name="Errors file")
+    status = models.CharField(
+        max_length=7, choices=STATUS_CHOICES, default=PENDING, verbose_name="Status"
+    )
+    rows_done = models.PositiveIntegerField(default=0, verbose_name="Rows done")
+    imported = models.PositiveIntegerField(default=0, verbose_name="Imported")
+    failed = models.PositiveIntegerField(default=0, verbose_name="Failed")
+    errors_size = models.PositiveBigIntegerField(default=0, verbose_name="Errors file size")
+    lease_until = models.DateTimeField(null=True, blank=True, verbose_name="Lease until")
+    created_by = models.CharField(max_length=150, blank=True, verbose_name="Created by")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Created")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Finished")
+
+    def __str__(self):
+        """String representation of the object."""
+        return f"{self.kind} import #{self.pk}"
+
+    class Meta:
+        """Meta properties."""
+
+        verbose_name = "Import job"
+        verbose_name_plural = "Import jobs"
+
+
+class RequestProfile(models.Model):
+    """Sampled profile of a single request, the stacks are kept in a file."""
+
+    method = models.CharField(max_length=10, verbose_name="Method")
+    path = models.CharField(max_length=2000, verbose_name="Path")
+    status_code = models.PositiveSmallIntegerField(verbose_name="Status code")
+    duration = models.FloatField(verbose_name="Duration, ms")
+    samples = models.PositiveIntegerField(verbose_name="Samples")
+    query_count = models.PositiveIntegerField(verbose_name="Queries")
+    query_time = models.FloatField(verbose_name="Queries time, ms")
+    queries = models.JSONField(default=list, verbose_name="Queries")
+    stacks_file = models.CharField(max_length=255, verbose_name="Collapsed stacks file")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Created")
+
+    def __str__(self):
+        """String representation of the object."""
+        return f"{self.method} {self.path} #{self.pk}"
+
+    class Meta:
+        """Meta properties."""
+
+        verbose_name = "Request profile"
+        verbose_name_plural = "Request profiles"
+
+
+class SlowQuery(models.Model):
+    """Queries slower than SLOW_QUERY_THRESHOLD aggregated by fingerprint and route."""
+
+    fingerprint = models.CharField(max_length=16, verbose_name="Fingerprint")
+    route = models.CharField(max_length=255, blank=True, verbose_name="Route")
+    normalized_sql = models.TextField(verbose_name="Normalized SQL")
+    example_sql = models.TextField(verbose_name="Example SQL")
+    count = models.PositiveIntegerField(default=0, verbose_name="Count")
+    total_time = models.FloatField(default=0, verbose_name="Total time, ms")
+    max_time = models.FloatField(default=0, verbose_name="Max time, ms")
+    explain = models.TextField(blank=True, verbose_name="Plan")
+    first_seen = models.DateTimeField(auto_now_add=True, verbose_name="First seen")
+    last_seen = models.DateTimeField(auto_now=True, verbose_name="Last seen")
+
+    def __str__(self):
+        """String representation of the object."""
+        return f"{self.fingerprint} {self.route}"
+
+    class Meta:
+        """Meta properties."""
+
+        verbose_name = "Slow query"
+        verbose_name_plural = "Slow queries"
+        constraints = [
+            models.UniqueConstraint(fields=("fingerprint", "route"), name="unique_slow_query")
+        ]
+
+
+class PriceAlert(models.Model):
+    """Alert of the user on offers of the pair at an exchange rate up to the threshold."""
+
+    user = models.ForeignKey(
+        to=User, on_delete=models.CASCADE, related_name="price_alerts", verbose_name="User"
+    )
+    currency_to_sell = models.ForeignKey(
+        to="Currency", on_delete=models.CASCADE, related_name="+", verbose_name="Currency to sell"
+    )
+    currency_to_buy = models.ForeignKey(
+        to="Currency", on_delete=models.CASCADE, related_name="+", verbose_name="Currency to buy"
+    )
+    max_rate = models.DecimalField(decimal_places=2, max_digits=11, verbose_name="Max rate")
+    min_amount = models.DecimalField(
+        decimal_places=2, max_digits=11, default=0, verbose_name="Min amount"
+    )
+    amount_bucket = models.PositiveSmallIntegerField(default=0, verbose_name="Amount bucket")
+    active = models.BooleanField(default=True, verbose_name="Active")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Created")
+    triggered_at = models.DateTimeField(null=True, blank=True, verbose_name="Triggered")
+
+    def __str__(self):
+        """String representation of the object."""
+        return f"{self.currency_to_sell_id} -> {self.currency_to_buy_id}: {self.max_rate}"
+
+    @staticmethod
+    def bucket(amount):
+        """Bucket of the amount, the bit length of its integer part."""
+        return int(amount).bit_length()
+
+    def save(self, *args, **kwargs):
+        """Bucket the min amount on save."""
+        self.amount_bucket = self.bucket(self.min_amount)
+        super().save(*args, **kwargs)
+
+    class Meta:
+        """Meta properties."""
+
+        verbose_name = "Price alert"
+        verbose_name_plural = "Price alerts"
+        indexes = [
+            models.Index(
+                fields=("currency_to_sell", "currency_to_buy", "amount_bucket", "-max_rate"),
+                condition=models.Q(active=True),
+                name="alert_pair_bucket_rate_idx",
+            ),
+            models.Index(fields=("user", "created_at"), name="alert_user_idx"),
+        ]
+
+
+class Notification(models.Model):
+    """Offer matching a price alert of the user."""
+
+    user = models.ForeignKey(
+        to=User, on_delete=models.CASCADE, related_name="notifications", verbose_name="User"
+    )
+    alert = models.ForeignKey(
+        to=PriceAlert, on_delete=models.CASCADE, related_name="notifications", verbose_name="Alert"
+    )
+    offer = models.ForeignKey(
+        to=Offer,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name="+",
+        verbose_name="Offer",
+    )
+    exchange_rate = models.DecimalField(
+        decimal_places=2, max_digits=11, verbose_name="Exchange rate"
+    )
+    amount = models.DecimalField(decimal_places=2, max_digits=11, verbose_name="Amount")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Created")
+
+    def __str__(self):
+        """String representation of the object."""
+        return f"{self.user_id}: {self.alert_id}"
+
+    class Meta:
+        """Meta properties."""
+
+        verbose_name = "Notification"
+        verbose_name_plural = "Notifications"
+        indexes = [models.Index(fields=("user", "id"), name="notification_user_idx")]
@@ -0,0 +1,60 @@
+"""OpenAPI schema generated once per process and served as pre-serialized bytes."""
+
+import gzip
+import hashlib
+import json
+import logging
+from pathlib import Path
+
+from django.conf import settings
+from ninja.responses import NinjaJSONEncoder
+
+logger = logging.getLogger(__name__)
+
+
+def schema_file():
+    """Path of the schema file written by the build_openapi command."""
+    return Path(getattr(settings, "OPENAPI_SCHEMA_FILE", settings.BASE_DIR / "openapi.json"))
+
+
+def render_schema(api):
+    """Generate the schema JSON bytes of the API."""
+    schema = api.get_openapi_schema()
+    return json.dumps(schema, cls=NinjaJSONEncoder, separators=(",", ":")).encode()
+
+
+def write_schema(api):
+    """Write the schema file of this deployment for its clients."""
+    path = schema_file()
+    path.write_bytes(render_schema(api))
+    return path
+
+
+class CachedSchema:
+    """Schema bytes, their gzip and ETag."""
+
+    def __init__(self, content):
+        """Compress and hash the content."""
+        self.content = content
+        self.gzipped = gzip.compress(content, compresslevel=9)
+        self.etag = '"' + hashlib.sha256(content).hexdigest()[:32] + '"'
+
+
+_cached = {}
+
+
+def get_schema(api):
+    """Schema of the API generated once per process, warns if the schema file differs."""
+    cached = _cached.get(id(api))
+    if cached is None:
+        content = render_schema(api)
+        path = schema_file()
+        try:
+            if path.read_bytes() != content:
+                logger.warning(
+                    "OpenAPI schema file %s is stale, serving the generated schema", path
+                )
+        except OSError:
+            pass
+        cached = _cached[id(api)] = CachedSchema(content)
+    return cached
@@ -0,0 +1,222 @@
+"""Opt-in sampling profiler of single requests.
+
+A request is profiled if it carries an ``X-Profile`` header with a token
+made by the ``profile_token`` command, or the ``profile`` query flag and a
+staff session. Other requests only pay for the header and flag lookups.
+
+Profiles are stored as collapsed stacks files (one ``frame;frame;frame count``
+line per stack, the input of flamegraph.pl and speedscope) in PROFILE_DIR,
+with the SQL of the request in RequestProfile rows. Only the last
+PROFILE_MAX_FILES profiles are kept.
+"""
+
+import asyncio
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import signing
+from django.db import connection
+from django.utils.decorators import sync_and_async_middleware
+
+from currency.models import RequestProfile
+
+HEADER = "X-Profile"
+SALT = "currency.profiling"
+MAX_QUERIES = 200
+# Threads of the process never serving requests
+BACKGROUND_THREADS = {"tasks", "market-summary", "profiler", "slow-query-log"}
+# Innermost frames of threads waiting for work
+IDLE_FRAMES = {
+    ("threading", "wait"),
+    ("selectors", "select"),
+    ("queue", "get"),
+    ("concurrent.futures.thread", "_worker"),
+}
+
+
+def make_token():
+    """Token of the X-Profile header, valid for PROFILE_TOKEN_MAX_AGE seconds."""
+    return signing.TimestampSigner(salt=SALT).sign("profile")
+
+
+def _valid_token(token):
+    try:
+        signing.TimestampSigner(salt=SALT).unsign(
+            token, max_age=getattr(settings, "PROFILE_TOKEN_MAX_AGE", 60 * 60)
+        )
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def _frame_name(frame):
+    # co_qualname is new in Python 3.11
+    code = frame.f_code
+    return f"{frame.f_globals.get('__name__', '?')}.{getattr(code, 'co_qualname', code.co_name)}"
+
+
+class Sampler:
+    """Thread counting the stacks of the other threads at a fixed interval."""
+
+    def __init__(self, interval):
+        """Init sampler, not started."""
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def _sample(self):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if names.get(ident) in BACKGROUND_THREADS:
+                continue
+            if (frame.f_globals.get("__name__"), frame.f_code.co_name) in IDLE_FRAMES:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+        self.samples += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        """Start sampling."""
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling and wait for the thread."""
+        self._stop.set()
+        self._thread.join()
+
+
+class Profile:
+    """Samples and SQL of one request."""
+
+    def __init__(self, request):
+        """Init profile of the request."""
+        self.request = request
+        self.queries = []
+        self.sampler = Sampler(getattr(settings, "PROFILE_SAMPLE_INTERVAL", 0.001))
+
+    def record_query(self, execute, sql, params, many, context):
+        """Execute wrapper timing the query."""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, (time.perf_counter() - start) * 1000))
+
+    def install(self):
+        """Time queries of this thread's connection."""
+        connection.execute_wrappers.append(self.record_query)
+
+    def uninstall(self):
+        """Stop timing queries of this thread's connection."""
+        connection.execute_wrappers.remove(self.record_query)
+
+    def start(self):
+        """Start the clock and the sampler."""
+        self.started = time.perf_counter()
+        self.sampler.start()
+
+    def stop(self):
+        """Stop the sampler and the clock."""
+        self.sampler.stop()
+        self.duration = (time.perf_counter() - self.started) * 1000
+
+    def save(self, response):
+        """Write the stacks file and the profile row, drop profiles over the limit."""
+        directory = Path(getattr(settings, "PROFILE_DIR", settings.BASE_DIR / "profiles"))
+        directory.mkdir(parents=True, exist_ok=True)
+        name = f"{time.time_ns()}.collapsed"
+        (directory / name).write_text(
+            "".join(f"{stack} {count}\n" for stack, count in self.sampler.stacks.most_common())
+        )
+        profile = RequestProfile.objects.create(
+            method=self.request.method,
+            path=self.request.get_full_path()[:2000],
+            status_code=response.status_code,
+            duration=self.duration,
+            samples=self.sampler.samples,
+            query_count=len(self.queries),
+            query_time=sum(duration for _, duration in self.queries),
+            queries=[
+                {"sql": sql, "time": duration} for sql, duration in self.queries[:MAX_QUERIES]
+            ],
+            stacks_file=name,
+        )
+        keep = getattr(settings, "PROFILE_MAX_FILES", 100)
+        expired = RequestProfile.objects.order_by("-pk")[keep:]
+        for old in expired:
+            (directory / old.stacks_file).unlink(missing_ok=True)
+        RequestProfile.objects.filter(pk__in=[old.pk for old in expired]).delete()
+        return profile
+
+
+def stacks_path(profile):
+    """Path of the collapsed stacks file of the profile."""
+    directory = Path(getattr(settings, "PROFILE_DIR", settings.BASE_DIR / "profiles"))
+    return directory / profile.stacks_file
+
+
+def _requested(request):
+    """Whether the request asks to be profiled, None if it depends on the user."""
+    token = request.headers.get(HEADER)
+    if token is not None:
+        return _valid_token(token)
+    return None if "profile" in request.GET else False
+
+
+@sync_and_async_middleware
+def profiling_middleware(get_response):
+    """Profile requests that ask for it."""
+    if asyncio.iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            requested = _requested(request)
+            if requested is None:
+                requested = await sync_to_async(lambda: request.user.is_staff)()
+            if not requested:
+                return await get_response(request)
+            profile = Profile(request)
+            await sync_to_async(profile.install)()
+            profile.start()
+            try:
+                response = await get_response(request)
+            finally:
+                profile.stop()
+                await sync_to_async(profile.uninstall)()
+            profile = await sync_to_async(profile.save)(response)
+            response["X-Profile-Id"] = str(profile.pk)
+            return response
+
+    else:
+
+        def middleware(request):
+            requested = _requested(request)
+            if requested is None:
+                requested = request.user.is_staff
+            if not requested:
+                return get_response(request)
+            profile = Profile(request)
+            profile.install()
+            profile.start()
+            try:
+                response = get_response(request)
+            finally:
+                profile.stop()
+                profile.uninstall()
+            response["X-Profile-Id"] = str(profile.save(response).pk)
+            return response
+
+    return middleware
@@ -0,0 +1,134 @@
+"""Sparse fieldsets: ``fields=`` query parameter narrowing queries and responses."""
+
+import asyncio
+from functools import lru_cache, wraps
+
+from django.http import HttpResponseBase, JsonResponse
+from ninja import Schema
+from ninja.errors import HttpError
+from ninja.responses import NinjaJSONEncoder
+from pydantic import create_model
+from pydantic.fields import SHAPE_SINGLETON
+
+
+def _nested_schema(field):
+    """Schema of the related objects if the field is a relation, else None."""
+    if isinstance(field.type_, type) and issubclass(field.type_, Schema):
+        return field.type_
+    return None
+
+
+@lru_cache(maxsize=None)
+def _aliases(schema):
+    """Field names of the schema by alias."""
+    return {field.alias: name for name, field in schema.__fields__.items()}
+
+
+def parse_fields(schema, fields):
+    """Names of the schema fields selected by comma-separated ``fields``, None for all."""
+    if not fields:
+        return None
+    by_alias = _aliases(schema)
+    names = {"id"} if "id" in schema.__fields__ else set()
+    for name in fields.split(","):
+        name = by_alias.get(name.strip(), name.strip())
+        if name not in schema.__fields__:
+            raise HttpError(400, f"Unknown field: {name}")
+        names.add(name)
+    return tuple(name for name in schema.__fields__ if name in names)
+
+
+def wants(schema, fields, name):
+    """Whether the field has to be computed for the response."""
+    names = parse_fields(schema, fields)
+    return names is None or name in names
+
+
+def _prefetches(schema, names=None):
+    """Prefetch lookups of the (selected) nested collections, recursively."""
+    lookups = []
+    for name, field in schema.__fields__.items():
+        nested = _nested_schema(field)
+        if nested is None or field.shape == SHAPE_SINGLETON or (names and name not in names):
+            continue
+        lookups.append(field.alias)
+        lookups.extend(f"{field.alias}__{lookup}" for lookup in _prefetches(nested))
+    return lookups
+
+
+def project(queryset, schema, fields):
+    """Load only the columns and relations of the selected fields."""
+    names = parse_fields(schema, fields)
+    if queryset.query.combinator or queryset._fields is not None:
+        return queryset
+    queryset = queryset.prefetch_related(*_prefetches(schema, names))
+    if names is None:
+        return queryset
+
+    concrete = {}
+    for model_field in queryset.model._meta.concrete_fields:
+        concrete[model_field.name] = model_field.name
+        concrete[model_field.attname] = model_field.name
+    columns = []
+    for name in names:
+        field = schema.__fields__[name]
+        if field.alias in concrete:
+            columns.append(field.alias)
+            if _nested_schema(field) is not None:
+                queryset = queryset.select_related(field.alias)
+    return queryset.only(*columns)
+
+
+@lru_cache(maxsize=None)
+def projected_schema(schema, names):
+    """Schema with only the selected fields of the given one."""
+    sparse = create_model(
+        f"Sparse{schema.__name__}",
+        __base__=Schema,
+        **{
+            name: (schema.__fields__[name].outer_type_, schema.__fields__[name].field_info)
+            for name in names
+        },
+    )
+    sparse._ninja_resolvers = {
+        name: resolver for name, resolver in schema._ninja_resolvers.items() if name in names
+    }
+    return sparse
+
+
+def _render(result, schema, fields):
+    names = parse_fields(schema, fields)
+    if names is None or isinstance(result, HttpResponseBase):
+        return result
+    sparse = projected_schema(schema, names)
+    status = 200
+    if isinstance(result, tuple):
+        status, result = result
+    if isinstance(result, dict) and "items" in result:
+        data = {**result, "items": [sparse.from_orm(item).dict() for item in result["items"]]}
+    else:
+        data = sparse.from_orm(result).dict()
+    return JsonResponse(data, status=status, encoder=NinjaJSONEncoder)
+
+
+def sparse(schema):
+    """Render only the fields listed in the ``fields`` query parameter of the route."""
+
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+
+            @wraps(func)
+            async def wrapper(request, *args, **kwargs):
+                result = await func(request, *args, **kwargs)
+                return _render(result, schema, kwargs.get("fields"))
+
+        else:
+
+            @wraps(func)
+            def wrapper(request, *args, **kwargs):
+                result = func(request, *args, **kwargs)
+                return _render(result, schema, kwargs.get("fields"))
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,98 @@
+"""In-process registry of currencies looked up by id or code without queries."""
+
+import threading
+import time
+from types import MappingProxyType
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from currency.models import Currency
+from currency.shared import get_shared_state
+
+VERSION_KEY = "currency.registry.version"
+
+
+class CurrencySnapshot:
+    """Immutable view of all currencies at one point in time."""
+
+    def __init__(self, currencies):
+        """Index the currencies by id and code."""
+        self.by_id = MappingProxyType({currency.pk: currency for currency in currencies})
+        self.by_code = MappingProxyType({currency.code: currency for currency in currencies})
+
+    def get(self, key):
+        """Currency by id or code, None if there is no such currency."""
+        if isinstance(key, str):
+            if not key.isdigit():
+                return self.by_code.get(key.upper())
+            key = int(key)
+        return self.by_id.get(key)
+
+
+class CurrencyRegistry:
+    """Latest snapshot of the currencies, reloaded once it's invalidated.
+
+    Invalidation bumps a version in the shared state, so the other workers
+    reload their snapshot too, within CURRENCY_REGISTRY_SYNC_INTERVAL seconds.
+    """
+
+    def __init__(self):
+        """Init empty registry."""
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._version = None
+        self._synced_at = 0
+
+    def _fresh(self):
+        """Snapshot if it was synced within the interval, else None."""
+        interval = getattr(settings, "CURRENCY_REGISTRY_SYNC_INTERVAL", 1)
+        if time.monotonic() - self._synced_at < interval:
+            return self._snapshot
+        return None
+
+    def _current(self):
+        """Snapshot if it's still valid, else None."""
+        snapshot = self._snapshot
+        if snapshot is None or self._fresh() is not None:
+            return snapshot
+        if get_shared_state().get(VERSION_KEY, 0) != self._version:
+            return None
+        self._synced_at = time.monotonic()
+        return snapshot
+
+    def snapshot(self):
+        """Current snapshot, loading the currencies if it was invalidated."""
+        snapshot = self._current()
+        if snapshot is None:
+            with self._lock:
+                snapshot = self._current()
+                if snapshot is None:
+                    version = get_shared_state().get(VERSION_KEY, 0)
+                    snapshot = CurrencySnapshot(list(Currency.objects.all()))
+                    self._snapshot, self._version = snapshot, version
+                    self._synced_at = time.monotonic()
+        return snapshot
+
+    async def asnapshot(self):
+        """Current snapshot, checking its version or loading it in a thread if needed."""
+        return self._fresh() or await sync_to_async(self.snapshot)()
+
+    def invalidate(self):
+        """Make every worker reload the currencies on next use."""
+        get_shared_state().incr(VERSION_KEY)
+        self._snapshot = None
+
+
+currency_registry = CurrencyRegistry()
+
+
+def invalidate_on_commit(**kwargs):
+    """Invalidate the registry once the currency change is committed."""
+    transaction.on_commit(currency_registry.invalidate)
+
+
+post_save.connect(invalidate_on_commit, sender=Currency)
+post_delete.connect(invalidate_on_commit, sender=Currency)
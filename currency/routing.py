@@ -0,0 +1,314 @@
+"""Conversion quotes routed across the graph of active offers.
+
+Currencies are the nodes of the graph, order books of active offers per
+(currency to buy, currency to sell) pair are its edges. The graph is loaded
+once per worker and then updated from the ids of changed offers published to
+the ``offers`` channel of the shared state. Workers start from the
+MARKET_SNAPSHOT_PATH snapshot if there is one, see currency/snapshot.py, and
+replay the offers changed in the database since it was made.
+"""
+
+import bisect
+import datetime
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from currency.models import Offer
+from currency.shared import get_shared_state
+from currency.snapshot import read_snapshot, write_snapshot
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "offers"
+OFFER_FIELDS = (
+    "id",
+    "currency_to_sell_id",
+    "currency_to_buy_id",
+    "amount",
+    "exchange_rate",
+    "expires_at",
+    "active_state",
+)
+# Offers changed this long before the snapshot was made are replayed too, as
+# their transaction may have committed after it
+REPLAY_MARGIN = datetime.timedelta(minutes=1)
+
+
+def offers_changed(*offer_ids):
+    """Publish the changed offers once the transaction commits, all offers if none given."""
+    messages = offer_ids or (None,)
+
+    def publish():
+        state = get_shared_state()
+        for message in messages:
+            state.publish(CHANNEL, message)
+
+    transaction.on_commit(publish)
+
+
+def publish_offer(sender, instance, **kwargs):
+    """Publish the offer saved or deleted through the model, e.g. by the admin."""
+    offers_changed(instance.pk)
+
+
+post_save.connect(publish_offer, sender=Offer)
+post_delete.connect(publish_offer, sender=Offer)
+
+
+class OfferGraph:
+    """Order books of active offers indexed by currency pair.
+
+    Book entries are ``[exchange_rate, offer_id, amount, expires_at]`` lists
+    kept sorted by rate, the best (lowest) one first.
+    """
+
+    def __init__(self):
+        """Init unloaded graph."""
+        self._lock = threading.Lock()
+        self._subscription = None
+        self._books = {}
+        self._adjacency = defaultdict(set)
+        self._entries = {}
+
+    def invalidate(self):
+        """Reload all offers on next use."""
+        with self._lock:
+            self._subscription = None
+
+    def _remove(self, offer_id):
+        pair, entry = self._entries.pop(offer_id, (None, None))
+        if pair is None:
+            return
+        book = self._books[pair]
+        book.pop(bisect.bisect_left(book, entry[:2]))
+        if not book:
+            del self._books[pair]
+            self._adjacency[pair[0]].discard(pair[1])
+
+    def _insert(self, offer_id, sell_id, buy_id, amount, rate, expires_at):
+        pair = (buy_id, sell_id)
+        entry = [rate, offer_id, amount, expires_at]
+        bisect.insort(self._books.setdefault(pair, []), entry)
+        self._adjacency[buy_id].add(sell_id)
+        self._entries[offer_id] = (pair, entry)
+
+    def _apply(self, row):
+        offer_id, sell_id, buy_id, amount, rate, expires_at, active_state = row
+        self._remove(offer_id)
+        if active_state and amount > 0:
+            expires_at = expires_at and expires_at.timestamp()
+            self._insert(offer_id, sell_id, buy_id, float(amount), float(rate), expires_at)
+
+    def _build(self, records):
+        """Replace the books with the ``(offer_id, sell_id, buy_id, amount, rate, expires_at)``."""
+        self._books, self._adjacency, self._entries = {}, defaultdict(set), {}
+        for offer_id, sell_id, buy_id, amount, rate, expires_at in records:
+            pair = (buy_id, sell_id)
+            entry = [rate, offer_id, amount, expires_at]
+            self._books.setdefault(pair, []).append(entry)
+            self._adjacency[buy_id].add(sell_id)
+            self._entries[offer_id] = (pair, entry)
+        for book in self._books.values():
+            book.sort()
+
+    def _restore(self):
+        """Build the books from the snapshot and replay the offers changed since.
+
+        Returns False if there is no snapshot that can be restored.
+        """
+        snapshot = read_snapshot(getattr(settings, "MARKET_SNAPSHOT_PATH", None))
+        if snapshot is None:
+            return False
+        with snapshot:
+            self._build(snapshot)
+            since = datetime.datetime.fromtimestamp(snapshot.created_at, datetime.timezone.utc)
+        changed = Offer.objects.filter(
+            active_state__in=(True, False), added_time__gte=since - REPLAY_MARGIN
+        ).values_list(*OFFER_FIELDS)
+        for row in changed.iterator():
+            self._apply(row)
+        # Deleted offers leave no changed rows
+        offer_ids = list(self._entries)
+        for start in range(0, len(offer_ids), 500):
+            batch = offer_ids[start : start + 500]
+            existing = set(Offer.objects.filter(pk__in=batch).values_list("pk", flat=True))
+            for offer_id in batch:
+                if offer_id not in existing:
+                    self._remove(offer_id)
+        return True
+
+    def _load(self):
+        self._subscription = get_shared_state().subscribe(CHANNEL)
+        if self._restore():
+            return
+        rows = Offer.objects.filter(active_state=True, amount__gt=0).values_list(*OFFER_FIELDS)
+        self._build(
+            (
+                offer_id,
+                sell_id,
+                buy_id,
+                float(amount),
+                float(rate),
+                expires_at and expires_at.timestamp(),
+            )
+            for offer_id, sell_id, buy_id, amount, rate, expires_at, _ in rows.iterator()
+        )
+
+    def sync(self):
+        """Load the graph on first use, then apply the published offer changes.
+
+        The graph is loaded again if the shared state already dropped some of
+        the changes, or if a change of all offers was published.
+        """
+        if self._subscription is None:
+            self._load()
+            return
+        subscription = self._subscription
+        messages = subscription.state.messages_since(CHANNEL, subscription.last_id)
+        if messages:
+            subscription.last_id = messages[-1][0]
+        changed = None if messages is None else {message for _, message in messages}
+        if changed is None or None in changed:
+            self._load()
+        elif changed:
+            found = set()
+            for row in Offer.objects.filter(pk__in=changed).values_list(*OFFER_FIELDS):
+                self._apply(row)
+                found.add(row[0])
+            for offer_id in changed - found:
+                self._remove(offer_id)
+
+    def warm(self):
+        """Load the graph in a thread, so that the first quote doesn't wait for all of it."""
+
+        def load():
+            close_old_connections()
+            try:
+                with self._lock:
+                    self.sync()
+            except Exception:
+                logger.exception("Offer graph load failed")
+            finally:
+                close_old_connections()
+
+        threading.Thread(target=load, name="offer-graph", daemon=True).start()
+
+    def dump(self, path=None):
+        """Write the books to the snapshot file, MARKET_SNAPSHOT_PATH by default."""
+        path = path or getattr(settings, "MARKET_SNAPSHOT_PATH", None)
+        with self._lock:
+            created_at = time.time()
+            self.sync()
+            records = [
+                (offer_id, sell_id, buy_id, amount, rate, expires_at)
+                for offer_id, ((buy_id, sell_id), (rate, _, amount, expires_at)) in (
+                    self._entries.items()
+                )
+            ]
+        return write_snapshot(path, records, created_at)
+
+    @staticmethod
+    def _fill(book, amount, now):
+        """Amount of currency to sell bought from the book paying ``amount``."""
+        bought = 0.0
+        for rate, _, available, expires_at in book:
+            if expires_at is not None and expires_at <= now:
+                continue
+            take = min(available, amount / rate)
+            bought += take
+            amount -= take * rate
+            if amount <= 1e-12:
+                break
+        return bought
+
+    @staticmethod
+    def _cost(book, bought, now):
+        """Offers filled to buy ``bought`` from the book, with the amount paid."""
+        legs = []
+        for rate, offer_id, available, expires_at in book:
+            if bought <= 1e-12:
+                break
+            if expires_at is not None and expires_at <= now:
+                continue
+            take = min(available, bought)
+            legs.append((offer_id, rate, take))
+            bought -= take
+        return legs
+
+    def _route(self, source, target, amount, max_hops, now):
+        """Route to the target receiving the most, searching up to ``max_hops`` conversions."""
+        best = {source: amount}
+        frontier = {source: (amount, (source,))}
+        result = None
+        for _ in range(max_hops):
+            reached = {}
+            for currency, (held, path) in frontier.items():
+                for next_currency in self._adjacency.get(currency, ()):
+                    if next_currency in path:
+                        continue
+                    bought = self._fill(self._books[(currency, next_currency)], held, now)
+                    if bought <= 0:
+                        continue
+                    route = (bought, path + (next_currency,))
+                    if next_currency == target:
+                        if result is None or bought > result[0]:
+                            result = route
+                    elif bought > best.get(next_currency, 0):
+                        best[next_currency] = bought
+                        reached[next_currency] = route
+            frontier = reached
+        return result
+
+    def quote(self, source, target, amount, max_hops=None):
+        """Best route converting ``amount`` of source currency to the target one.
+
+        Returns None if there is no route, else a dict with the amount spent
+        (less than requested if the offers can't take all of it), the amount
+        received, the currencies of the route and the offers filled per leg.
+        """
+        if max_hops is None:
+            max_hops = getattr(settings, "QUOTE_MAX_HOPS", 4)
+        now = timezone.now().timestamp()
+        with self._lock:
+            self.sync()
+            result = self._route(source, target, float(amount), max_hops, now)
+            if result is None:
+                return None
+            received, route = result
+            legs = []
+            bought = received
+            for buy_id, sell_id in reversed(list(zip(route, route[1:]))):
+                fills = self._cost(self._books[(buy_id, sell_id)], bought, now)
+                legs.extend(
+                    {
+                        "offer_id": offer_id,
+                        "currency_to_sell_id": sell_id,
+                        "currency_to_buy_id": buy_id,
+                        "exchange_rate": rate,
+                        "amount": take,
+                        "paid": take * rate,
+                    }
+                    for offer_id, rate, take in reversed(fills)
+                )
+                bought = sum(take * rate for _, rate, take in fills)
+        legs.reverse()
+        return {
+            "from_currency_id": source,
+            "to_currency_id": target,
+            "amount": amount,
+            "spent": bought,
+            "received": received,
+            "rate": received / bought,
+            "route": list(route),
+            "legs": legs,
+        }
+
+
+offer_graph = OfferGraph()
@@ -1,8 +1,9 @@
 """Data serialization for API."""
 
 from datetime import datetime
-from typing import List
+from typing import Dict, List, Literal, Union
 
+from django.core.files.storage import default_storage
 from ninja import Schema
 from pydantic import Field
 
@@ -14,6 +15,16 @@ class CurrencyBase(Schema):
     code: str
     name: str
     image: str
+    image_variants: Dict[str, str] = {}
+    version: int = 0
+
+    @staticmethod
+    def resolve_image_variants(obj):
+        """Turn stored variant names into URLs."""
+        return {
+            label: default_storage.url(name)
+            for label, name in (getattr(obj, "image_variants", None) or {}).items()
+        }
 
 
 class CurrencyOut(CurrencyBase):
@@ -27,6 +38,7 @@ class CurrencyIn(CurrencyBase):
     """Currency schema for POST method."""
 
     id: int = None
+    version: int = None
 
 
 class DealBase(Schema):
@@ -45,6 +57,18 @@ class DealIn(DealBase):
     id: int = None
 
 
+class BasketIn(Schema):
+    """Basket of deals schema for POST method."""
+
+    legs: List[DealIn]
+
+
+class BasketOut(Schema):
+    """Basket of deals schema for POST method, response."""
+
+    deals: List[DealBase]
+
+
 class OfferBase(Schema):
     """Base offer schema for GET method, response."""
 
@@ -56,18 +80,41 @@ class OfferBase(Schema):
     seller_id: int
     added_time: datetime = None
     active_state: bool = True
+    expires_at: datetime = None
+    version: int = 0
 
 
 class OfferIn(OfferBase):
-    """Offer schema for POST method."""
+    """Offer schema for POST method, currencies are given by id or code."""
 
     id: int = None
+    currency_to_sell_id: Union[int, str]
+    currency_to_buy_id: Union[int, str]
+    version: int = None
+
+
+class OfferFilter(Schema):
+    """Offers list filter and sort query parameters."""
+
+    currency_to_sell_id: int = None
+    currency_to_buy_id: int = None
+    seller_id: int = None
+    exchange_rate_min: float = None
+    exchange_rate_max: float = None
+    amount_min: float = None
+    amount_max: float = None
+    added_after: datetime = None
+    added_before: datetime = None
+    sort: Literal[
+        "id", "exchange_rate", "-exchange_rate", "amount", "-amount", "added_time", "-added_time"
+    ] = None
 
 
 class OfferState(Schema):
     """Offer state for POST method to enable/disable an offer."""
 
     active_state: bool
+    version: int = None
 
 
 class OfferWithDealOut(OfferBase):
@@ -98,6 +145,161 @@ class UserExtraDataOut(UserBase):
     offers: List[OfferWithDealOut]
 
 
+class BalanceOut(Schema):
+    """User balance schema for GET method, response."""
+
+    currency_id: int
+    bought: float
+    sold: float
+    deals: int
+
+
+class CandleOut(Schema):
+    """OHLC candle schema for GET method, response."""
+
+    bucket_start: datetime
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: float
+    vwap: float
+    trades: int
+
+    @staticmethod
+    def resolve_vwap(obj):
+        """Volume weighted average rate."""
+        return obj.quote_volume / obj.volume if obj.volume else obj.close
+
+
+class CurrencyBatchOut(Schema):
+    """Currencies by id schema for batch GET method, response."""
+
+    items: Dict[int, CurrencyBase]
+    missing: List[int]
+
+
+class OfferBatchOut(Schema):
+    """Offers by id schema for batch GET method, response."""
+
+    items: Dict[int, OfferWithDealOut]
+    missing: List[int]
+
+
+class DealBatchOut(Schema):
+    """Deals by id schema for batch GET method, response."""
+
+    items: Dict[int, DealExtraDataOut]
+    missing: List[int]
+
+
+class MarketPairOut(Schema):
+    """Currency pair market state schema."""
+
+    currency_to_sell_id: int
+    currency_to_buy_id: int
+    best_rate: float = None
+    depth: float
+    active_offers: int
+    volume_24h: float
+
+
+class MarketSummaryOut(Schema):
+    """Market summary schema for GET method, response."""
+
+    generated_at: datetime
+    pairs: List[MarketPairOut]
+
+
+class QuoteLegOut(Schema):
+    """Offer filled by a conversion quote."""
+
+    offer_id: int
+    currency_to_sell_id: int
+    currency_to_buy_id: int
+    exchange_rate: float
+    amount: float
+    paid: float
+
+
+class QuoteOut(Schema):
+    """Conversion quote schema for GET method, response."""
+
+    from_currency_id: int
+    to_currency_id: int
+    amount: float
+    spent: float
+    received: float
+    rate: float
+    route: List[int]
+    legs: List[QuoteLegOut]
+
+
+class ImportJobOut(Schema):
+    """Bulk import job schema, response."""
+
+    id: int
+    kind: str
+    format: str
+    status: str
+    rows_done: int
+    imported: int
+    failed: int
+    errors_url: str = None
+    created_at: datetime
+    finished_at: datetime = None
+
+    @staticmethod
+    def resolve_errors_url(obj):
+        """Link to the errors file if any row failed."""
+        return f"/api/imports/{obj.id}/errors" if obj.failed else None
+
+
+class PriceAlertIn(Schema):
+    """Price alert schema for POST method, currencies are given by id or code."""
+
+    currency_to_sell_id: Union[int, str]
+    currency_to_buy_id: Union[int, str]
+    max_rate: float = Field(..., gt=0)
+    min_amount: float = Field(0, ge=0)
+
+
+class PriceAlertOut(Schema):
+    """Price alert schema, response."""
+
+    id: int
+    currency_to_sell_id: int
+    currency_to_buy_id: int
+    max_rate: float
+    min_amount: float
+    active: bool
+    created_at: datetime
+    triggered_at: datetime = None
+
+
+class NotificationOut(Schema):
+    """Price alert notification schema for GET method, response."""
+
+    id: int
+    alert_id: int
+    offer_id: int = None
+    currency_to_sell_id: int
+    currency_to_buy_id: int
+    exchange_rate: float
+    amount: float
+    created_at: datetime
+
+    @staticmethod
+    def resolve_currency_to_sell_id(obj):
+        """Currency to sell of the alert."""
+        return obj.alert.currency_to_sell_id
+
+    @staticmethod
+    def resolve_currency_to_buy_id(obj):
+        """Currency to buy of the alert."""
+        return obj.alert.currency_to_buy_id
+
+
 class MessageOut(Schema):
     """Base schema for message response."""
 
@@ -108,3 +310,4 @@ class TokenOut(Schema):
     """Base schema for token response."""
 
     token: str
+    refresh_token: str = None
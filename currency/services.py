@@ -0,0 +1,155 @@
+"""Write operations shared by API routes."""
+
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, F, ProtectedError, Q, When
+from django.utils import timezone
+
+from currency.alerts import offer_activated
+from currency.candles import record_deal
+from currency.ledger import post_deal
+from currency.models import ArchivedDeal, Deal, Offer
+from currency.routing import offers_changed
+
+
+class VersionConflict(Exception):
+    """The row was changed by another request since it was read."""
+
+
+class BasketRejected(Exception):
+    """A leg of the basket can't be executed."""
+
+
+def conditional_update(instance, expected_version, **changes):
+    """Write only the changed fields if the row still has the expected version.
+
+    Fields with ``auto_now`` are refreshed like ``save()`` would do.
+    """
+    model = type(instance)
+    for field in model._meta.concrete_fields:
+        if getattr(field, "auto_now", False):
+            changes.setdefault(field.attname, timezone.now())
+    updated = model.objects.filter(pk=instance.pk, version=expected_version).update(
+        version=F("version") + 1, **changes
+    )
+    if not updated:
+        raise VersionConflict(f"{model._meta.verbose_name} was changed by another request")
+    for attr, value in changes.items():
+        setattr(instance, attr, value)
+    instance.version = expected_version + 1
+    return instance
+
+
+@transaction.atomic
+def create_offer(data):
+    """Save the offer together with the tasks of its side effects."""
+    offer = Offer.objects.create(**data)
+    if offer.active_state:
+        offer_activated(offer.pk)
+    return offer
+
+
+@transaction.atomic
+def set_offer_state(offer, expected_version, active_state):
+    """Enable or disable the offer together with the tasks of its side effects.
+
+    Raises VersionConflict if the offer isn't at the expected version anymore.
+    """
+    conditional_update(offer, expected_version, active_state=active_state)
+    offers_changed(offer.pk)
+    if active_state:
+        offer_activated(offer.pk)
+    return offer
+
+
+@transaction.atomic
+def remove_offer(offer):
+    """Delete the offer together with the tasks of its side effects.
+
+    Raises ProtectedError if the offer has deals, archived ones included.
+    """
+    # Archived deals keep the offer id without a foreign key to protect it
+    if ArchivedDeal.objects.filter(offer_id=offer.pk).exists():
+        raise ProtectedError("Offer has archived deals", set())
+    offer.delete()
+
+
+@transaction.atomic
+def create_deal(offer, data):
+    """Take the deal amount from the offer and save the deal with its aggregates.
+
+    The amount is decremented with a guarded UPDATE, so concurrent deals and
+    offer edits can't overdraw the offer or resurrect an old amount.
+    Raises VersionConflict if the offer can't cover the deal anymore.
+    """
+    data = {**data, "amount": Decimal(str(data["amount"]))}
+    now = timezone.now()
+    updated = Offer.objects.filter(
+        pk=offer.pk, active_state=True, amount__gte=data["amount"]
+    ).update(amount=F("amount") - data["amount"], version=F("version") + 1, added_time=now)
+    if not updated:
+        raise VersionConflict("Offer was changed by another request")
+    Offer.objects.filter(pk=offer.pk, amount__lte=0).update(active_state=False)
+    offer.refresh_from_db(fields=("amount", "active_state", "version", "added_time"))
+    deal = Deal.objects.create(**data)
+    record_deal(deal, offer)
+    post_deal(deal, offer)
+    offers_changed(offer.pk)
+    return deal
+
+
+@transaction.atomic
+def create_basket(legs):
+    """Save the deals of all legs or none of them.
+
+    Offers are locked in id order so concurrent baskets can't deadlock, then
+    every offer amount is decremented by one guarded UPDATE and every deal is
+    inserted by one INSERT. Raises BasketRejected for an invalid leg and
+    VersionConflict if an offer was changed concurrently.
+    """
+    legs = [{**leg, "amount": Decimal(str(leg["amount"]))} for leg in legs]
+    offer_ids = sorted({leg["offer_id"] for leg in legs})
+    offers = {
+        offer.pk: offer
+        for offer in Offer.objects.select_for_update().filter(pk__in=offer_ids).order_by("pk")
+    }
+    now = timezone.now()
+    totals = dict.fromkeys(offer_ids, Decimal(0))
+    for index, leg in enumerate(legs):
+        offer = offers.get(leg["offer_id"])
+        totals[leg["offer_id"]] += leg["amount"]
+        if (
+            offer is None
+            or not offer.active_state
+            or (offer.expires_at and offer.expires_at <= now)
+            or offer.seller_id == leg["buyer_id"]
+            or leg["amount"] <= 0
+            or offer.amount < totals[leg["offer_id"]]
+        ):
+            raise BasketRejected(f"You can't make a deal to offer {leg['offer_id']} (leg {index})")
+
+    guard = Q()
+    for offer_id, total in totals.items():
+        guard |= Q(pk=offer_id, active_state=True, amount__gte=total)
+    updated = Offer.objects.filter(guard).update(
+        amount=Case(
+            *(When(pk=offer_id, then=F("amount") - total) for offer_id, total in totals.items())
+        ),
+        version=F("version") + 1,
+        added_time=now,
+    )
+    if updated != len(offer_ids):
+        raise VersionConflict("Offer was changed by another request")
+    Offer.objects.filter(pk__in=offer_ids, amount__lte=0).update(active_state=False)
+
+    deals = Deal.objects.bulk_create(
+        Deal(offer_id=leg["offer_id"], buyer_id=leg["buyer_id"], amount=leg["amount"])
+        for leg in legs
+    )
+    for deal in deals:
+        offer = offers[deal.offer_id]
+        record_deal(deal, offer)
+        post_deal(deal, offer)
+    offers_changed(*offer_ids)
+    return deals
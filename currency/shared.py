@@ -0,0 +1,357 @@
+"""State shared by the worker processes: cache, locks and pub/sub.
+
+``LocalMemoryState`` only shares state between the threads of a process,
+``SQLiteState`` between every process of the host through a SQLite file.
+The backend is chosen by the ``SHARED_STATE`` setting.
+"""
+
+import abc
+import contextlib
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.utils.module_loading import import_string
+
+
+class LockTimeout(Exception):
+    """The lock wasn't acquired in time."""
+
+
+class BaseSharedState(abc.ABC):
+    """Interface of shared state backends."""
+
+    @abc.abstractmethod
+    def get(self, key, default=None):
+        """Get the cached value."""
+
+    @abc.abstractmethod
+    def set(self, key, value, ttl=None):
+        """Cache the value for ``ttl`` seconds or forever."""
+
+    @abc.abstractmethod
+    def delete(self, key):
+        """Remove the cached value."""
+
+    @abc.abstractmethod
+    def incr(self, key, delta=1, ttl=None):
+        """Atomically add to the cached number, return the new value."""
+
+    @abc.abstractmethod
+    def acquire(self, name, owner, ttl):
+        """Try to take the lock for ``ttl`` seconds, return whether it was taken."""
+
+    @abc.abstractmethod
+    def release(self, name, owner):
+        """Release the lock if it is still held by the owner."""
+
+    @abc.abstractmethod
+    def publish(self, channel, message):
+        """Send the message to every subscriber of the channel."""
+
+    @abc.abstractmethod
+    def messages(self, channel, after):
+        """Messages of the channel published after the given id: [(id, message)]."""
+
+    @abc.abstractmethod
+    def last_message_id(self, channel):
+        """Id of the last message published to the channel."""
+
+    def messages_since(self, channel, after):
+        """Messages published after the given id, None if some of them were dropped."""
+        messages = self.messages(channel, after)
+        last_id = self.last_message_id(channel)
+        if after > last_id or after < last_id - self.max_messages:
+            return None
+        return messages
+
+    @contextlib.contextmanager
+    def lock(self, name, ttl=30, timeout=None, poll=0.01):
+        """Hold the lock, waiting up to ``timeout`` seconds (forever if None)."""
+        owner = uuid.uuid4().hex
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.acquire(name, owner, ttl):
+            if deadline is not None and time.monotonic() >= deadline:
+                raise LockTimeout(name)
+            time.sleep(poll)
+        try:
+            yield
+        finally:
+            self.release(name, owner)
+
+    def subscribe(self, channel, after=None):
+        """Subscription receiving messages published after the given id, from now on if None."""
+        return Subscription(self, channel, after)
+
+
+class Subscription:
+    """Cursor over the messages of a channel."""
+
+    def __init__(self, state, channel, after=None):
+        """Start after the given message id, the last published message if None."""
+        self.state = state
+        self.channel = channel
+        self.last_id = state.last_message_id(channel) if after is None else after
+
+    def poll(self, timeout=0, interval=0.01):
+        """New messages, waiting up to ``timeout`` seconds for the first one."""
+        deadline = time.monotonic() + timeout
+        while True:
+            messages = self.state.messages(self.channel, self.last_id)
+            if messages or time.monotonic() >= deadline:
+                break
+            time.sleep(interval)
+        if messages:
+            self.last_id = messages[-1][0]
+        return [message for _, message in messages]
+
+
+class LocalMemoryState(BaseSharedState):
+    """State shared by the threads of one process."""
+
+    def __init__(self, max_messages=1000):
+        """Init empty state."""
+        self._lock = threading.Lock()
+        self._cache = {}
+        self._locks = {}
+        self._channels = defaultdict(list)
+        self._last_ids = defaultdict(int)
+        self.max_messages = max_messages
+
+    def _get(self, key):
+        value, expires = self._cache.get(key, (None, None))
+        if expires is not None and expires <= time.time():
+            self._cache.pop(key, None)
+            return None, None
+        return value, expires
+
+    def get(self, key, default=None):
+        """Get the cached value."""
+        with self._lock:
+            value, _ = self._get(key)
+        return default if value is None else value
+
+    def set(self, key, value, ttl=None):
+        """Cache the value for ``ttl`` seconds or forever."""
+        with self._lock:
+            self._cache[key] = (value, None if ttl is None else time.time() + ttl)
+
+    def delete(self, key):
+        """Remove the cached value."""
+        with self._lock:
+            self._cache.pop(key, None)
+
+    def incr(self, key, delta=1, ttl=None):
+        """Atomically add to the cached number, return the new value."""
+        with self._lock:
+            value, expires = self._get(key)
+            if value is None:
+                expires = None if ttl is None else time.time() + ttl
+            value = (value or 0) + delta
+            self._cache[key] = (value, expires)
+        return value
+
+    def acquire(self, name, owner, ttl):
+        """Try to take the lock for ``ttl`` seconds, return whether it was taken."""
+        now = time.time()
+        with self._lock:
+            holder = self._locks.get(name)
+            if holder is not None and holder[0] != owner and holder[1] > now:
+                return False
+            self._locks[name] = (owner, now + ttl)
+        return True
+
+    def release(self, name, owner):
+        """Release the lock if it is still held by the owner."""
+        with self._lock:
+            if self._locks.get(name, (None,))[0] == owner:
+                del self._locks[name]
+
+    def publish(self, channel, message):
+        """Send the message to every subscriber of the channel."""
+        with self._lock:
+            self._last_ids[channel] += 1
+            messages = self._channels[channel]
+            messages.append((self._last_ids[channel], message))
+            del messages[: -self.max_messages]
+
+    def messages(self, channel, after):
+        """Messages of the channel published after the given id: [(id, message)]."""
+        with self._lock:
+            return [item for item in self._channels.get(channel, ()) if item[0] > after]
+
+    def last_message_id(self, channel):
+        """Id of the last message published to the channel."""
+        with self._lock:
+            return self._last_ids[channel]
+
+
+class SQLiteState(BaseSharedState):
+    """State shared by the processes of one host through a SQLite file."""
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS cache "
+        "(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)",
+        "CREATE TABLE IF NOT EXISTS locks "
+        "(name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS messages "
+        "(id INTEGER PRIMARY KEY AUTOINCREMENT, channel TEXT NOT NULL, message BLOB NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS messages_channel ON messages (channel, id)",
+    )
+
+    def __init__(self, path, max_messages=1000):
+        """Create the tables if needed."""
+        self.path = str(path)
+        self.max_messages = max_messages
+        self._local = threading.local()
+        with self._transaction() as db:
+            for statement in self.SCHEMA:
+                db.execute(statement)
+
+    def _connection(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        db = self._connection()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    def get(self, key, default=None):
+        """Get the cached value."""
+        row = (
+            self._connection()
+            .execute(
+                "SELECT value FROM cache WHERE key = ? AND (expires IS NULL OR expires > ?)",
+                (key, time.time()),
+            )
+            .fetchone()
+        )
+        return default if row is None else pickle.loads(row[0])
+
+    def set(self, key, value, ttl=None):
+        """Cache the value for ``ttl`` seconds or forever."""
+        expires = None if ttl is None else time.time() + ttl
+        with self._transaction() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)",
+                (key, pickle.dumps(value), expires),
+            )
+
+    def delete(self, key):
+        """Remove the cached value."""
+        with self._transaction() as db:
+            db.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def incr(self, key, delta=1, ttl=None):
+        """Atomically add to the cached number, return the new value."""
+        now = time.time()
+        with self._transaction() as db:
+            row = db.execute(
+                "SELECT value, expires FROM cache "
+                "WHERE key = ? AND (expires IS NULL OR expires > ?)",
+                (key, now),
+            ).fetchone()
+            if row is None:
+                value, expires = delta, None if ttl is None else now + ttl
+            else:
+                value, expires = pickle.loads(row[0]) + delta, row[1]
+            db.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)",
+                (key, pickle.dumps(value), expires),
+            )
+        return value
+
+    def acquire(self, name, owner, ttl):
+        """Try to take the lock for ``ttl`` seconds, return whether it was taken."""
+        now = time.time()
+        with self._transaction() as db:
+            db.execute("DELETE FROM locks WHERE name = ? AND expires <= ?", (name, now))
+            row = db.execute("SELECT owner FROM locks WHERE name = ?", (name,)).fetchone()
+            if row is not None and row[0] != owner:
+                return False
+            db.execute(
+                "INSERT OR REPLACE INTO locks (name, owner, expires) VALUES (?, ?, ?)",
+                (name, owner, now + ttl),
+            )
+        return True
+
+    def release(self, name, owner):
+        """Release the lock if it is still held by the owner."""
+        with self._transaction() as db:
+            db.execute("DELETE FROM locks WHERE name = ? AND owner = ?", (name, owner))
+
+    def publish(self, channel, message):
+        """Send the message to every subscriber of the channel."""
+        with self._transaction() as db:
+            cursor = db.execute(
+                "INSERT INTO messages (channel, message) VALUES (?, ?)",
+                (channel, pickle.dumps(message)),
+            )
+            db.execute(
+                "DELETE FROM messages WHERE channel = ? AND id <= ?",
+                (channel, cursor.lastrowid - self.max_messages),
+            )
+
+    def messages(self, channel, after):
+        """Messages of the channel published after the given id: [(id, message)]."""
+        rows = (
+            self._connection()
+            .execute(
+                "SELECT id, message FROM messages WHERE channel = ? AND id > ? ORDER BY id",
+                (channel, after),
+            )
+            .fetchall()
+        )
+        return [(message_id, pickle.loads(message)) for message_id, message in rows]
+
+    def last_message_id(self, channel):
+        """Id of the last message published to the channel."""
+        row = (
+            self._connection()
+            .execute("SELECT MAX(id) FROM messages WHERE channel = ?", (channel,))
+            .fetchone()
+        )
+        return row[0] or 0
+
+
+_state = None
+_state_lock = threading.Lock()
+
+
+def get_shared_state():
+    """Shared state backend configured by the SHARED_STATE setting."""
+    global _state
+    if _state is None:
+        with _state_lock:
+            if _state is None:
+                config = getattr(settings, "SHARED_STATE", {})
+                backend = import_string(config.get("BACKEND", "currency.shared.LocalMemoryState"))
+                _state = backend(**config.get("OPTIONS", {}))
+    return _state
+
+
+def reset_shared_state(setting, **kwargs):
+    """Use the new backend once the SHARED_STATE setting is overridden."""
+    global _state
+    if setting == "SHARED_STATE":
+        _state = None
+
+
+setting_changed.connect(reset_shared_state)
@@ -0,0 +1,200 @@
+"""Slow query log aggregated by SQL fingerprint and route.
+
+Every database connection times its queries with an execute wrapper; the
+ones slower than SLOW_QUERY_THRESHOLD milliseconds are aggregated in memory
+and flushed to SlowQuery rows every SLOW_QUERY_FLUSH_INTERVAL seconds by a
+thread the ASGI and WSGI applications start, other processes like tests and
+management commands flush them explicitly. The plan of a fingerprint is
+captured with EXPLAIN when it's first flushed.
+"""
+
+import contextvars
+import hashlib
+import logging
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connections
+from django.db.backends.signals import connection_created
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from django.utils.deprecation import MiddlewareMixin
+
+from currency.models import SlowQuery
+
+logger = logging.getLogger(__name__)
+
+current_route = contextvars.ContextVar("current_route", default="")
+_flushing = threading.local()
+
+NORMALIZE = (
+    (re.compile(r"'(?:[^']|'')*'"), "?"),
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),
+    (re.compile(r"%s"), "?"),
+    (re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)"), "(?)"),
+    (re.compile(r"\s+"), " "),
+)
+
+
+def normalize(sql):
+    """SQL with literals and parameters replaced by ``?`` and IN lists collapsed."""
+    for pattern, replacement in NORMALIZE:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def fingerprint(normalized):
+    """Short hash of the normalized SQL."""
+    return hashlib.sha1(normalized.encode()).hexdigest()[:16]
+
+
+class SlowQueryLog:
+    """Slow queries of this process waiting to be flushed."""
+
+    def __init__(self):
+        """Init empty log."""
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._explained = set()
+        self._thread = None
+
+    def record(self, alias, sql, params, duration):
+        """Add the slow query to the aggregates of its fingerprint and route."""
+        normalized = normalize(sql)
+        key = (fingerprint(normalized), current_route.get()[:255])
+        with self._lock:
+            entry = self._pending.get(key)
+            if entry is None:
+                entry = self._pending[key] = {
+                    "normalized": normalized,
+                    "sql": sql,
+                    "params": params,
+                    "alias": alias,
+                    "count": 0,
+                    "total": 0.0,
+                    "max": 0.0,
+                }
+            entry["count"] += 1
+            entry["total"] += duration
+            entry["max"] = max(entry["max"], duration)
+
+    def start(self):
+        """Start the thread flushing the log periodically, once per process."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="slow-query-log", daemon=True
+                )
+                self._thread.start()
+
+    def flush(self):
+        """Write the pending aggregates, return the number of fingerprints written."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        _flushing.active = True
+        try:
+            for (key, route), entry in pending.items():
+                query, created = SlowQuery.objects.get_or_create(
+                    fingerprint=key,
+                    route=route,
+                    defaults={
+                        "normalized_sql": entry["normalized"],
+                        "example_sql": entry["sql"],
+                        "count": entry["count"],
+                        "total_time": entry["total"],
+                        "max_time": entry["max"],
+                    },
+                )
+                if not created:
+                    SlowQuery.objects.filter(pk=query.pk).update(
+                        count=F("count") + entry["count"],
+                        total_time=F("total_time") + entry["total"],
+                        max_time=Greatest("max_time", entry["max"]),
+                        example_sql=entry["sql"],
+                        last_seen=timezone.now(),
+                    )
+                if key not in self._explained:
+                    self._explained.add(key)
+                    if not SlowQuery.objects.filter(fingerprint=key).exclude(explain="").exists():
+                        SlowQuery.objects.filter(fingerprint=key).update(explain=explain(entry))
+        finally:
+            _flushing.active = False
+        return len(pending)
+
+    def _run(self):
+        while True:
+            time.sleep(getattr(settings, "SLOW_QUERY_FLUSH_INTERVAL", 10))
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Slow query log flush failed")
+            finally:
+                close_old_connections()
+
+
+slow_query_log = SlowQueryLog()
+
+
+def explain(entry):
+    """Plan of the recorded SELECT query, empty for other statements."""
+    if entry["params"] is None or not entry["sql"].lstrip().upper().startswith("SELECT"):
+        return ""
+    connection = connections[entry["alias"]]
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"{connection.ops.explain_query_prefix()} {entry['sql']}", entry["params"]
+            )
+            return "\n".join(" ".join(str(value) for value in row) for row in cursor.fetchall())
+    except DatabaseError as e:
+        return f"EXPLAIN failed: {e}"
+
+
+def make_recorder(alias):
+    """Execute wrapper recording the slow queries of the connection."""
+
+    def recorder(execute, sql, params, many, context):
+        threshold = getattr(settings, "SLOW_QUERY_THRESHOLD", None)
+        if threshold is None or getattr(_flushing, "active", False):
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = (time.perf_counter() - start) * 1000
+            if duration >= threshold:
+                slow_query_log.record(alias, sql, None if many else params, duration)
+
+    recorder.slow_query_recorder = True
+    return recorder
+
+
+def install(sender, connection, **kwargs):
+    """Add the recorder to a new connection, connected to ``connection_created``."""
+    wrappers = connection.execute_wrappers
+    if not any(getattr(wrapper, "slow_query_recorder", False) for wrapper in wrappers):
+        wrappers.append(make_recorder(connection.alias))
+
+
+connection_created.connect(install)
+
+
+class SlowQueryRouteMiddleware(MiddlewareMixin):
+    """Tag queries of the request with its route."""
+
+    def process_request(self, request):
+        """Use the path until the URL is resolved."""
+        current_route.set(f"{request.method} {request.path}")
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        """Use the URL pattern of the view."""
+        current_route.set(f"{request.method} /{request.resolver_match.route}")
+
+    def process_response(self, request, response):
+        """Stop tagging queries once the response is made."""
+        current_route.set("")
+        return response
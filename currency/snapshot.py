@@ -0,0 +1,149 @@
+"""Binary snapshots of the active offers restored by workers on start.
+
+A snapshot is a fixed size header followed by one fixed size record per
+active offer, so it's read through ``mmap`` without parsing. The restoring
+worker reloads only the offers changed in the database since the creation
+time of the snapshot.
+
+Header: magic, format version, record size, database hash, record count and
+creation time. Record: offer id, currency to sell id, currency to buy id,
+amount, exchange rate and expiry timestamp (NaN if the offer doesn't expire).
+"""
+
+import hashlib
+import logging
+import math
+import mmap
+import os
+import struct
+import time
+
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"MKTS"
+VERSION = 3
+HEADER = struct.Struct("<4sHH16sqd")
+RECORD = struct.Struct("<qqqddd")
+
+
+class SnapshotError(Exception):
+    """Snapshot file that can't be restored."""
+
+
+def database_hash():
+    """Hash of the database the snapshot is made of, so others aren't restored from it."""
+    settings_dict = connection.settings_dict
+    return hashlib.blake2b(
+        f"{settings_dict['ENGINE']}:{settings_dict['NAME']}".encode(), digest_size=16
+    ).digest()
+
+
+def write_snapshot(path, records, created_at=None):
+    """Atomically replace the snapshot file with the records, return their count.
+
+    Records are ``(offer_id, sell_id, buy_id, amount, rate, expires_at)`` with
+    the expiry timestamp None if the offer doesn't expire. ``created_at`` is
+    the time the records are current as of, now by default.
+    """
+    temporary = f"{path}.{os.getpid()}.tmp"
+    count = 0
+    with open(temporary, "wb") as fp:
+        fp.write(b"\0" * HEADER.size)
+        for offer_id, sell_id, buy_id, amount, rate, expires_at in records:
+            fp.write(
+                RECORD.pack(
+                    offer_id,
+                    sell_id,
+                    buy_id,
+                    amount,
+                    rate,
+                    math.nan if expires_at is None else expires_at,
+                )
+            )
+            count += 1
+        fp.seek(0)
+        fp.write(
+            HEADER.pack(
+                MAGIC,
+                VERSION,
+                RECORD.size,
+                database_hash(),
+                count,
+                time.time() if created_at is None else created_at,
+            )
+        )
+        fp.flush()
+        os.fsync(fp.fileno())
+    os.replace(temporary, path)
+    return count
+
+
+class Snapshot:
+    """Memory mapped snapshot file, use as a context manager."""
+
+    def __init__(self, path):
+        """Map the file and check its header, SnapshotError if it can't be restored."""
+        with open(path, "rb") as fp:
+            try:
+                self._map = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError as e:
+                raise SnapshotError(f"Empty snapshot {path}") from e
+        try:
+            self._check(path)
+        except SnapshotError:
+            self.close()
+            raise
+
+    def _check(self, path):
+        if len(self._map) < HEADER.size:
+            raise SnapshotError(f"Truncated snapshot {path}")
+        (
+            magic,
+            version,
+            record_size,
+            source,
+            self.count,
+            self.created_at,
+        ) = HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+            raise SnapshotError(f"Unsupported snapshot {path}, version {version}")
+        if source != database_hash():
+            raise SnapshotError(f"Snapshot {path} is of another database")
+        if len(self._map) != HEADER.size + self.count * RECORD.size:
+            raise SnapshotError(f"Truncated snapshot {path}")
+
+    def __iter__(self):
+        """Yield the records, with None expiry for offers that don't expire."""
+        view = memoryview(self._map)[HEADER.size :]
+        try:
+            for offer_id, sell_id, buy_id, amount, rate, expires_at in RECORD.iter_unpack(view):
+                yield offer_id, sell_id, buy_id, amount, rate, (
+                    None if math.isnan(expires_at) else expires_at
+                )
+        finally:
+            view.release()
+
+    def close(self):
+        """Unmap the file."""
+        self._map.close()
+
+    def __enter__(self):
+        """Use the mapped snapshot."""
+        return self
+
+    def __exit__(self, *exc_info):
+        """Unmap the file."""
+        self.close()
+
+
+def read_snapshot(path):
+    """Mapped snapshot of the path, None if there is none that can be restored."""
+    if path is None or not os.path.exists(path):
+        return None
+    try:
+        return Snapshot(path)
+    except (OSError, SnapshotError) as e:
+        logger.warning("Ignoring market snapshot: %s", e)
+        return None
@@ -0,0 +1,75 @@
+"""Offers expiry and archiving in batches."""
+
+import datetime
+
+from django.db import transaction
+from django.utils import timezone
+
+from currency.archive import HISTORY_FIELDS, move_deals
+from currency.models import ArchivedOffer, Deal, Offer
+from currency.routing import offers_changed
+
+ARCHIVED_FIELDS = (
+    "id",
+    "currency_to_sell_id",
+    "currency_to_buy_id",
+    "amount",
+    "exchange_rate",
+    "seller_id",
+    "added_time",
+    "expires_at",
+)
+
+
+def _deactivate(queryset, batch_size):
+    """Disable offers matching the queryset with one UPDATE per batch."""
+    deactivated = 0
+    while True:
+        ids = list(queryset.values_list("pk", flat=True)[:batch_size])
+        if not ids:
+            break
+        deactivated += queryset.filter(pk__in=ids).update(
+            active_state=False, added_time=timezone.now()
+        )
+        offers_changed(*ids)
+    return deactivated
+
+
+def deactivate_expired(batch_size=1000):
+    """Disable active offers whose expiry time has passed."""
+    expired = Offer.objects.filter(active_state=True, expires_at__lte=timezone.now())
+    return _deactivate(expired, batch_size)
+
+
+def deactivate_filled(batch_size=1000):
+    """Disable active offers with nothing left to sell."""
+    return _deactivate(Offer.objects.filter(active_state=True, amount__lte=0), batch_size)
+
+
+def archive_inactive(older_than, batch_size=1000):
+    """Move inactive offers last changed before ``older_than`` days ago.
+
+    Offers are moved together with their deals, those with deals made since
+    the cutoff are kept until the deals are as old.
+    """
+    cutoff = timezone.now() - datetime.timedelta(days=older_than)
+    stale = Offer.objects.filter(active_state=False, added_time__lt=cutoff).exclude(
+        deal__deal_time__gte=cutoff
+    )
+    archived = 0
+    while True:
+        with transaction.atomic():
+            offers = list(
+                stale.select_for_update(skip_locked=True, of=("self",)).values(*ARCHIVED_FIELDS)[
+                    :batch_size
+                ]
+            )
+            if not offers:
+                return archived
+            ids = [offer["id"] for offer in offers]
+            move_deals(list(Deal.objects.filter(offer_id__in=ids).values(*HISTORY_FIELDS)))
+            ArchivedOffer.objects.bulk_create(
+                [ArchivedOffer(**offer) for offer in offers], ignore_conflicts=True
+            )
+            Offer.objects.filter(pk__in=ids).delete()
+        archived += len(offers)
@@ -0,0 +1,188 @@
+"""Durable task queue for side effects of committed writes, without external broker.
+
+Tasks are written to the Task outbox table inside the transaction of the
+write that schedules them and the in-process runner is woken up by a
+``transaction.on_commit`` hook. The ``run_tasks`` command runs the same
+loop as a separate worker. Both delete the tasks done more than
+TASK_RETENTION seconds ago.
+"""
+
+import datetime
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Count, F, Min
+from django.utils import timezone
+
+from currency.models import Task
+
+logger = logging.getLogger(__name__)
+
+LEASE = datetime.timedelta(minutes=5)
+MAX_BACKOFF = datetime.timedelta(hours=1)
+# Seconds between purges of finished tasks by the in-process runner
+PURGE_INTERVAL = 60
+
+_registry = {}
+_running = threading.local()
+
+
+def task(name, batch=False):
+    """Register the function handling tasks with the given name.
+
+    Batch handlers are called once with the list of payloads of every
+    claimed task with that name, others once per task payload.
+    """
+
+    def decorator(func):
+        _registry[name] = (func, batch)
+        return func
+
+    return decorator
+
+
+def enqueue(name, **payload):
+    """Add the task to the outbox, it runs once the current transaction commits."""
+    Task.objects.create(name=name, payload=payload, run_after=timezone.now())
+    transaction.on_commit(runner.wake)
+
+
+def claim(limit):
+    """Lease due tasks to this worker."""
+    now = timezone.now()
+    with transaction.atomic():
+        tasks = list(
+            Task.objects.select_for_update(skip_locked=True)
+            .filter(status__in=(Task.PENDING, Task.RUNNING), run_after__lte=now)
+            .order_by("run_after", "id")[:limit]
+        )
+        Task.objects.filter(pk__in=[item.pk for item in tasks]).update(
+            status=Task.RUNNING, run_after=now + LEASE
+        )
+    return tasks
+
+
+def renew_lease():
+    """Extend the lease of the tasks run by this thread, called by long handlers."""
+    ids = getattr(_running, "ids", None)
+    if ids:
+        Task.objects.filter(pk__in=ids, status=Task.RUNNING).update(
+            run_after=timezone.now() + LEASE
+        )
+
+
+def _execute(tasks, handler, argument):
+    _running.ids = [item.pk for item in tasks]
+    try:
+        handler(argument)
+    except Exception as e:
+        logger.exception("Task %s failed", tasks[0].name)
+        max_attempts = getattr(settings, "TASK_MAX_ATTEMPTS", 5)
+        backoff = getattr(settings, "TASK_RETRY_BACKOFF", 2)
+        for item in tasks:
+            attempts = item.attempts + 1
+            delay = min(datetime.timedelta(seconds=backoff * 2 ** (attempts - 1)), MAX_BACKOFF)
+            Task.objects.filter(pk=item.pk).update(
+                status=Task.FAILED if attempts >= max_attempts else Task.PENDING,
+                attempts=attempts,
+                run_after=timezone.now() + delay,
+                last_error=repr(e),
+            )
+        return
+    finally:
+        _running.ids = None
+    Task.objects.filter(pk__in=[item.pk for item in tasks]).update(
+        status=Task.DONE, attempts=F("attempts") + 1, finished_at=timezone.now()
+    )
+
+
+def run_pending(limit=100):
+    """Run one batch of due tasks, return how many were claimed."""
+    tasks = claim(limit)
+    groups = defaultdict(list)
+    for item in tasks:
+        groups[item.name].append(item)
+    for name, group in groups.items():
+        handler, batch = _registry.get(name, (None, False))
+        if handler is None:
+            Task.objects.filter(pk__in=[item.pk for item in group]).update(
+                status=Task.FAILED, last_error=f"Unknown task {name}"
+            )
+        elif batch:
+            _execute(group, handler, [item.payload for item in group])
+        else:
+            for item in group:
+                _execute([item], handler, item.payload)
+    return len(tasks)
+
+
+def purge_finished(older_than=None, batch_size=1000):
+    """Delete tasks done more than ``older_than`` (TASK_RETENTION) ago in small batches."""
+    if older_than is None:
+        older_than = datetime.timedelta(seconds=getattr(settings, "TASK_RETENTION", 24 * 60 * 60))
+    finished = Task.objects.filter(
+        status=Task.DONE, finished_at__lt=timezone.now() - older_than
+    ).order_by("finished_at")
+    deleted = 0
+    while True:
+        ids = list(finished.values_list("pk", flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += Task.objects.filter(pk__in=ids).delete()[0]
+
+
+def queue_stats():
+    """Depth and lag of the waiting tasks per name."""
+    now = timezone.now()
+    rows = (
+        Task.objects.filter(status__in=(Task.PENDING, Task.RUNNING))
+        .values("name")
+        .annotate(depth=Count("id"), oldest=Min("created_at"))
+        .order_by("name")
+    )
+    return [{**row, "lag": now - row["oldest"]} for row in rows]
+
+
+class Runner:
+    """Thread running tasks in the web process as soon as they are committed."""
+
+    def __init__(self):
+        """Init stopped runner."""
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def wake(self):
+        """Start the runner if needed and make it look for due tasks."""
+        if not getattr(settings, "TASK_QUEUE_IN_PROCESS", True):
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="tasks", daemon=True)
+                self._thread.start()
+        self._event.set()
+
+    def _run(self):
+        poll = getattr(settings, "TASK_QUEUE_POLL", 1)
+        purged_at = 0
+        while True:
+            self._event.wait(poll)
+            self._event.clear()
+            close_old_connections()
+            try:
+                while run_pending():
+                    pass
+                if time.monotonic() - purged_at >= PURGE_INTERVAL:
+                    purge_finished()
+                    purged_at = time.monotonic()
+            except Exception:
+                logger.exception("Task runner failed")
+            finally:
+                close_old_connections()
+
+
+runner = Runner()
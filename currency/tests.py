@@ -1,12 +1,78 @@
 """Test cases for Django API framework."""
 
+import asyncio
+import datetime
+import io
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+from unittest import mock
+
+import jwt
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.test import TestCase
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+
+from currency import (
+    admission,
+    alerts,
+    api,
+    archive,
+    coalescing,
+    images,
+    imports,
+    openapi,
+    profiling,
+    projection,
+    slowlog,
+    snapshot,
+    tasks,
+    tokens,
+)
+from currency.models import (
+    ArchivedDeal,
+    ArchivedOffer,
+    Balance,
+    Candle,
+    Currency,
+    Deal,
+    IdempotencyKey,
+    ImportJob,
+    Notification,
+    Offer,
+    PriceAlert,
+    RequestProfile,
+    RevokedSession,
+    SlowQuery,
+    Task,
+)
+from currency.market import MarketSummary, compute_summary
+from currency.registry import currency_registry
+from currency.routing import OfferGraph, offer_graph
+from currency.shared import BaseSharedState, LocalMemoryState, LockTimeout, SQLiteState
+
 
-from currency import api
-from currency.models import Currency, Deal, Offer
+def shared_state_worker(path, increments):
+    """Increment the shared counter under the lock, as a separate worker process."""
+    state = SQLiteState(path)
+    for _ in range(increments):
+        with state.lock("counter", timeout=30):
+            state.set("counter", state.get("counter", 0) + 1)
+    state.incr("finished")
+    state.publish("workers", os.getpid())
 
 
+# Keeps revoked sessions and offer changes of the tests out of the shared state file
+@override_settings(SHARED_STATE={"BACKEND": "currency.shared.LocalMemoryState"})
 class TestAPI(TestCase):
     """Ninja API testing methods."""
 
@@ -82,6 +148,8 @@ class TestAPI(TestCase):
     def setUp(self):
         """Set up method."""
         self.headers = {"HTTP_AUTHORIZATION": f"Bearer {self.token}"}
+        currency_registry.invalidate()
+        offer_graph.invalidate()
         print("SetUp")
 
     def tearDown(self):
@@ -112,6 +180,78 @@ class TestAPI(TestCase):
         response = self.client.post(path="/api/sign_in", data=data)
         self.assertEqual(response.status_code, 422)
 
+    def test_refresh_token_rotation(self):
+        """Test refresh token is exchanged once and its reuse revokes the session."""
+        data = {"username": "TestUserName", "password": "test"}
+        refresh_token = self.client.post(path="/api/sign_in", data=data).json()["refresh_token"]
+        response = self.client.post(
+            path="/api/token/refresh", data={"refresh_token": refresh_token}
+        )
+        self.assertEqual(response.status_code, 200)
+        token = response.json()["token"]
+        auth = {"HTTP_AUTHORIZATION": f"Bearer {token}"}
+        self.assertEqual(self.client.get(path="/api/users/1", **auth).status_code, 200)
+
+        reuse = self.client.post(path="/api/token/refresh", data={"refresh_token": refresh_token})
+        self.assertEqual(reuse.status_code, 401)
+        self.assertEqual(self.client.get(path="/api/users/1", **auth).status_code, 401)
+        response = self.client.post(
+            path="/api/token/refresh", data={"refresh_token": response.json()["refresh_token"]}
+        )
+        self.assertEqual(response.status_code, 401)
+
+    def test_invalid_tokens(self):
+        """Test garbage, forged and refresh tokens are rejected."""
+        forged = jwt.encode({"username": "TestUserName"}, key="not-the-key", algorithm="HS256")
+        refresh = api.create_token("TestUserName")
+        refresh = jwt.encode(
+            {**jwt.decode(refresh, options={"verify_signature": False}), "type": "refresh"},
+            key=settings.JWT_SIGNING_KEY,
+            algorithm="HS256",
+        )
+        for token in ("garbage", forged, refresh):
+            response = self.client.get(
+                path="/api/users/1/balances", HTTP_AUTHORIZATION=f"Bearer {token}"
+            )
+            self.assertEqual(response.status_code, 401)
+
+    def test_shared_state_synced_off_event_loop(self):
+        """Test revocations and currencies are synced outside of the event loop thread."""
+        state, threads = LocalMemoryState(), []
+        get = state.get
+
+        def spy(*args, **kwargs):
+            threads.append(threading.get_ident())
+            return get(*args, **kwargs)
+
+        async def check():
+            tokens.revocations._synced_at = 0
+            self.assertFalse(tokens.revocations.is_revoked("session"))
+            currency_registry._synced_at = 0
+            self.assertEqual((await currency_registry.asnapshot()).get("EUR").pk, 1)
+            return threading.get_ident()
+
+        with mock.patch.object(state, "get", spy), mock.patch(
+            "currency.tokens.get_shared_state", return_value=state
+        ), mock.patch("currency.registry.get_shared_state", return_value=state):
+            currency_registry.snapshot()
+            threads.clear()
+            loop_thread = asyncio.run(check())
+        self.assertTrue(threads)
+        self.assertNotIn(loop_thread, threads)
+
+    def test_sign_out(self):
+        """Test sign out revokes access and refresh tokens of the session."""
+        data = {"username": "TestUserName", "password": "test"}
+        tokens = self.client.post(path="/api/sign_in", data=data).json()
+        response = self.client.post(
+            path="/api/sign_out", data={"refresh_token": tokens["refresh_token"]}
+        )
+        self.assertEqual(response.status_code, 204)
+        auth = {"HTTP_AUTHORIZATION": f"Bearer {tokens['token']}"}
+        self.assertEqual(self.client.get(path="/api/users/1", **auth).status_code, 401)
+        self.assertTrue(RevokedSession.objects.exists())
+
     def test_sign_up(self):
         """Test Sing up."""
         data = {"username": "NewTestUserName", "password": "newtest"}
@@ -137,6 +277,15 @@ class TestAPI(TestCase):
         response = self.client.get(path="/api/currencies/1")
         self.assertEqual(response.status_code, 200)
 
+    def test_get_currencies_batch(self):
+        """Test GET currencies by ids."""
+        response = self.client.get(path="/api/currencies/batch?ids=1,3,111")
+        self.assertEqual(set(response.json()["items"]), {"1", "3"})
+        self.assertEqual(response.json()["missing"], [111])
+
+        response = self.client.get(path="/api/currencies/batch?ids=1,a")
+        self.assertEqual(response.status_code, 400)
+
     def test_get_all_currencies(self):
         """Test GET all currencies."""
         response = self.client.get(path="/api/currencies?limit=100&offset=0")
@@ -158,6 +307,21 @@ class TestAPI(TestCase):
         )
         self.assertEqual(response.status_code, 201)
 
+    @override_settings(TASK_QUEUE_IN_PROCESS=False)
+    def test_currency_registry_refresh(self):
+        """Test currencies are served by code and reloaded once a change commits."""
+        self.assertEqual(self.client.get(path="/api/currencies/usd").json()["id"], 2)
+        data = {"code": "UAH", "name": "Hryvna", "image": "/uah.jpg"}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                path="/api/currencies", data=data, content_type="application/json", **self.headers
+            )
+        self.assertEqual(self.client.get(path="/api/currencies/UAH").json()["name"], "Hryvna")
+        with self.assertNumQueries(0):
+            response = self.client.get(path="/api/currencies/uah")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(path="/api/currencies/GBP").status_code, 404)
+
     def test_add_currency_400(self):
         """Test POST existing currency."""
         data = {
@@ -188,6 +352,18 @@ class TestAPI(TestCase):
         )
         self.assertEqual(response.status_code, 200)
 
+    def test_edit_currency_409(self):
+        """Test PUT currency with a stale version fails."""
+        Currency.objects.filter(pk=2).update(version=3)
+        response = self.client.put(
+            path="/api/currencies/2",
+            data={"code": "usd", "name": "Dollar", "image": "usd.jpg", "version": 2},
+            content_type="application/json",
+            **self.headers,
+        )
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Currency.objects.get(pk=2).name, "US Dollar")
+
     def test_edit_currency_404(self):
         """Test PUT currency fail."""
         data = {
@@ -237,6 +413,43 @@ class TestAPI(TestCase):
         response = self.client.get(path="/api/offers?limit=100&offset=0")
         self.assertEqual(response.status_code, 200)
 
+    def test_get_filtered_active_offers(self):
+        """Test GET active offers filtered and sorted by an indexed combination."""
+        Offer.objects.filter(pk=2).update(exchange_rate=8)
+        response = self.client.get(
+            path="/api/offers?currency_to_sell_id=1&currency_to_buy_id=2"
+            "&exchange_rate_max=8.5&sort=-exchange_rate"
+        )
+        self.assertEqual([offer["id"] for offer in response.json()["items"]], [2])
+
+        response = self.client.get(path="/api/offers?currency_to_sell_id=1&sort=added_time")
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.get(path="/api/offers?sort=seller")
+        self.assertEqual(response.status_code, 422)
+
+    def test_get_offers_sparse_fields(self):
+        """Test GET active offers with only the requested fields."""
+        response = self.client.get(path="/api/offers?fields=exchange_rate,seller_id")
+        self.assertEqual(
+            response.json()["items"][0], {"id": 1, "exchange_rate": 9.0, "seller_id": 1}
+        )
+        cached = projection.projected_schema.cache_info().currsize
+        response = self.client.get(path="/api/offers?fields=seller_id,%20exchange_rate,seller_id")
+        self.assertEqual(
+            response.json()["items"][0], {"id": 1, "exchange_rate": 9.0, "seller_id": 1}
+        )
+        self.assertEqual(projection.projected_schema.cache_info().currsize, cached)
+
+        response = self.client.get(path="/api/offers/1?fields=deal_set")
+        self.assertEqual(set(response.json()), {"id", "deal"})
+
+        response = self.client.get(path="/api/currencies?fields=code")
+        self.assertEqual(response.json()["items"][0], {"id": 1, "code": "EUR"})
+
+        response = self.client.get(path="/api/offers?fields=password")
+        self.assertEqual(response.status_code, 400)
+
     def test_get_user_offers(self):
         """Test GET all user offers."""
         response = self.client.get(
@@ -267,6 +480,30 @@ class TestAPI(TestCase):
         )
         self.assertEqual(response.status_code, 201)
 
+    def test_add_new_offer_by_currency_codes(self):
+        """Test POST new offer validates currency codes without queries."""
+        data = {
+            "currency_to_sell_id": "cad",
+            "currency_to_buy_id": "EUR",
+            "amount": 100,
+            "exchange_rate": 0.7,
+            "seller_id": 2,
+        }
+        currency_registry.snapshot()
+        with self.assertNumQueries(0):
+            response = self.client.post(
+                path="/api/offers",
+                data={**data, "currency_to_buy_id": "XXX"},
+                content_type="application/json",
+                **self.headers,
+            )
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(
+            path="/api/offers", data=data, content_type="application/json", **self.headers
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["currency_to_sell_id"], 3)
+
     def test_toggle_offer_state(self):
         """Test toggle offer state (enable/disable)."""
         data = {"active_state": False}
@@ -278,6 +515,24 @@ class TestAPI(TestCase):
         )
         self.assertEqual(response.status_code, 200)
 
+    def test_toggle_offer_state_409(self):
+        """Test toggle offer state with a stale version fails."""
+        response = self.client.patch(
+            path="/api/offers/1",
+            data={"active_state": False, "version": 0},
+            content_type="application/json",
+            **self.headers,
+        )
+        self.assertEqual(response.json()["version"], 1)
+        response = self.client.patch(
+            path="/api/offers/1",
+            data={"active_state": True, "version": 0},
+            content_type="application/json",
+            **self.headers,
+        )
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Offer.objects.get(pk=1).active_state)
+
     def test_toggle_offer_state_404(self):
         """Test toggle offer state (enable/disable) fails."""
         data = {"active_state": True}
@@ -321,6 +576,15 @@ class TestAPI(TestCase):
         response = self.client.get(path="/api/deals/1")
         self.assertContains(response=response, text="offer")
 
+    def test_get_offers_and_deals_batch(self):
+        """Test GET offers and deals by ids."""
+        response = self.client.get(path="/api/offers/batch?ids=1,2")
+        self.assertEqual(len(response.json()["items"]["1"]["deal"]), 1)
+
+        response = self.client.get(path="/api/deals/batch?ids=1,2")
+        self.assertEqual(response.json()["items"]["1"]["offer"]["id"], 1)
+        self.assertEqual(response.json()["missing"], [2])
+
     def test_get_single_deal_404(self):
         """Test GET single deal fail."""
         response = self.client.get(path="/api/deals/111")
@@ -373,3 +637,713 @@ class TestAPI(TestCase):
             **{"HTTP_AUTHORIZATION": f"Bearer {self.token}"},
         )
         self.assertEqual(response.status_code, 400)
+
+    def test_currency_image_variants(self):
+        """Test image variants generation and cached serving."""
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            buffer = io.BytesIO()
+            Image.new("RGB", (512, 512), "red").save(buffer, format="PNG")
+            name = default_storage.save("eur.png", ContentFile(buffer.getvalue()))
+            Currency.objects.filter(pk=1).update(image=name)
+
+            variants = images.generate_variants(1)
+            self.assertEqual(set(variants), {"thumb_webp", "thumb_png", "small_webp", "small_png"})
+            with default_storage.open(variants["thumb_png"]) as fp:
+                self.assertEqual(Image.open(fp).size, (64, 64))
+
+            response = self.client.get(path="/api/currencies/1")
+            self.assertContains(response=response, text="small_webp")
+
+            response = self.client.get(path=default_storage.url(variants["small_webp"]))
+            self.assertEqual(response.status_code, 200)
+            self.assertIn("immutable", response["Cache-Control"])
+
+    def test_get_candles(self):
+        """Test deals are aggregated into candles."""
+        for amount in (100, 50):
+            self.client.post(
+                path="/api/deals",
+                data={"buyer_id": 2, "offer_id": 2, "amount": amount},
+                content_type="application/json",
+                **self.headers,
+            )
+        response = self.client.get(path="/api/candles/1/2?interval=1m")
+        self.assertEqual(response.status_code, 200)
+        candle = response.json()[-1]
+        self.assertEqual(candle["volume"], 150)
+        self.assertEqual(candle["vwap"], 9)
+        self.assertEqual(candle["trades"], 2)
+
+        response = self.client.get(path="/api/candles/1/2?interval=5m")
+        self.assertEqual(response.status_code, 400)
+
+    def test_backfill_candles(self):
+        """Test candles rebuild from deals history."""
+        call_command("backfill_candles", stdout=io.StringIO())
+        self.assertEqual(Candle.objects.filter(interval="1d").count(), 1)
+        self.assertEqual(Candle.objects.get(interval="1h").volume, 100)
+
+        moment = datetime.datetime(2020, 1, 15, tzinfo=datetime.timezone.utc)
+        Deal.objects.filter(pk=1).update(deal_time=moment)
+        call_command("archive_deals", stdout=io.StringIO())
+        call_command("backfill_candles", stdout=io.StringIO())
+        candle = Candle.objects.get(interval="1h")
+        self.assertEqual((candle.bucket_start, candle.volume), (moment, 100))
+
+    @override_settings(MARKET_SUMMARY_INTERVAL=0)
+    def test_get_market_summary(self):
+        """Test market summary per currency pair."""
+        response = self.client.get(path="/api/market/summary")
+        self.assertEqual(response.status_code, 200)
+        pair = response.json()["pairs"][0]
+        self.assertEqual(pair["active_offers"], 2)
+        self.assertEqual(pair["depth"], 2000)
+        self.assertEqual(pair["volume_24h"], 100)
+
+    def test_market_summary_copied_to_workers(self):
+        """Test workers serve the summary from memory and copy the one refreshed by another."""
+        worker, other = MarketSummary(), MarketSummary()
+        other.refresh()
+        worker._pull()
+        self.assertEqual(worker.payload, other.payload)
+
+        Offer.objects.filter(pk=2).update(active_state=False)
+        other.refresh()
+        with mock.patch("currency.market.get_shared_state", side_effect=AssertionError):
+            self.assertNotEqual(worker.payload, other.payload)
+        worker._pull()
+        self.assertEqual(json.loads(worker.payload)["pairs"][0]["active_offers"], 1)
+
+    @override_settings(TASK_QUEUE_IN_PROCESS=False)
+    def test_get_conversion_quote(self):
+        """Test conversion routed over two offers, updated as offers change."""
+        Offer.objects.create(
+            currency_to_sell_id=3, currency_to_buy_id=1, amount=300, exchange_rate=2, seller_id=2
+        )
+        response = self.client.get(path="/api/quote?from_currency=USD&to_currency=cad&amount=18000")
+        self.assertEqual(response.status_code, 200)
+        quote = response.json()
+        self.assertEqual(quote["route"], [2, 1, 3])
+        self.assertEqual((quote["spent"], quote["received"]), (5400, 300))
+        self.assertEqual(len(quote["legs"]), 2)
+
+        data = {
+            "currency_to_sell_id": "CAD",
+            "currency_to_buy_id": "USD",
+            "amount": 100,
+            "exchange_rate": 10,
+            "seller_id": 2,
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                path="/api/offers", data=data, content_type="application/json", **self.headers
+            )
+        quote = self.client.get(path="/api/quote?from_currency=2&to_currency=3&amount=900").json()
+        self.assertEqual((quote["route"], quote["received"]), ([2, 3], 90))
+        response = self.client.get(path="/api/quote?from_currency=CAD&to_currency=USD&amount=1")
+        self.assertEqual(response.status_code, 404)
+
+    def test_add_new_basket(self):
+        """Test basket deals are saved together and offers decremented."""
+        legs = [
+            {"buyer_id": 2, "offer_id": 2, "amount": 300},
+            {"buyer_id": 2, "offer_id": 1, "amount": 100},
+            {"buyer_id": 2, "offer_id": 2, "amount": 700},
+        ]
+        response = self.client.post(
+            path="/api/deals/basket",
+            data={"legs": legs},
+            content_type="application/json",
+            **self.headers,
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()["deals"]), 3)
+        self.assertEqual(Offer.objects.get(pk=1).amount, 900)
+        self.assertFalse(Offer.objects.get(pk=2).active_state)
+        self.assertEqual(Balance.objects.get(user_id=2, currency_id=1).bought, 1100)
+
+    def test_add_new_basket_400(self):
+        """Test basket with an invalid leg saves nothing."""
+        legs = [
+            {"buyer_id": 2, "offer_id": 1, "amount": 100},
+            {"buyer_id": 2, "offer_id": 2, "amount": 600},
+            {"buyer_id": 2, "offer_id": 2, "amount": 600},
+        ]
+        response = self.client.post(
+            path="/api/deals/basket",
+            data={"legs": legs},
+            content_type="application/json",
+            **self.headers,
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("leg 2", response.json()["message"])
+        self.assertEqual(Offer.objects.get(pk=1).amount, 1000)
+        self.assertEqual(Deal.objects.count(), 1)
+
+    def test_add_new_deal_idempotency_key(self):
+        """Test retried deal with the same Idempotency-Key is replayed."""
+        request = {
+            "path": "/api/deals",
+            "data": {"buyer_id": 2, "offer_id": 2, "amount": 100},
+            "content_type": "application/json",
+            "HTTP_IDEMPOTENCY_KEY": "deal-1",
+            **self.headers,
+        }
+        first = self.client.post(**request)
+        retry = self.client.post(**request)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(Offer.objects.get(pk=2).amount, 900)
+
+        request["data"] = {"buyer_id": 2, "offer_id": 2, "amount": 50}
+        response = self.client.post(**request)
+        self.assertEqual(response.status_code, 422)
+
+        with override_settings(IDEMPOTENCY_KEY_TTL=-1):
+            call_command("purge_idempotency_keys", stdout=io.StringIO())
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        request["HTTP_IDEMPOTENCY_KEY"] = "deal-2"
+        with mock.patch("currency.idempotency.store", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.client.post(**request)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        with mock.patch("currency.idempotency.release"):
+            with self.assertRaises(RuntimeError), mock.patch(
+                "currency.idempotency.store", side_effect=RuntimeError
+            ):
+                self.client.post(**request)
+        with override_settings(IDEMPOTENCY_WAIT=0):
+            self.assertEqual(self.client.post(**request).status_code, 409)
+        IdempotencyKey.objects.update(created_at=timezone.now() - datetime.timedelta(minutes=1))
+        self.assertEqual(self.client.post(**request).status_code, 201)
+
+    def test_sweep_offers(self):
+        """Test expired and filled offers are deactivated and old ones archived."""
+        expired = Offer.objects.create(
+            currency_to_sell_id=2,
+            currency_to_buy_id=3,
+            amount=10,
+            exchange_rate=2,
+            seller_id=2,
+            expires_at=datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc),
+        )
+        filled = Offer.objects.create(
+            currency_to_sell_id=2, currency_to_buy_id=3, amount=0, exchange_rate=2, seller_id=2
+        )
+        deal = Deal.objects.create(offer=filled, buyer_id=1, amount=5)
+        response = self.client.get(path="/api/offers?limit=100&offset=0")
+        self.assertNotContains(response=response, text=f'"id": {expired.pk},')
+        pair = compute_summary().pairs[1]
+        self.assertEqual((pair.active_offers, pair.depth, pair.best_rate), (1, 0, 2))
+
+        call_command("sweep_offers", stdout=io.StringIO())
+        self.assertFalse(Offer.objects.get(pk=expired.pk).active_state)
+        self.assertFalse(Offer.objects.get(pk=filled.pk).active_state)
+
+        # Offers are kept while they have deals made since the cutoff
+        Deal.objects.filter(pk=deal.pk).update(
+            deal_time=timezone.now() + datetime.timedelta(days=2)
+        )
+        call_command("sweep_offers", "--archive-after=-1", stdout=io.StringIO())
+        self.assertTrue(Offer.objects.filter(pk=filled.pk).exists())
+        call_command("sweep_offers", "--archive-after=-3", stdout=io.StringIO())
+        self.assertTrue(ArchivedOffer.objects.filter(pk=expired.pk).exists())
+        self.assertFalse(Offer.objects.filter(pk=filled.pk).exists())
+        self.assertEqual(ArchivedDeal.objects.get(pk=deal.pk).offer_id, filled.pk)
+        self.assertTrue(Offer.objects.filter(pk=1).exists())
+
+    def test_archive_deals(self):
+        """Test old deals are archived and still listed by history."""
+        Deal.objects.filter(pk=1).update(
+            deal_time=datetime.datetime(2020, 1, 15, tzinfo=datetime.timezone.utc)
+        )
+        call_command("archive_deals", stdout=io.StringIO())
+        self.assertFalse(Deal.objects.filter(pk=1).exists())
+        self.assertEqual(ArchivedDeal.objects.get(pk=1).month, datetime.date(2020, 1, 1))
+        horizon = ArchivedDeal.objects.get(pk=1).deal_time
+        self.assertEqual(archive.archive_horizon(), horizon)
+        self.assertEqual(archive.archive_horizon(1), horizon)
+        self.assertIsNone(archive.archive_horizon(2))
+        response = self.client.delete(path="/api/offers/1", **self.headers)
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(Offer.objects.filter(pk=1).exists())
+
+        response = self.client.get(path="/api/deals/1/offer?limit=100&offset=0")
+        self.assertContains(response=response, text='"id": 1,')
+        response = self.client.get(
+            path="/api/deals/1/offer?limit=100&offset=0&start=2021-01-01T00:00:00Z"
+        )
+        self.assertJSONEqual(raw=response.content, expected_data={"items": [], "count": 0})
+
+    def test_run_tasks(self):
+        """Test tasks of committed writes are run in batches and retried."""
+        self.client.post(
+            path="/api/offers",
+            data={
+                "currency_to_sell_id": 3,
+                "currency_to_buy_id": 2,
+                "amount": 1,
+                "exchange_rate": 1,
+                "seller_id": 2,
+            },
+            content_type="application/json",
+            **self.headers,
+        )
+        calls = []
+        tasks.task("test.flaky", batch=True)(lambda payloads: calls.append(payloads) or 1 / 0)
+        self.addCleanup(tasks._registry.pop, "test.flaky")
+        tasks.enqueue("test.flaky", n=1)
+        tasks.enqueue("test.flaky", n=2)
+
+        with self.assertLogs("currency.tasks", "ERROR"):
+            call_command("run_tasks", "--once", stdout=io.StringIO())
+        self.assertEqual(calls, [[{"n": 1}, {"n": 2}]])
+        self.assertEqual(Task.objects.get(name="alerts.match").status, Task.DONE)
+        Task.objects.filter(name="alerts.match").update(
+            finished_at=timezone.now() - datetime.timedelta(days=2)
+        )
+        self.assertEqual(tasks.purge_finished(), 1)
+        flaky = Task.objects.filter(name="test.flaky").first()
+        self.assertEqual((flaky.status, flaky.attempts), (Task.PENDING, 1))
+        self.assertEqual(tasks.queue_stats()[0]["depth"], 2)
+
+        self.client.force_login(User.objects.create_superuser("admin", password="admin"))
+        response = self.client.get(path="/admin/currency/task/")
+        self.assertContains(response=response, text="test.flaky")
+
+    def test_get_user_balances(self):
+        """Test deals update balances and reconcile rebuilds them."""
+        self.client.post(
+            path="/api/deals",
+            data={"buyer_id": 2, "offer_id": 2, "amount": 10},
+            content_type="application/json",
+            **self.headers,
+        )
+        response = self.client.get(path="/api/users/2/balances", **self.headers)
+        self.assertEqual(
+            sorted((row["currency_id"], row["bought"], row["sold"]) for row in response.json()),
+            [(1, 10, 0), (2, 0, 90)],
+        )
+
+        call_command("reconcile_balances", stdout=io.StringIO())
+        balance = Balance.objects.get(user_id=1, currency_id=1)
+        self.assertEqual((balance.sold, balance.deals), (110, 2))
+
+    def test_openapi_json(self):
+        """Test cached OpenAPI schema serving."""
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+            OPENAPI_SCHEMA_FILE=f"{directory}/openapi.json"
+        ):
+            call_command("build_openapi", stdout=io.StringIO())
+            response = self.client.get(path="/api/openapi.json", HTTP_ACCEPT_ENCODING="gzip")
+            self.assertEqual(response["Content-Encoding"], "gzip")
+
+            response = self.client.get(path="/api/openapi.json")
+            self.assertIn("/api/market/summary", response.json()["paths"])
+
+            response = self.client.get(
+                path="/api/openapi.json", HTTP_IF_NONE_MATCH=response["ETag"]
+            )
+            self.assertEqual(response.status_code, 304)
+
+            openapi._cached.clear()
+            with open(f"{directory}/openapi.json", "w") as fp:
+                json.dump({"paths": {}}, fp)
+            with self.assertLogs("currency.openapi", "WARNING"):
+                response = self.client.get(path="/api/openapi.json")
+            self.assertIn("/api/market/summary", response.json()["paths"])
+            with mock.patch.object(api.api, "get_openapi_schema") as get_openapi_schema:
+                self.client.get(path="/api/openapi.json")
+            get_openapi_schema.assert_not_called()
+
+    def test_shared_state_local_memory(self):
+        """Test cache expiry, lock exclusion and pub/sub of the local memory backend."""
+        state = LocalMemoryState()
+        state.set("key", "value", ttl=-1)
+        self.assertIsNone(state.get("key"))
+        self.assertEqual(state.incr("hits"), 1)
+        self.assertEqual(state.incr("hits", 2), 3)
+        subscription = state.subscribe("events")
+        state.publish("events", {"id": 1})
+        self.assertEqual(subscription.poll(), [{"id": 1}])
+        self.assertEqual(subscription.poll(), [])
+        with state.lock("resource"):
+            with self.assertRaises(LockTimeout):
+                with state.lock("resource", timeout=0):
+                    pass
+
+        class CacheOnly(BaseSharedState):
+            get = set = delete = incr = LocalMemoryState.get
+
+        with self.assertRaises(TypeError):
+            CacheOnly()
+
+    def test_shared_state_multiple_workers(self):
+        """Test worker processes share cache, locks and pub/sub through SQLite."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "shared.sqlite3")
+        state = SQLiteState(path)
+        subscription = state.subscribe("workers")
+        workers = [
+            multiprocessing.Process(target=shared_state_worker, args=(path, 50)) for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(60)
+        self.assertEqual(state.get("counter"), 200)
+        self.assertEqual(state.get("finished"), 4)
+        self.assertCountEqual(subscription.poll(timeout=5), [worker.pid for worker in workers])
+
+    @override_settings(TASK_QUEUE_IN_PROCESS=False)
+    def test_import_offers(self):
+        """Test uploaded offers file is imported with per-row errors file."""
+        content = (
+            "currency_to_sell_id,currency_to_buy_id,amount,exchange_rate,seller_id,expires_at\n"
+            "EUR,USD,100,1.1,2,\n"
+            "3,1,50,0.7,1,2099-01-01T00:00:00Z\n"
+            "EUR,XXX,100,1.1,2,\n"
+        )
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            response = self.client.post(
+                path="/api/imports",
+                data={"kind": "offers", "file": ContentFile(content, name="offers.csv")},
+                **self.headers,
+            )
+            self.assertEqual(response.status_code, 202)
+            tasks.run_pending()
+            job = self.client.get(path=f"/api/imports/{response.json()['id']}", **self.headers)
+            self.assertEqual(job.json()["status"], "done")
+            self.assertEqual((job.json()["imported"], job.json()["failed"]), (2, 1))
+            errors = self.client.get(path=job.json()["errors_url"], **self.headers)
+            error = json.loads(b"".join(errors.streaming_content))
+            self.assertEqual(error["row"], 3)
+        self.assertEqual(Offer.objects.filter(seller_id=2).count(), 1)
+
+    def test_import_data_resume(self):
+        """Test interrupted import command continues after the last committed chunk."""
+        rows = [
+            {"code": "uah", "name": "Hryvna", "image": "uah.jpg"},
+            {"code": "USD", "name": "Duplicate", "image": "usd.jpg"},
+            {"code": "PLN", "name": "Zloty", "image": "pln.jpg"},
+        ]
+        build = imports.currency_objects
+        calls = []
+
+        def interrupted(chunk):
+            calls.append(chunk)
+            if len(calls) == 2:
+                raise OSError("interrupted")
+            return build(chunk)
+
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            path = os.path.join(media_root, "currencies.ndjson")
+            with open(path, "w") as fp:
+                fp.writelines(json.dumps(row) + "\n" for row in rows)
+            with mock.patch("currency.imports.currency_objects", interrupted):
+                with self.assertRaises(OSError):
+                    call_command(
+                        "import_data", path, kind="currencies", batch_size=1, stdout=io.StringIO()
+                    )
+            job = ImportJob.objects.get()
+            self.assertEqual((job.status, job.rows_done), (ImportJob.FAILED, 1))
+
+            lease_until = timezone.now() + datetime.timedelta(minutes=1)
+            ImportJob.objects.filter(pk=job.pk).update(
+                status=ImportJob.RUNNING, lease_until=lease_until
+            )
+            imports.run_import(job.pk, batch_size=1)
+            self.assertEqual(ImportJob.objects.get(pk=job.pk).rows_done, 1)
+
+            def taken_over(chunk):
+                ImportJob.objects.filter(pk=job.pk).update(rows_done=2)
+                return build(chunk)
+
+            ImportJob.objects.filter(pk=job.pk).update(lease_until=timezone.now())
+            with mock.patch("currency.imports.currency_objects", taken_over):
+                imports.run_import(job.pk, batch_size=1)
+            self.assertEqual(ImportJob.objects.get(pk=job.pk).failed, 0)
+            ImportJob.objects.filter(pk=job.pk).update(rows_done=1, lease_until=timezone.now())
+
+            call_command("import_data", resume=job.pk, batch_size=1, stdout=io.StringIO())
+            job.refresh_from_db()
+        self.assertEqual((job.status, job.imported, job.failed), (ImportJob.DONE, 2, 1))
+        self.assertEqual(Currency.objects.filter(code__in=("UAH", "PLN")).count(), 2)
+
+    def test_profiled_request(self):
+        """Test requests with a signed X-Profile header are profiled into a ring buffer."""
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+            PROFILE_DIR=directory, PROFILE_MAX_FILES=1
+        ):
+            response = self.client.get(path="/api/currencies", HTTP_X_PROFILE="forged")
+            self.assertNotIn("X-Profile-Id", response)
+            for _ in range(2):
+                response = self.client.get(
+                    path="/api/currencies", HTTP_X_PROFILE=profiling.make_token()
+                )
+            profile = RequestProfile.objects.get()
+            self.assertEqual(response["X-Profile-Id"], str(profile.pk))
+            self.assertGreater(profile.query_count, 0)
+            self.assertEqual(len(os.listdir(directory)), 1)
+
+            User.objects.filter(username="TestUserName").update(is_staff=True)
+            self.client.login(username="TestUserName", password="test")
+            response = self.client.get(path=f"/admin/currency/requestprofile/{profile.pk}/stacks/")
+            self.assertEqual(response.status_code, 200)
+
+        # Code objects of Python before 3.11 have no co_qualname
+        frame = mock.Mock(f_globals={"__name__": "views"}, f_code=mock.Mock(spec=["co_name"]))
+        frame.f_code.co_name = "get"
+        self.assertEqual(profiling._frame_name(frame), "views.get")
+
+    @override_settings(SLOW_QUERY_THRESHOLD=0)
+    def test_slow_query_log(self):
+        """Test slow queries are aggregated by fingerprint and route with their plan."""
+        self.assertEqual(
+            slowlog.normalize("SELECT * FROM t WHERE a = 'x' AND b IN (%s, %s, 3)"),
+            "SELECT * FROM t WHERE a = ? AND b IN (?)",
+        )
+        for _ in range(2):
+            self.client.get(path="/api/offers/1")
+        self.assertIsNone(slowlog.slow_query_log._thread)
+        slowlog.slow_query_log.flush()
+        query = SlowQuery.objects.get(
+            route="GET /api/offers/<offer_id>", normalized_sql__contains='FROM "currency_offer"'
+        )
+        self.assertEqual(query.count, 2)
+        self.assertTrue(query.explain)
+
+        out = io.StringIO()
+        call_command("slow_queries", route="offers", explain=True, stdout=out)
+        self.assertIn(query.fingerprint, out.getvalue())
+
+    def test_admission_priority(self):
+        """Test queued low priority requests are preempted, time out or get a 503."""
+        controller = admission.AdmissionController(
+            [("deal", "POST ", 1, 1, 5.0), ("read", "GET ", 1, 1, 0.01)], capacity=1, max_queue=1
+        )
+        deal, read = controller.classes
+
+        async def scenario():
+            await controller.acquire(deal)
+            queued_read = asyncio.ensure_future(controller.acquire(read))
+            await asyncio.sleep(0)
+            queued_deal = asyncio.ensure_future(controller.acquire(deal))
+            await asyncio.sleep(0)
+            with self.assertRaises(admission.Rejected):
+                await queued_read
+            controller.release(deal)
+            await queued_deal
+            with self.assertRaises(admission.Rejected):
+                await controller.acquire(read)
+
+        asyncio.run(scenario())
+        self.assertEqual(controller.classify("POST", "/api/deals").name, "deal")
+        self.assertEqual(deal.admitted, 2)
+        self.assertEqual(read.shed, {"preempted": 1, "timeout": 1})
+
+        async def app(scope, receive, send):
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        controller.release(deal)
+        read.limit = 0
+        scope = {"type": "http", "method": "GET", "path": "/api/offers"}
+        with mock.patch.object(admission, "_controller", controller):
+            asyncio.run(admission.AdmissionMiddleware(app)(scope, None, send))
+        self.assertEqual(sent[0]["status"], 503)
+        self.assertIn((b"retry-after", b"1"), sent[0]["headers"])
+        self.assertEqual(self.client.get(path="/api/admission").status_code, 200)
+
+    def test_coalesced_requests(self):
+        """Test identical concurrent GET requests share one response, other ones don't."""
+        calls = []
+
+        async def app(scope, receive, send):
+            calls.append(scope["path"])
+            await asyncio.sleep(0.01)
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b"[]"})
+
+        async def request(middleware, path, token=b"a"):
+            sent = []
+
+            async def send(message):
+                sent.append(message)
+
+            scope = {
+                "type": "http",
+                "method": "GET",
+                "path": path,
+                "query_string": b"offset=0",
+                "headers": [(b"authorization", b"Bearer " + token)],
+            }
+            await middleware(scope, None, send)
+            return sent
+
+        async def scenario():
+            middleware = coalescing.CoalescingMiddleware(app)
+            return await asyncio.gather(
+                *(request(middleware, "/api/offers") for _ in range(3)),
+                request(middleware, "/api/offers", token=b"b"),
+                request(middleware, "/api/imports/1"),
+            )
+
+        responses = asyncio.run(scenario())
+        self.assertEqual(calls, ["/api/offers", "/api/offers", "/api/imports/1"])
+        self.assertTrue(all(response[1]["body"] == b"[]" for response in responses))
+        self.assertIn((b"x-coalesced", b"1"), responses[2][0]["headers"])
+
+    @override_settings(TASK_QUEUE_IN_PROCESS=False)
+    def test_price_alerts(self):
+        """Test alerts fire once, only for offers of their pair crossing their thresholds."""
+        by_rate = {}
+        for max_rate, min_amount in ((10, 0), (8, 500), (7, 2000), (5, 0)):
+            response = self.client.post(
+                path="/api/alerts",
+                data={
+                    "currency_to_sell_id": "EUR",
+                    "currency_to_buy_id": "USD",
+                    "max_rate": max_rate,
+                    "min_amount": min_amount,
+                },
+                content_type="application/json",
+                **self.headers,
+            )
+            self.assertEqual(response.status_code, 201)
+            by_rate[max_rate] = response.json()
+        self.assertEqual([alert["active"] for alert in by_rate.values()], [False, True, True, True])
+
+        data = {"currency_to_sell_id": 1, "currency_to_buy_id": 2, "amount": 1000, "seller_id": 2}
+        for rate in (6, 6.5):
+            self.client.post(
+                path="/api/offers",
+                data={**data, "exchange_rate": rate},
+                content_type="application/json",
+                **self.headers,
+            )
+        tasks.run_pending()
+        active = self.client.get(path="/api/alerts?active=true", **self.headers).json()["items"]
+        self.assertEqual([alert["id"] for alert in active], [by_rate[5]["id"], by_rate[7]["id"]])
+        # Alerts asking for more than the offers have are in buckets they don't read
+        buckets = PriceAlert.objects.in_bulk([alert["id"] for alert in by_rate.values()])
+        self.assertEqual([alert.amount_bucket for alert in buckets.values()], [0, 9, 11, 0])
+        self.assertGreater(PriceAlert.bucket(2000), PriceAlert.bucket(1000))
+
+        notifications = self.client.get(path="/api/notifications", **self.headers).json()
+        self.assertEqual(
+            [(item["alert_id"], item["exchange_rate"]) for item in notifications],
+            [(by_rate[10]["id"], 9), (by_rate[8]["id"], 6)],
+        )
+        after = notifications[0]["id"]
+        response = self.client.get(path=f"/api/notifications?after={after}", **self.headers)
+        self.assertEqual(len(response.json()), 1)
+
+        alert = PriceAlert.objects.get(pk=by_rate[5]["id"])
+        offer = Offer.objects.get(pk=1)
+        self.assertEqual(alerts._trigger([alert, alert], offer), [alert])
+        self.assertEqual(Notification.objects.filter(alert=alert).count(), 1)
+
+    def test_offer_write_rolled_back_with_its_tasks(self):
+        """Test an offer isn't saved if its side effect tasks can't be queued."""
+        data = {"currency_to_sell_id": 3, "currency_to_buy_id": 2, "amount": 1, "exchange_rate": 1}
+        with mock.patch("currency.alerts.enqueue", side_effect=RuntimeError), self.assertRaises(
+            RuntimeError
+        ):
+            self.client.post(
+                path="/api/offers",
+                data={**data, "seller_id": 2},
+                content_type="application/json",
+                **self.headers,
+            )
+        self.assertFalse(Offer.objects.filter(currency_to_sell_id=3).exists())
+
+    def test_offer_graph_reloads_missed_changes(self):
+        """Test the graph is reloaded once the changes it missed were dropped."""
+        state = LocalMemoryState(max_messages=2)
+        with mock.patch("currency.routing.get_shared_state", return_value=state):
+            graph = OfferGraph()
+            self.assertIsNone(graph.quote(2, 3, 900))
+            Offer.objects.create(
+                currency_to_sell_id=3,
+                currency_to_buy_id=2,
+                amount=100,
+                exchange_rate=10,
+                seller_id=2,
+            )
+            for offer_id in (998, 999, 1000):
+                state.publish("offers", offer_id)
+            self.assertEqual(graph.quote(2, 3, 900)["received"], 90)
+
+    def test_offer_graph_model_and_sweeper_changes(self):
+        """Test offers saved through the model and swept ones are published by id."""
+        state = LocalMemoryState()
+        with mock.patch("currency.routing.get_shared_state", return_value=state):
+            graph = OfferGraph()
+            self.assertIsNone(graph.quote(2, 3, 900))
+            with self.captureOnCommitCallbacks(execute=True):
+                offer = Offer.objects.create(
+                    currency_to_sell_id=3,
+                    currency_to_buy_id=2,
+                    amount=100,
+                    exchange_rate=10,
+                    seller_id=2,
+                )
+            self.assertEqual(graph.quote(2, 3, 900)["received"], 90)
+
+            Offer.objects.filter(pk=offer.pk).update(
+                expires_at=datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+            )
+            with self.captureOnCommitCallbacks(execute=True):
+                call_command("sweep_offers", stdout=io.StringIO())
+            self.assertNotIn(None, [message for _, message in state.messages("offers", 0)])
+            with mock.patch.object(graph, "_load", side_effect=AssertionError):
+                self.assertIsNone(graph.quote(2, 3, 900))
+            self.assertNotIn(offer.pk, graph._entries)
+
+    @override_settings(TASK_QUEUE_IN_PROCESS=False)
+    def test_market_snapshot_restore(self):
+        """Test new graphs restore the snapshot and only load the offers changed since."""
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+            MARKET_SNAPSHOT_PATH=os.path.join(directory, "market.snapshot")
+        ):
+            call_command("market_snapshot", stdout=io.StringIO())
+            data = {
+                "currency_to_sell_id": 3,
+                "currency_to_buy_id": 2,
+                "amount": 100,
+                "exchange_rate": 10,
+                "seller_id": 2,
+            }
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(
+                    path="/api/offers", data=data, content_type="application/json", **self.headers
+                )
+            Offer.objects.filter(pk=2).delete()
+            state = LocalMemoryState(max_messages=1)
+            for offer_id in range(3):
+                state.publish("offers", offer_id)
+            graph = OfferGraph()
+            with mock.patch("currency.routing.get_shared_state", return_value=state):
+                with CaptureQueriesContext(connection) as queries:
+                    quote = graph.quote(2, 3, 900)
+            # The offers changed since the snapshot and the existence of the restored ones
+            self.assertEqual(len(queries), 2)
+            self.assertNotIn(2, graph._entries)
+            with override_settings(MARKET_SNAPSHOT_PATH=None):
+                self.assertEqual(OfferGraph().quote(2, 3, 900), quote)
+
+            path = os.path.join(directory, "market.snapshot")
+            with open(path, "r+b") as fp:
+                fp.seek(4)
+                fp.write(b"\xff")
+            with self.assertLogs("currency.snapshot", "WARNING"):
+                self.assertIsNone(snapshot.read_snapshot(path))
@@ -0,0 +1,218 @@
+"""Refresh tokens with rotation and revocation of sign in sessions.
+
+Every sign in starts a session, its access and refresh tokens carry the
+session id in the ``sid`` claim. A refresh token is exchanged once for a new
+pair; presenting it again revokes the whole session.
+"""
+
+import asyncio
+import datetime
+import hashlib
+import threading
+import time
+import uuid
+
+import jwt
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+
+from currency.models import RefreshToken, RevokedSession
+from currency.shared import get_shared_state
+
+BLOOM_KEY = "auth.revoked.bloom"
+VERSION_KEY = "auth.revoked.version"
+REVOKED_KEY = "auth.revoked:{}"
+
+
+class TokenError(Exception):
+    """The refresh token can't be used."""
+
+
+class BloomFilter:
+    """Set membership with false positives but no false negatives."""
+
+    def __init__(self, bits=2**20, hashes=7, data=None):
+        """Init empty filter or load its bytes."""
+        self.bits = bits
+        self.hashes = hashes
+        self.data = bytearray(data) if data is not None else bytearray(bits // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "big"), int.from_bytes(digest[8:], "big")
+        return ((first + i * second) % self.bits for i in range(self.hashes))
+
+    def add(self, key):
+        """Add the key."""
+        for position in self._positions(key):
+            self.data[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        """Whether the key may have been added."""
+        return all(
+            self.data[position >> 3] & (1 << (position & 7)) for position in self._positions(key)
+        )
+
+
+class RevocationStore:
+    """Revoked sessions checked without database queries.
+
+    Each worker keeps a copy of the bloom filter kept in the shared state and
+    reloads it when its version changes, checked in the default executor when
+    called from the event loop. Sessions the filter may contain are confirmed
+    by a primary key lookup in the shared state.
+    """
+
+    def __init__(self):
+        """Init empty filter."""
+        self._lock = threading.Lock()
+        self._bloom = BloomFilter()
+        self._version = None
+        self._synced_at = 0
+
+    def _sync(self):
+        interval = getattr(settings, "REVOCATION_SYNC_INTERVAL", 1)
+        if time.monotonic() - self._synced_at < interval:
+            return
+        self._synced_at = time.monotonic()
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._reload()
+        else:
+            loop.run_in_executor(None, self._reload)
+
+    def _reload(self):
+        state = get_shared_state()
+        current = self._version
+        version = state.get(VERSION_KEY, 0)
+        if version != current:
+            data = state.get(BLOOM_KEY)
+            bloom = BloomFilter() if data is None else BloomFilter(data=data)
+            with self._lock:
+                if self._version == current:
+                    self._bloom, self._version = bloom, version
+
+    def is_revoked(self, session):
+        """Whether the session was revoked."""
+        self._sync()
+        if session not in self._bloom:
+            return False
+        return get_shared_state().get(REVOKED_KEY.format(session)) is not None
+
+    def add(self, session, expires_at):
+        """Add the session to the shared filter and lookup keys."""
+        state = get_shared_state()
+        ttl = max((expires_at - timezone.now()).total_seconds(), 1)
+        state.set(REVOKED_KEY.format(session), True, ttl=ttl)
+        with state.lock(BLOOM_KEY, timeout=10):
+            data = state.get(BLOOM_KEY)
+            bloom = BloomFilter() if data is None else BloomFilter(data=data)
+            bloom.add(session)
+            state.set(BLOOM_KEY, bytes(bloom.data))
+            version = state.incr(VERSION_KEY)
+        with self._lock:
+            self._bloom, self._version = bloom, version
+
+    def rebuild(self):
+        """Rebuild the shared filter and lookup keys from unexpired revoked sessions."""
+        state = get_shared_state()
+        bloom = BloomFilter()
+        now = timezone.now()
+        for session, expires_at in RevokedSession.objects.filter(expires_at__gt=now).values_list(
+            "session", "expires_at"
+        ):
+            bloom.add(session)
+            ttl = (expires_at - now).total_seconds()
+            state.set(REVOKED_KEY.format(session), True, ttl=ttl)
+        with state.lock(BLOOM_KEY, timeout=10):
+            state.set(BLOOM_KEY, bytes(bloom.data))
+            version = state.incr(VERSION_KEY)
+        with self._lock:
+            self._bloom, self._version = bloom, version
+
+
+revocations = RevocationStore()
+
+
+def create_refresh_token(user, session=None):
+    """Store and sign a refresh token of the session, a new one if not given."""
+    session = session or uuid.uuid4().hex
+    expires_at = timezone.now() + datetime.timedelta(
+        days=getattr(settings, "JWT_REFRESH_EXPIRY", 30)
+    )
+    refresh_token = RefreshToken.objects.create(
+        jti=uuid.uuid4().hex, session=session, user=user, expires_at=expires_at
+    )
+    payload = {
+        "username": user.username,
+        "type": "refresh",
+        "jti": refresh_token.jti,
+        "sid": session,
+        "exp": expires_at,
+    }
+    return session, jwt.encode(
+        payload=payload, key=getattr(settings, "JWT_SIGNING_KEY", None), algorithm="HS256"
+    )
+
+
+def decode_refresh_token(token):
+    """Verify the refresh token signature and expiry."""
+    try:
+        payload = jwt.decode(
+            token, key=getattr(settings, "JWT_SIGNING_KEY", None), algorithms=["HS256"]
+        )
+    except jwt.PyJWTError as e:
+        raise TokenError(f"Invalid refresh token: {e}") from None
+    if payload.get("type") != "refresh":
+        raise TokenError("Not a refresh token")
+    return payload
+
+
+def rotate_refresh_token(token):
+    """Use up the refresh token and issue the next one of its session.
+
+    Returns the username, the session and the new refresh token.
+    """
+    payload = decode_refresh_token(token)
+    if revocations.is_revoked(payload["sid"]):
+        raise TokenError("Session was revoked")
+    refresh_token = RefreshToken.objects.select_related("user").filter(jti=payload["jti"]).first()
+    if refresh_token is None:
+        raise TokenError("Unknown refresh token")
+    used = RefreshToken.objects.filter(pk=refresh_token.pk, used_at__isnull=True).update(
+        used_at=timezone.now()
+    )
+    if not used:
+        revoke_session(refresh_token.session)
+        raise TokenError("Refresh token was already used, session revoked")
+    session, new_token = create_refresh_token(refresh_token.user, refresh_token.session)
+    return refresh_token.user.username, session, new_token
+
+
+def revoke_session(session):
+    """Reject tokens of the session until its last refresh token expires."""
+    now = timezone.now()
+    last = RefreshToken.objects.filter(session=session).aggregate(last=Max("expires_at"))["last"]
+    expires_at = last or now + datetime.timedelta(
+        minutes=getattr(settings, "JWT_ACCESS_EXPIRY", 60)
+    )
+    RefreshToken.objects.filter(session=session, used_at__isnull=True).update(used_at=now)
+    RevokedSession.objects.get_or_create(session=session, defaults={"expires_at": expires_at})
+    revocations.add(session, expires_at)
+
+
+def purge_revoked(batch_size=1000):
+    """Delete expired refresh tokens and revoked sessions, rebuild the filter."""
+    now = timezone.now()
+    deleted = 0
+    for model in (RefreshToken, RevokedSession):
+        expired = model.objects.filter(expires_at__lte=now).order_by("expires_at")
+        while True:
+            ids = list(expired.values_list("pk", flat=True)[:batch_size])
+            if not ids:
+                break
+            deleted += model.objects.filter(pk__in=ids).delete()[0]
+    revocations.rebuild()
+    return deleted
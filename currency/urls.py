@@ -1,9 +1,16 @@
 """Currency app URL Configuration."""
 
+from django.conf import settings
 from django.urls import path
 
-from currency.views import index
+from currency.images import VARIANTS_DIR
+from currency.views import image_variant, index
 
 urlpatterns = [
     path("", index, name="index"),
+    path(
+        f"{settings.MEDIA_URL.lstrip('/')}{VARIANTS_DIR}/<str:name>",
+        image_variant,
+        name="image_variant",
+    ),
 ]
@@ -1,6 +1,42 @@
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
 from django.shortcuts import render
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.http import require_safe
+
+from currency.api import api
+from currency.images import VARIANTS_DIR
+from currency.openapi import get_schema
 
 
 def index(request):
     """Index file."""
     return render(request, "index.html")
+
+
+@require_safe
+def image_variant(request, name):
+    """Serve content-hashed currency image variant with far-future cache headers."""
+    path = f"{VARIANTS_DIR}/{name}"
+    if not default_storage.exists(path):
+        raise Http404("Image variant not found")
+    response = FileResponse(default_storage.open(path, "rb"))
+    response["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
+
+
+@require_safe
+def openapi_json(request):
+    """Serve the cached API schema, gzipped when the client accepts it."""
+    schema = get_schema(api)
+    if request.headers.get("If-None-Match") == schema.etag:
+        response = HttpResponseNotModified()
+    elif "gzip" in request.headers.get("Accept-Encoding", ""):
+        response = HttpResponse(schema.gzipped, content_type="application/json")
+        response["Content-Encoding"] = "gzip"
+    else:
+        response = HttpResponse(schema.content, content_type="application/json")
+    response["ETag"] = schema.etag
+    response["Cache-Control"] = "public, max-age=86400"
+    patch_vary_headers(response, ("Accept-Encoding",))
+    return response
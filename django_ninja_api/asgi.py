@@ -14,3 +14,14 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'django_ninja_api.settings')
 
 application = get_asgi_application()
+
+from currency.admission import AdmissionMiddleware  # noqa: E402
+from currency.coalescing import CoalescingMiddleware  # noqa: E402
+from currency.routing import offer_graph  # noqa: E402
+from currency.slowlog import slow_query_log  # noqa: E402
+
+# Coalesced requests wait outside of admission control, taking no slots
+application = CoalescingMiddleware(AdmissionMiddleware(application))
+
+offer_graph.warm()
+slow_query_log.start()
@@ -43,10 +43,12 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "currency.slowlog.SlowQueryRouteMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "currency.profiling.profiling_middleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -121,6 +123,80 @@ STATIC_URL = "static/"
 MEDIA_ROOT = "media/"
 MEDIA_URL = "media/"
 
+# Run queued tasks in a thread of the web process, else only by run_tasks command
+TASK_QUEUE_IN_PROCESS = True
+TASK_MAX_ATTEMPTS = 5
+# Seconds before the first retry of a failed task, doubled on every next one
+TASK_RETRY_BACKOFF = 2
+
+# Seconds between market summary refreshes, 0 computes it on every request
+MARKET_SUMMARY_INTERVAL = 5
+
+# Seconds a response to a request with Idempotency-Key header is replayed for
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+
+# Days after which inactive offers are moved to the archive by sweep_offers
+OFFER_ARCHIVE_AFTER_DAYS = 30
+
+# Days after which deals are moved to the monthly archive by archive_deals
+DEAL_ARCHIVE_AFTER_DAYS = 365
+
+# OpenAPI schema written by build_openapi on deploy, generated on first request if stale
+OPENAPI_SCHEMA_FILE = BASE_DIR / "openapi.json"
+
+# Cache, locks and pub/sub shared by the workers, LocalMemoryState for a single process
+SHARED_STATE = {
+    "BACKEND": "currency.shared.SQLiteState",
+    "OPTIONS": {"path": BASE_DIR / "shared_state.sqlite3"},
+}
+
+# Days a refresh token can be exchanged for new tokens
+JWT_REFRESH_EXPIRY = 30
+# Seconds a worker may check tokens against a stale copy of the revoked sessions
+REVOCATION_SYNC_INTERVAL = 1
+
+# Seconds a worker may serve currencies changed by another worker
+CURRENCY_REGISTRY_SYNC_INTERVAL = 1
+
+# Most offers a conversion quote may chain
+QUOTE_MAX_HOPS = 4
+# Offers snapshot written by the market_snapshot command, workers restore the
+# conversion graph from it on start, None to always load it from the database
+MARKET_SNAPSHOT_PATH = BASE_DIR / "market.snapshot"
+
+# Requests profiled on demand, see currency/profiling.py
+PROFILE_DIR = BASE_DIR / "profiles"
+PROFILE_MAX_FILES = 100
+PROFILE_SAMPLE_INTERVAL = 0.001
+# Seconds an X-Profile header token made by profile_token is accepted
+PROFILE_TOKEN_MAX_AGE = 60 * 60
+
+# Milliseconds a query takes to be logged as slow, None to disable the log
+SLOW_QUERY_THRESHOLD = 100
+# Seconds between writes of the slow queries to the database
+SLOW_QUERY_FLUSH_INTERVAL = 10
+
+# Admission control of the ASGI workers, see currency/admission.py. Classes are
+# (name, "METHOD /path" pattern, concurrency limit, queue size, queue time budget
+# in seconds), highest priority first
+ADMISSION_CLASSES = [
+    ("deal", r"POST /api/deals(/|$)", 32, 512, 10.0),
+    ("offer", r"(POST|PUT|PATCH|DELETE) /api/offers(/|$)", 16, 256, 5.0),
+    ("write", r"(POST|PUT|PATCH|DELETE) /api/", 16, 128, 5.0),
+    ("read", r"(GET|HEAD) /api/(?!(docs|openapi\.json|admission)?$)", 32, 256, 1.0),
+    ("docs", r"(GET|HEAD) /api/(docs|openapi\.json)$", 2, 8, 0.5),
+]
+ADMISSION_MAX_CONCURRENCY = 64
+ADMISSION_MAX_QUEUE = 1024
+
+# Price alerts triggered per transaction when matching an offer
+ALERT_MATCH_BATCH_SIZE = 1000
+
+# GET requests sharing the response of an identical running request, see
+# currency/coalescing.py, None to disable
+COALESCE_PATTERN = r"GET /api/(currencies|offers|deals|candles|market|quote|users)(/|$)"
+COALESCE_MAX_BYTES = 1024 * 1024
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
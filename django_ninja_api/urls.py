@@ -4,9 +4,12 @@ from django.contrib import admin
 from django.urls import include, path
 
 from currency.api import api
+from currency.views import openapi_json
 
 urlpatterns = [
     path("admin/", admin.site.urls),
+    # Shadows the schema view of api.urls with the cached one
+    path(f"api{api.openapi_url}", openapi_json, name="openapi-json"),
     path("api/", api.urls),
     path("", include("currency.urls")),
 ]
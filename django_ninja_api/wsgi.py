@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'django_ninja_api.settings')
 
 application = get_wsgi_application()
+
+from currency.routing import offer_graph  # noqa: E402
+from currency.slowlog import slow_query_log  # noqa: E402
+
+offer_graph.warm()
+slow_query_log.start()